@@ -0,0 +1,53 @@
+import hashlib, json
+from datetime import date
+from typing import Any, Dict, Optional
+from fastapi import Request, Response
+
+# ETags fuertes + If-None-Match -> 304. La versión sale de la fila (xmin,
+# products.version) o de las marcas de agua por dominio (report_watermarks,
+# contadores que avanzan con cada escritura), así que validar cuesta una lectura
+# mínima en vez de la consulta completa y la serialización del payload.
+
+def make_etag(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+def _matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil: se ignora el prefijo W/
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+def check(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Pone el ETag en la respuesta; si el cliente ya lo tiene devuelve el 304
+    que el endpoint debe retornar tal cual.
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
+async def watermarks(client, *domains: str) -> Dict[str, int]:
+    rows = await client.query_raw(
+        "SELECT domain, SUM(version)::bigint AS v FROM report_watermarks WHERE domain = ANY($1::text[]) GROUP BY domain",
+        list(domains),
+    )  # type: ignore
+    return {r["domain"]: int(r["v"]) for r in rows}
+
+async def report_etag(client, request: Request, *domains: str, scope: Optional[str] = None) -> str:
+    """ETag de un reporte: ruta + parámetros + tienda + Accept + marcas de agua + fecha de hoy."""
+    marks = await watermarks(client, *domains)
+    params = sorted(request.query_params.multi_items())
+    # JSON y NDJSON son representaciones distintas del mismo reporte
+    accept = request.headers.get("accept", "")
+    return make_etag(request.url.path, params, scope, accept, marks, date.today().isoformat())
+
+async def check_report(client, request: Request, response: Response, *domains: str,
+                       scope: Optional[str] = None) -> Optional[Response]:
+    """scope: tienda efectiva (la del usuario no viaja en la URL)."""
+    response.headers["Vary"] = "Accept"
+    return check(request, response, await report_etag(client, request, *domains, scope=scope))
@@ -0,0 +1,113 @@
+import asyncio, os, re, time
+from typing import Any, Dict, Optional
+import jwt
+from app.core import http
+
+# Login con Google: intercambio del code por tokens y verificación local del
+# id_token (firma RS256 contra el JWKS de Google, audiencia, emisor y
+# vencimiento). Las llaves se guardan en memoria el tiempo que indica el
+# Cache-Control del JWKS; un kid desconocido (rotación) fuerza una recarga.
+# GOOGLE_TOKEN_URL / GOOGLE_JWKS_URL permiten apuntar a un sustituto local.
+
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
+GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
+GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:8000/auth/google/callback")
+GOOGLE_AUTH_URL = os.getenv("GOOGLE_AUTH_URL", "https://accounts.google.com/o/oauth2/v2/auth")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+
+JWKS_DEFAULT_TTL_SECONDS = 3600     # si la respuesta no trae max-age
+JWKS_MIN_REFRESH_SECONDS = 60       # recargas por kid desconocido, como mucho una por minuto
+JWT_LEEWAY_SECONDS = 60
+
+class GoogleAuthError(Exception):
+    """Fallo del login con Google; code es el motivo que se devuelve al front."""
+    def __init__(self, code: str, detail: str):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+def _max_age(cache_control: str) -> int:
+    m = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(m.group(1)) if m else JWKS_DEFAULT_TTL_SECONDS
+
+class JWKSCache:
+    def __init__(self, url: str):
+        self.url = url
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self) -> None:
+        resp = await http.client().get(self.url)
+        if resp.status_code != 200:
+            raise GoogleAuthError("jwks_unavailable", "No se pudieron obtener las llaves de Google")
+        keys = {}
+        for k in resp.json().get("keys", []):
+            if k.get("kid"):
+                keys[k["kid"]] = jwt.PyJWK(k)
+        now = time.monotonic()
+        self._keys = keys
+        self._fetched_at = now
+        self._expires_at = now + _max_age(resp.headers.get("cache-control", ""))
+
+    async def prefetch(self) -> None:
+        """Carga las llaves al arrancar para que el primer login no las espere."""
+        async with self._lock:
+            if time.monotonic() >= self._expires_at:
+                await self._refresh()
+
+    async def get(self, kid: str) -> jwt.PyJWK:
+        now = time.monotonic()
+        stale = now >= self._expires_at
+        unknown = kid not in self._keys and now - self._fetched_at >= JWKS_MIN_REFRESH_SECONDS
+        if stale or unknown:
+            async with self._lock:
+                # otra petición pudo recargar mientras se esperaba el lock
+                if time.monotonic() >= self._expires_at or (
+                        kid not in self._keys and time.monotonic() - self._fetched_at >= JWKS_MIN_REFRESH_SECONDS):
+                    await self._refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            raise GoogleAuthError("invalid_google_token", "Llave de firma desconocida")
+        return key
+
+jwks = JWKSCache(GOOGLE_JWKS_URL)
+
+async def verify_id_token(id_token: str) -> Dict[str, Any]:
+    """Claims del id_token si la firma y los claims estándar son válidos."""
+    try:
+        kid = jwt.get_unverified_header(id_token).get("kid")
+    except jwt.InvalidTokenError:
+        raise GoogleAuthError("invalid_google_token", "id_token mal formado")
+    key = await jwks.get(kid or "")
+    try:
+        claims = jwt.decode(
+            id_token, key.key, algorithms=["RS256"], audience=GOOGLE_CLIENT_ID,
+            leeway=JWT_LEEWAY_SECONDS, options={"require": ["exp", "iat", "iss", "aud", "sub"]},
+        )
+    except jwt.InvalidTokenError as e:
+        raise GoogleAuthError("invalid_google_token", f"id_token inválido: {e}")
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        raise GoogleAuthError("invalid_google_token", "Emisor inválido")
+    if claims.get("email") and claims.get("email_verified") is False:
+        raise GoogleAuthError("invalid_google_token", "Email de Google no verificado")
+    return claims
+
+async def exchange_code(code: str) -> Dict[str, Any]:
+    """Intercambia el code y devuelve los claims verificados del id_token."""
+    resp = await http.client().post(GOOGLE_TOKEN_URL, data={
+        "code": code,
+        "client_id": GOOGLE_CLIENT_ID,
+        "client_secret": GOOGLE_CLIENT_SECRET,
+        "redirect_uri": GOOGLE_REDIRECT_URI,
+        "grant_type": "authorization_code",
+    })
+    if resp.status_code != 200:
+        raise GoogleAuthError("oauth_exchange_failed", "No se pudo intercambiar el código de Google")
+    id_token: Optional[str] = resp.json().get("id_token")
+    if not id_token:
+        raise GoogleAuthError("missing_id_token", "Google no retornó id_token")
+    return await verify_id_token(id_token)
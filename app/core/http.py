@@ -0,0 +1,29 @@
+import os
+from typing import Optional
+import httpx
+
+# Cliente HTTP compartido por el proceso (Google OAuth/JWKS y demás llamadas
+# salientes): reutiliza conexiones TCP+TLS en vez de abrir una por petición.
+# Se crea al arrancar y se cierra al apagar; fuera de la app (scripts) se crea
+# al primer uso.
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+def client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+        )
+    return _client
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
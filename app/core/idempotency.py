@@ -0,0 +1,114 @@
+import asyncio, hashlib, json, os, random
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.db.client import db
+
+# Idempotency-Key para POST /sales/ y POST /credits/{id}/payments: el primer
+# intento reserva la llave, ejecuta y guarda la respuesta; los reintentos con la
+# misma llave y el mismo cuerpo reciben la respuesta original sin re-ejecutar.
+# La respuesta se guarda en la misma transacción que la operación: si la
+# operación se confirmó, la llave ya está 'done' con su respuesta.
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# Una reserva 'pending' más vieja que esto se considera abandonada (worker caído)
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = int(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "60"))
+_PURGE_PROBABILITY = 0.01
+MAX_KEY_LENGTH = 200
+
+# complete(tx, result, status_code=200): fn la llama dentro de su transacción, antes del commit
+Complete = Callable[..., Awaitable[None]]
+
+def _hash(body: Any) -> str:
+    raw = json.dumps(jsonable_encoder(body), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+async def _reserve(scope: str, key: str, request_hash: str) -> bool:
+    rows = await db.query_raw(
+        """
+        INSERT INTO idempotency_keys (scope, key, request_hash, status)
+        VALUES ($1, $2, $3, 'pending')
+        ON CONFLICT (scope, key) DO UPDATE SET
+          request_hash = EXCLUDED.request_hash, status = 'pending',
+          status_code = NULL, response = NULL, created_at = now()
+        WHERE idempotency_keys.created_at < now() - make_interval(secs => $4)
+           OR (idempotency_keys.status = 'pending'
+               AND idempotency_keys.created_at < now() - make_interval(secs => $5))
+        RETURNING 1 AS reserved
+        """,
+        scope, key, request_hash, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_PENDING_TIMEOUT_SECONDS,
+    )  # type: ignore
+    return bool(rows)
+
+async def _purge_expired() -> None:
+    await db.execute_raw(
+        "DELETE FROM idempotency_keys WHERE created_at < now() - make_interval(secs => $1)",
+        IDEMPOTENCY_TTL_SECONDS,
+    )  # type: ignore
+
+async def _no_key(tx, result: Any, status_code: int = 200) -> None:
+    return None
+
+async def run(key: Optional[str], scope: str, body: Any, fn: Callable[[Complete], Awaitable[Any]]) -> Any:
+    """
+    Ejecuta fn(complete) una sola vez por (scope, key). Sin llave, ejecuta directo.
+    fn debe llamar `await complete(tx, respuesta, status_code)` dentro de su
+    transacción para que la respuesta se confirme junto con la operación.
+    - misma llave + mismo cuerpo, ya completada -> respuesta original (Idempotent-Replayed: true)
+    - misma llave en curso -> 409
+    - misma llave con otro cuerpo -> 422
+    Si fn() falla antes de confirmar, la llave se libera para que el cliente
+    pueda reintentar. Si se cancela (cliente desconectado) no se sabe si la
+    transacción se confirmó: la llave queda 'pending' hasta
+    IDEMPOTENCY_PENDING_TIMEOUT_SECONDS y el reintento recibe 409 o la respuesta guardada.
+    """
+    if not key:
+        return await fn(_no_key)
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(400, f"Idempotency-Key demasiado larga (máx {MAX_KEY_LENGTH})")
+
+    request_hash = _hash(body)
+    if random.random() < _PURGE_PROBABILITY:
+        await _purge_expired()
+
+    if not await _reserve(scope, key, request_hash):
+        row = await db.query_first(
+            "SELECT request_hash, status, status_code, response FROM idempotency_keys WHERE scope = $1 AND key = $2",
+            scope, key,
+        )  # type: ignore
+        if row is None:
+            # vencida y purgada entre ambas consultas: se vuelve a intentar la reserva
+            if not await _reserve(scope, key, request_hash):
+                raise HTTPException(409, "Petición con esta Idempotency-Key en curso")
+        elif row["request_hash"] != request_hash:
+            raise HTTPException(422, "Idempotency-Key ya usada con un cuerpo distinto")
+        elif row["status"] != "done":
+            raise HTTPException(409, "Petición con esta Idempotency-Key en curso", headers={"Retry-After": "1"})
+        else:
+            content = row["response"]
+            if isinstance(content, str):
+                content = json.loads(content)
+            return JSONResponse(content=content, status_code=row["status_code"] or 200,
+                                headers={"Idempotent-Replayed": "true"})
+
+    async def complete(tx, result: Any, status_code: int = 200) -> None:
+        await tx.execute_raw(
+            """
+            UPDATE idempotency_keys SET status = 'done', status_code = $3, response = $4::jsonb
+            WHERE scope = $1 AND key = $2
+            """,
+            scope, key, status_code, json.dumps(jsonable_encoder(result)),
+        )  # type: ignore
+
+    try:
+        return await fn(complete)
+    except asyncio.CancelledError:
+        raise
+    except BaseException:
+        # la excepción ya salió de la transacción: si quedó 'pending' fue revertida;
+        # si está 'done' se confirmó y falló algo posterior (la respuesta sigue valiendo)
+        await db.execute_raw(
+            "DELETE FROM idempotency_keys WHERE scope = $1 AND key = $2 AND status = 'pending'", scope, key
+        )  # type: ignore
+        raise
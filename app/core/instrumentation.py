@@ -0,0 +1,52 @@
+import logging, os, random, time
+from app.core.metrics import RequestStats, current_request, route_metrics
+
+# Middleware ASGI: latencia por ruta, consultas y tiempo de BD por petición,
+# y muestreo de peticiones lentas con el SQL que emitieron.
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1.0"))
+
+log = logging.getLogger("gratus.slow")
+
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_holder = {"status": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            current_request.reset(token)
+            # FastAPI deja la ruta que hizo match en scope["route"]; usamos la
+            # plantilla (/sales/{sale_id}) para no explotar la cardinalidad
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            route_metrics.observe(method, route, status_holder["status"], ms, stats)
+            if ms >= SLOW_REQUEST_MS and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+                _log_slow(method, scope.get("path", ""), route, status_holder["status"], ms, stats)
+
+def _log_slow(method: str, path: str, route: str, status: int, ms: float, stats: RequestStats) -> None:
+    lines = [
+        f"Petición lenta {method} {path} (ruta {route}) -> {status} en {ms:.1f} ms; "
+        f"{stats.queries} consultas, {stats.db_ms:.1f} ms en BD"
+    ]
+    for sql, qms in stats.statements:
+        lines.append(f"  [{qms:.1f} ms] {' '.join(sql.split())}")
+    if stats.queries > len(stats.statements):
+        lines.append(f"  ... {stats.queries - len(stats.statements)} consultas más")
+    log.warning("\n".join(lines))
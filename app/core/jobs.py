@@ -0,0 +1,126 @@
+import asyncio, contextvars, hashlib, json, os, time, uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Cola de trabajos en proceso para reportes pesados: se encola la petición,
+# se devuelve un job_id y el resultado queda guardado hasta que vence su TTL.
+# Trabajos idénticos en curso se deduplican (mismo reporte + mismos parámetros).
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_MAX_PENDING = int(os.getenv("REPORT_JOB_MAX_PENDING", "50"))
+REPORT_JOB_TTL_SECONDS = int(os.getenv("REPORT_JOB_TTL_SECONDS", "600"))
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    __slots__ = ("id", "key", "kind", "params", "status", "result", "error",
+                 "created_at", "started_at", "finished_at", "done")
+
+    def __init__(self, kind: str, params: Dict[str, Any], key: str):
+        self.id = str(uuid.uuid4())
+        self.key = key
+        self.kind = kind
+        self.params = params
+        self.status = "queued"   # queued|running|done|error
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobQueue:
+    def __init__(self, workers: int, max_pending: int, ttl: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[str, Job] = {}
+        self._inflight: Dict[str, str] = {}  # key -> job_id
+        self._tasks: set = set()
+
+    @staticmethod
+    def _key(kind: str, params: Dict[str, Any]) -> str:
+        raw = json.dumps([kind, params], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _purge(self) -> None:
+        now = time.time()
+        expired = [j.id for j in self._jobs.values()
+                   if j.finished_at is not None and now - j.finished_at > self.ttl]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def pending(self) -> int:
+        return sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+
+    def submit(self, kind: str, params: Dict[str, Any], fn: Callable[[], Awaitable[Any]]) -> Job:
+        """
+        Encola fn() salvo que ya exista un trabajo idéntico en curso, en cuyo
+        caso devuelve ese mismo trabajo.
+        """
+        self._purge()
+        key = self._key(kind, params)
+        jid = self._inflight.get(key)
+        if jid and jid in self._jobs:
+            return self._jobs[jid]
+        if self.pending() >= self.max_pending:
+            raise QueueFull()
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.workers)
+
+        job = Job(kind, params, key)
+        self._jobs[job.id] = job
+        self._inflight[key] = job.id
+        # contexto limpio: las consultas del trabajo no cuentan para la petición que lo encoló
+        task = asyncio.create_task(self._run(job, fn), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, fn: Callable[[], Awaitable[Any]]) -> None:
+        async with self._sem:  # type: ignore
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await fn()
+                job.status = "done"
+            except Exception as e:
+                job.status = "error"
+                job.error = getattr(e, "detail", None) or str(e) or e.__class__.__name__
+            finally:
+                job.finished_at = time.time()
+                self._inflight.pop(job.key, None)
+                job.done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: Job, timeout: float) -> Job:
+        """Long-poll: espera hasta timeout segundos a que el trabajo termine."""
+        if timeout > 0 and not job.done.is_set():
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    async def shutdown(self) -> None:
+        for t in list(self._tasks):
+            t.cancel()
+        self._tasks.clear()
+
+report_jobs = JobQueue(REPORT_JOB_WORKERS, REPORT_JOB_MAX_PENDING, REPORT_JOB_TTL_SECONDS)
@@ -0,0 +1,58 @@
+import asyncio, logging, os, time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# Arranque del worker en dos fases:
+# - vivo (/health/live) en cuanto el proceso atiende peticiones
+# - listo (/health/ready) cuando terminó el calentamiento: conexiones del pool,
+#   catálogo, usuarios, KPIs del día, series de reportes y llaves de Google
+# El balanceador no le manda tráfico hasta que está listo, así un despliegue
+# escalonado no estrena workers fríos con peticiones reales. Un paso que falla
+# se registra y no bloquea (el worker queda listo, solo que más frío);
+# WARMUP_TIMEOUT_SECONDS acota la espera total. Al apagar vuelve a no-listo
+# para que el balanceador deje de enviarle tráfico mientras drena.
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "30"))
+
+Step = Tuple[str, Callable[[], Awaitable[Any]]]
+
+log = logging.getLogger("gratus.lifecycle")
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.warmup_ms = 0.0
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    async def warm_up(self, steps: List[Step]) -> None:
+        """Corre los pasos en orden y marca el worker como listo al terminar."""
+        t0 = time.perf_counter()
+        if WARMUP_ENABLED:
+            try:
+                await asyncio.wait_for(self._run(steps), WARMUP_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                log.warning("Calentamiento incompleto tras %gs; el worker queda listo igual", WARMUP_TIMEOUT_SECONDS)
+        self.warmup_ms = round((time.perf_counter() - t0) * 1000, 1)
+        self.ready = True
+
+    async def _run(self, steps: List[Step]) -> None:
+        for name, fn in steps:
+            t0 = time.perf_counter()
+            self.steps[name] = {"ok": None}
+            try:
+                await fn()
+                self.steps[name] = {"ok": True}
+            except Exception as e:
+                log.warning("Calentamiento '%s' falló: %s", name, e)
+                self.steps[name] = {"ok": False, "error": str(e)}
+            self.steps[name]["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "status": "draining" if self.draining else "ready" if self.ready else "warming_up",
+            "warmup_ms": self.warmup_ms,
+            "steps": self.steps,
+        }
+
+readiness = Readiness()
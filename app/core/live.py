@@ -0,0 +1,165 @@
+import asyncio, logging, os
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Set
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import orjson
+from app.core.money import from_cents
+from app.core.responses import dumps
+
+try:
+    import asyncpg
+except ImportError:  # sin asyncpg los eventos solo llegan a este worker
+    asyncpg = None
+
+# Canal en vivo para tableros: cada venta, anulación o abono publica un delta
+# (armado una sola vez al escribir) y se reparte tal cual a todas las
+# suscripciones SSE/WebSocket. Entre workers viaja por LISTEN/NOTIFY de Postgres
+# con una conexión asyncpg dedicada (Prisma no soporta LISTEN).
+#
+# El cliente toma una foto inicial (kpi_daily, credits/overview, ...) y aplica
+# los deltas. Si se pierden eventos (cola llena, reconexión) recibe
+# {"type": "resync"} y vuelve a pedir la foto.
+
+log = logging.getLogger("gratus.live")
+
+LIVE_CHANNEL = os.getenv("LIVE_CHANNEL", "gratus_live")
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "256"))
+LIVE_KEEPALIVE_SECONDS = float(os.getenv("LIVE_KEEPALIVE_SECONDS", "15"))
+LIVE_RECONNECT_SECONDS = float(os.getenv("LIVE_RECONNECT_SECONDS", "5"))
+# Vacío = DATABASE_URL (sin los parámetros de pool de Prisma)
+LIVE_DATABASE_URL = os.getenv("LIVE_DATABASE_URL", "") or os.getenv("DATABASE_URL", "")
+
+RESYNC = orjson.dumps({"type": "resync"})
+
+def _asyncpg_dsn(url: str) -> str:
+    """postgresql+asyncpg://...?schema=public&connection_limit=5 -> postgresql://...?sslmode=..."""
+    parts = urlsplit(url)
+    query = {k: v for k, v in parse_qsl(parts.query) if k in ("sslmode", "application_name")}
+    return urlunsplit(parts._replace(scheme="postgresql", query=urlencode(query)))
+
+def sale_event(kind: str, created_at: datetime, tienda_id: Optional[str], metodo_pago: str,
+               total_cents: int, descuento_cents: int, num_ventas: int = 1) -> Dict[str, Any]:
+    """Delta de KPIs del día (kpi_daily / close_day); negativo al anular."""
+    return {
+        "type": kind,
+        "day": created_at.astimezone().date().isoformat(),
+        "tienda_id": tienda_id,
+        "metodo_pago": metodo_pago,
+        "num_ventas": num_ventas,
+        "total": from_cents(total_cents),
+        "descuento": from_cents(descuento_cents),
+    }
+
+def credit_event(kind: str, tienda_id: Optional[str], credit_id: str, customer_id: str,
+                 amount_cents: int, saldo_cents: int, status_from: Optional[str], status_to: str) -> Dict[str, Any]:
+    """Delta de cartera (credits/overview): crédito nuevo o abono."""
+    return {
+        "type": kind,
+        "day": date.today().isoformat(),
+        "tienda_id": tienda_id,
+        "credit_id": credit_id,
+        "customer_id": customer_id,
+        "amount": from_cents(amount_cents),
+        "saldo": from_cents(saldo_cents),
+        "status_from": status_from,
+        "status_to": status_to,
+    }
+
+class Subscription:
+    __slots__ = ("tienda", "queue")
+
+    def __init__(self, tienda: Optional[str]):
+        self.tienda = tienda
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    def push(self, payload: bytes) -> None:
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # cliente lento: se descarta lo pendiente y se le pide rehacer la foto
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+class LiveHub:
+    def __init__(self):
+        self._subs: Set[Subscription] = set()
+        self.listening = False
+
+    def subscribe(self, tienda: Optional[str]) -> Subscription:
+        sub = Subscription(tienda)
+        self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subs.discard(sub)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def _fanout(self, payload: bytes) -> None:
+        if not self._subs:
+            return
+        try:
+            tienda = orjson.loads(payload).get("tienda_id")
+        except orjson.JSONDecodeError:
+            log.warning("Evento en vivo inválido: %r", payload[:200])
+            return
+        for sub in list(self._subs):
+            if sub.tienda is None or sub.tienda == tienda:
+                sub.push(payload)
+
+    def _broadcast(self, payload: bytes) -> None:
+        for sub in list(self._subs):
+            sub.push(payload)
+
+    async def publish(self, client, event: Dict[str, Any]) -> None:
+        """
+        Publica un evento ya confirmado (llamar después del commit). Con el
+        oyente activo va por NOTIFY y llega a todos los workers, este incluido;
+        si no, se reparte solo en este proceso. Nunca falla la escritura.
+        """
+        payload = dumps(event)
+        if not self.listening:
+            self._fanout(payload)
+            return
+        try:
+            await client.query_raw("SELECT pg_notify($1, $2)", LIVE_CHANNEL, payload.decode())  # type: ignore
+        except Exception as e:
+            log.warning("No se pudo notificar evento en vivo: %s", e)
+            self._fanout(payload)
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        self._fanout(payload.encode())
+
+    async def listen_forever(self) -> None:
+        """Mantiene la conexión LISTEN; al caerse, avisa resync y reintenta."""
+        if asyncpg is None or not LIVE_DATABASE_URL:
+            # con varios workers los clientes solo verían los eventos del suyo
+            log.warning("Canal en vivo solo en proceso: %s; los eventos de otros workers no llegan",
+                        "falta asyncpg" if asyncpg is None else "sin DATABASE_URL")
+            return
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(_asyncpg_dsn(LIVE_DATABASE_URL))
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _c: lost.set())
+                await conn.add_listener(LIVE_CHANNEL, self._on_notify)
+                self.listening = True
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("LISTEN %s no disponible: %s", LIVE_CHANNEL, e)
+            finally:
+                if self.listening:
+                    # eventos perdidos mientras no se escuchaba
+                    self.listening = False
+                    self._broadcast(RESYNC)
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(LIVE_RECONNECT_SECONDS)
+
+hub = LiveHub()
@@ -0,0 +1,216 @@
+import hashlib, re, time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Métricas en memoria del proceso (sin dependencias externas).
+
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        i = 0
+        for b in self.buckets:
+            if v <= b:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Aproximación por bucket (cota superior del bucket que contiene q)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 3),
+            "avg_ms": round(self.sum / self.count, 3) if self.count else None,
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {("+Inf" if i == len(self.buckets) else str(self.buckets[i])): c
+                        for i, c in enumerate(self.counts)},
+        }
+
+_WS = re.compile(r"\s+")
+_MAX_STATEMENTS = 500
+
+def statement_label(method: str, model: Optional[str], query: Optional[str]) -> str:
+    """
+    Etiqueta estable por sentencia: `products.find_many` para el ORM y
+    `query_raw:<hash> SELECT ...` para SQL crudo.
+    """
+    if query:
+        norm = _WS.sub(" ", query).strip()
+        h = hashlib.sha1(norm.encode()).hexdigest()[:8]
+        return f"{method}:{h} {norm[:60]}"
+    return f"{model}.{method}" if model else method
+
+class RequestStats:
+    """Consultas emitidas durante una petición HTTP (vía contextvar)."""
+    __slots__ = ("queries", "db_ms", "statements")
+    MAX_STATEMENTS = 200
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.statements: List[Tuple[str, float]] = []
+
+    def add(self, sql: str, ms: float) -> None:
+        self.queries += 1
+        self.db_ms += ms
+        if len(self.statements) < self.MAX_STATEMENTS:
+            self.statements.append((sql, ms))
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+class DBMetrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queries_total = 0
+        self.errors_total = 0
+        self.latency = Histogram()
+        self.statements: Dict[str, Histogram] = {}
+
+    def start(self) -> float:
+        self.in_flight += 1
+        if self.in_flight > self.max_in_flight:
+            self.max_in_flight = self.in_flight
+        return time.perf_counter()
+
+    def finish(self, label: str, t0: float, error: bool = False, sql: Optional[str] = None) -> float:
+        ms = (time.perf_counter() - t0) * 1000
+        req = current_request.get()
+        if req is not None:
+            req.add(sql or label, ms)
+        self.in_flight -= 1
+        self.queries_total += 1
+        if error:
+            self.errors_total += 1
+        self.latency.observe(ms)
+        h = self.statements.get(label)
+        if h is None:
+            if len(self.statements) >= _MAX_STATEMENTS:
+                label = "other"
+                h = self.statements.get(label)
+            if h is None:
+                h = self.statements[label] = Histogram()
+        h.observe(ms)
+        return ms
+
+    def snapshot(self, top: int = 50) -> dict:
+        stmts: List[Tuple[str, Histogram]] = sorted(self.statements.items(), key=lambda kv: -kv[1].sum)
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queries_total": self.queries_total,
+            "errors_total": self.errors_total,
+            "latency": self.latency.snapshot(),
+            "statements": {k: h.snapshot() for k, h in stmts[:top]},
+        }
+
+db_metrics = DBMetrics()
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.queries: Dict[Tuple[str, str], Histogram] = {}
+        self.db_time: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+
+    def observe(self, method: str, route: str, status: int, ms: float, stats: RequestStats) -> None:
+        key = (method, route)
+        if key not in self.latency:
+            self.latency[key] = Histogram()
+            self.queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            self.db_time[key] = Histogram()
+        self.latency[key].observe(ms)
+        self.queries[key].observe(stats.queries)
+        self.db_time[key].observe(stats.db_ms)
+        rkey = (method, route, status)
+        self.responses[rkey] = self.responses.get(rkey, 0) + 1
+
+QUERY_COUNT_BUCKETS: Tuple[float, ...] = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+route_metrics = RouteMetrics()
+
+# ---------- Formato de texto Prometheus ----------
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(d: Dict[str, str]) -> str:
+    return ",".join(f'{k}="{_esc(str(v))}"' for k, v in d.items())
+
+def _prom_histogram(out: List[str], name: str, labels: Dict[str, str], h: Histogram, scale: float = 1.0) -> None:
+    acc = 0
+    lb = _labels(labels)
+    sep = "," if lb else ""
+    for i, c in enumerate(h.counts):
+        acc += c
+        le = "+Inf" if i == len(h.buckets) else repr(h.buckets[i] * scale)
+        out.append(f'{name}_bucket{{{lb}{sep}le="{le}"}} {acc}')
+    suffix = f"{{{lb}}}" if lb else ""
+    out.append(f"{name}_sum{suffix} {h.sum * scale}")
+    out.append(f"{name}_count{suffix} {h.count}")
+
+def render_prometheus() -> str:
+    out: List[str] = []
+    rm = route_metrics
+
+    out.append("# HELP http_request_duration_seconds Latencia por ruta.")
+    out.append("# TYPE http_request_duration_seconds histogram")
+    for (m, r), h in rm.latency.items():
+        _prom_histogram(out, "http_request_duration_seconds", {"method": m, "route": r}, h, 0.001)
+
+    out.append("# HELP http_request_db_queries Consultas a la BD por petición.")
+    out.append("# TYPE http_request_db_queries histogram")
+    for (m, r), h in rm.queries.items():
+        _prom_histogram(out, "http_request_db_queries", {"method": m, "route": r}, h)
+
+    out.append("# HELP http_request_db_seconds Tiempo total en BD por petición.")
+    out.append("# TYPE http_request_db_seconds histogram")
+    for (m, r), h in rm.db_time.items():
+        _prom_histogram(out, "http_request_db_seconds", {"method": m, "route": r}, h, 0.001)
+
+    out.append("# HELP http_responses_total Respuestas por ruta y código.")
+    out.append("# TYPE http_responses_total counter")
+    for (m, r, st), n in rm.responses.items():
+        out.append(f"http_responses_total{{{_labels({'method': m, 'route': r, 'status': str(st)})}}} {n}")
+
+    dm = db_metrics
+    out.append("# HELP db_queries_in_flight Consultas en curso.")
+    out.append("# TYPE db_queries_in_flight gauge")
+    out.append(f"db_queries_in_flight {dm.in_flight}")
+    out.append("# HELP db_queries_total Consultas ejecutadas.")
+    out.append("# TYPE db_queries_total counter")
+    out.append(f"db_queries_total {dm.queries_total}")
+    out.append("# HELP db_query_errors_total Consultas con error.")
+    out.append("# TYPE db_query_errors_total counter")
+    out.append(f"db_query_errors_total {dm.errors_total}")
+    out.append("# HELP db_query_duration_seconds Latencia de consultas.")
+    out.append("# TYPE db_query_duration_seconds histogram")
+    _prom_histogram(out, "db_query_duration_seconds", {}, dm.latency, 0.001)
+    return "\n".join(out) + "\n"
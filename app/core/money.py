@@ -0,0 +1,57 @@
+from decimal import Decimal
+from typing import Annotated, Any, Union
+from pydantic import BeforeValidator
+
+# Dinero en centavos enteros: la aritmética de ventas/créditos se hace con int
+# y solo se convierte a Decimal(…, 2) al escribir en la BD o responder.
+
+CENT = Decimal("0.01")
+MAX_DIGITS = 12  # dígitos enteros; las columnas más anchas son Decimal(14,2)
+
+Number = Union[int, float, str, Decimal]
+
+def to_cents(value: Number) -> int:
+    """
+    Convierte un monto en unidades (12.5, "12.50", Decimal("12.5")) a centavos (1250).
+    Los float pasan por repr() para no arrastrar el error binario (0.1 + 0.2).
+    Montos con fracciones de centavo (12.345) se rechazan en vez de redondearse.
+    """
+    if value is None:
+        raise ValueError("Monto requerido")
+    if isinstance(value, bool):
+        raise ValueError("Monto inválido")
+    if isinstance(value, float):
+        value = repr(value)
+    try:
+        d = Decimal(value)
+    except Exception:
+        raise ValueError(f"Monto inválido: {value!r}")
+    if not d.is_finite():
+        raise ValueError(f"Monto inválido: {value!r}")
+    if d and d.adjusted() >= MAX_DIGITS:
+        raise ValueError(f"Monto fuera de rango: {value!r}")
+    # con los dígitos y no con d * 100: exacto, sin la precisión del contexto
+    sign, digits, exp = d.as_tuple()
+    if exp < -2:
+        drop = -2 - exp
+        if any(digits[-drop:]):
+            raise ValueError(f"Monto con más de 2 decimales: {value!r}")
+        digits, exp = digits[:-drop], -2
+    cents = int("".join(map(str, digits)) or "0") * 10 ** (exp + 2)
+    return -cents if sign else cents
+
+def from_cents(cents: int) -> Decimal:
+    """Centavos -> Decimal con 2 decimales (lo que esperan las columnas Decimal(10,2))."""
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+def line_total(unit_cents: int, cantidad: int) -> int:
+    return unit_cents * cantidad
+
+def _coerce_cents(v: Any) -> Any:
+    if isinstance(v, (int, float, str, Decimal)) and not isinstance(v, bool):
+        return to_cents(v)
+    return v
+
+# Tipo para modelos de entrada: el cliente envía unidades (ej. 12.50) y el
+# modelo guarda centavos (1250). Las restricciones gt/ge aplican sobre centavos.
+Money = Annotated[int, BeforeValidator(_coerce_cents)]
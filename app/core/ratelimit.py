@@ -0,0 +1,109 @@
+import asyncio, math, os, time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+from fastapi import HTTPException
+
+# Control de admisión por worker para rutas caras, en dos capas:
+# - token bucket por (usuario, clase de ruta): ritmo sostenido + ráfaga, según rol
+# - tope de concurrencia por clase: lo que exceda espera hasta
+#   RATE_ADMISSION_WAIT_SECONDS y luego recibe 429
+# Las rutas del punto de venta (create_sale, get_by_code, add_payment, sync)
+# no declaran clase: no pasan por aquí y los topes les dejan libre el pool de BD.
+#
+# Configuración por clase y rol: RATE_LIMIT_<CLASE>="admin=120/30,cajero=30/10"
+# (peticiones por minuto / ráfaga; rol ausente = sin límite) y
+# RATE_CONCURRENCY_<CLASE>=4 (0 = sin tope).
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_ADMISSION_WAIT_SECONDS = float(os.getenv("RATE_ADMISSION_WAIT_SECONDS", "2"))
+_MAX_BUCKETS = 10000
+
+# clase -> (límites por rol, concurrencia)
+_DEFAULTS = {
+    "report": ("admin=60/20,cajero=20/5", 4),    # reportes y KPIs agregados
+    "export": ("admin=20/5,cajero=10/3", 2),     # PDF/CSV
+    "list":   ("admin=240/60,cajero=120/30", 8), # listados paginados
+}
+
+def _parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """'admin=60/20,cajero=20/5' -> {'admin': (1.0 por seg, 20), ...}"""
+    out: Dict[str, Tuple[float, float]] = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        role, _, rate = part.partition("=")
+        per_min, _, burst = rate.partition("/")
+        out[role.strip()] = (float(per_min) / 60.0, float(burst or per_min))
+    return out
+
+LIMITS: Dict[str, Dict[str, Tuple[float, float]]] = {
+    cls: _parse_limits(os.getenv(f"RATE_LIMIT_{cls.upper()}", spec)) for cls, (spec, _) in _DEFAULTS.items()
+}
+CONCURRENCY: Dict[str, int] = {
+    cls: int(os.getenv(f"RATE_CONCURRENCY_{cls.upper()}", str(n))) for cls, (_, n) in _DEFAULTS.items()
+}
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.at = time.monotonic()
+
+    def take(self) -> float:
+        """Consume un token; devuelve 0 si se admitió o los segundos a esperar."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.at) * self.rate)
+        self.at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.at) * self.rate >= self.burst
+
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_sems: Dict[str, asyncio.Semaphore] = {}
+
+def _too_many(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(429, detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+def _take(route_class: str, user) -> None:
+    limit = LIMITS.get(route_class, {}).get(user.rol or "cajero")
+    if not limit:
+        return
+    key = (user.id, route_class)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        if len(_buckets) > _MAX_BUCKETS:
+            now = time.monotonic()
+            for k in [k for k, b in _buckets.items() if b.idle(now)]:
+                del _buckets[k]
+        bucket = _buckets[key] = TokenBucket(*limit)
+    wait = bucket.take()
+    if wait:
+        raise _too_many("Demasiadas peticiones, intenta más tarde", wait)
+
+@asynccontextmanager
+async def admit(route_class: str, user) -> AsyncIterator[None]:
+    """Aplica el bucket del usuario y el tope de concurrencia de la clase."""
+    if not RATE_LIMIT_ENABLED:
+        yield
+        return
+    _take(route_class, user)
+    cap = CONCURRENCY.get(route_class, 0)
+    if cap <= 0:
+        yield
+        return
+    sem = _sems.get(route_class)
+    if sem is None:
+        sem = _sems[route_class] = asyncio.Semaphore(cap)
+    try:
+        await asyncio.wait_for(sem.acquire(), RATE_ADMISSION_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise _too_many("Servidor ocupado con otros reportes, intenta más tarde", RATE_ADMISSION_WAIT_SECONDS)
+    try:
+        yield
+    finally:
+        sem.release()
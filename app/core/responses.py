@@ -0,0 +1,85 @@
+import os
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, AsyncIterator, Iterable, Mapping, Optional
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+# Respuestas JSON sin pasar por jsonable_encoder: orjson serializa UUID, datetime
+# y date de forma nativa; Decimal y los modelos (Prisma/pydantic) van por _default.
+# Los endpoints que las usan deben devolver la respuesta directamente: si
+# devuelven un dict, FastAPI vuelve a recorrerlo con jsonable_encoder.
+
+class RawJSON(bytes):
+    """JSON ya serializado (p. ej. json_agg de Postgres) que se inserta tal cual."""
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        # igual que jsonable_encoder: enteros como int, el resto como float
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+def dumps(content: Any) -> bytes:
+    if isinstance(content, RawJSON):
+        return bytes(content)
+    if isinstance(content, dict) and any(isinstance(v, RawJSON) for v in content.values()):
+        return b"{" + b",".join(orjson.dumps(str(k)) + b":" + dumps(v) for k, v in content.items()) + b"}"
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+async def query_json(client, q: str, *params: Any) -> RawJSON:
+    """
+    Ejecuta q y devuelve sus filas como un arreglo JSON armado por Postgres,
+    sin materializar Decimal/datetime en Python.
+    """
+    row = await client.query_first(f"SELECT COALESCE(json_agg(t), '[]')::text AS data FROM ({q}) t", *params)  # type: ignore
+    return RawJSON(row["data"].encode())
+
+# ---------- NDJSON (Accept: application/x-ndjson) ----------
+
+NDJSON = "application/x-ndjson"
+NDJSON_CHUNK_ROWS = int(os.getenv("NDJSON_CHUNK_ROWS", "1000"))
+# El cursor retiene una conexión del pool mientras el cliente descarga
+NDJSON_TX_TIMEOUT_SECONDS = int(os.getenv("NDJSON_TX_TIMEOUT_SECONDS", "120"))
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+async def _cursor_lines(client, q: str, params: tuple) -> AsyncIterator[bytes]:
+    # cursor de servidor dentro de una transacción: Postgres entrega las filas
+    # ya como JSON por lotes y cada lote sale al cliente antes de pedir el siguiente
+    async with client.tx(timeout=timedelta(seconds=NDJSON_TX_TIMEOUT_SECONDS)) as tx:
+        await tx.execute_raw(
+            f"DECLARE ndjson_cur NO SCROLL CURSOR FOR SELECT row_to_json(t)::text AS j FROM ({q}) t", *params
+        )  # type: ignore
+        while True:
+            rows = await tx.query_raw(f"FETCH {NDJSON_CHUNK_ROWS} FROM ndjson_cur")  # type: ignore
+            if rows:
+                yield ("\n".join(r["j"] for r in rows) + "\n").encode()
+            if len(rows) < NDJSON_CHUNK_ROWS:
+                return
+
+async def _row_lines(rows: Iterable[Any]) -> AsyncIterator[bytes]:
+    buf = []
+    for r in rows:
+        buf.append(dumps(r))
+        if len(buf) >= NDJSON_CHUNK_ROWS:
+            yield b"\n".join(buf) + b"\n"
+            buf = []
+    if buf:
+        yield b"\n".join(buf) + b"\n"
+
+def ndjson_query(client, q: str, *params: Any, headers: Optional[Mapping[str, str]] = None) -> StreamingResponse:
+    """Filas de q en NDJSON, leídas de la BD por lotes con un cursor."""
+    return StreamingResponse(_cursor_lines(client, q, params), media_type=NDJSON, headers=headers)
+
+def ndjson_rows(rows: Iterable[Any], headers: Optional[Mapping[str, str]] = None) -> StreamingResponse:
+    """Filas ya calculadas en Python (p. ej. series de cartera) en NDJSON."""
+    return StreamingResponse(_row_lines(rows), media_type=NDJSON, headers=headers)
@@ -1,10 +1,12 @@
 import os, time, jwt
 from typing import Optional
+from uuid import UUID
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from app.db.client import db
+from app.core import ratelimit
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -31,6 +33,10 @@ def create_access_token(*, subject: str, role: str, expires_in: Optional[int] =
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await user_from_token(token)
+
+async def user_from_token(token: str):
+    """Usuario del JWT; también para SSE/WebSocket, que reciben el token por query."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
@@ -43,9 +49,47 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise HTTPException(status_code=401, detail="Usuario no existe")
     return user
 
-def require_role(*roles: str):
+def require_role(*roles: str, limit: Optional[str] = None):
+    """
+    Exige uno de los roles. Con limit (clase de ruta: report|export|list) aplica
+    además el límite por usuario y el tope de concurrencia de esa clase
+    (ver app.core.ratelimit); el cupo se libera al terminar la respuesta.
+    """
     async def dependency(user=Depends(get_current_user)):
         if (user.rol or "cajero") not in roles:
             raise HTTPException(status_code=403, detail="Permisos insuficientes")
         return user
+    if limit is None:
+        return dependency
+
+    async def limited(user=Depends(dependency)):
+        async with ratelimit.admit(limit, user):
+            yield user
+    return limited
+
+def store_scope(*roles: str, limit: Optional[str] = None):
+    """
+    Tienda efectiva para listados y reportes (None = toda la cadena).
+    - Usuarios con tienda asignada quedan fijados a ella (admin incluido, salvo
+      que no tenga tienda); pedir otra tienda -> 403.
+    - Usuarios sin tienda pueden filtrar con ?tienda_id=.
+    """
+    async def dependency(
+        tienda_id: Optional[UUID] = Query(None, description="Solo para usuarios sin tienda asignada"),
+        user=Depends(require_role(*roles, limit=limit)),
+    ) -> Optional[str]:
+        requested = str(tienda_id) if tienda_id else None
+        if user.tienda_id:
+            if requested and requested != user.tienda_id:
+                raise HTTPException(status_code=403, detail="Sin acceso a otra tienda")
+            return user.tienda_id
+        return requested
     return dependency
+
+def sale_store(user, requested: Optional[str]) -> Optional[str]:
+    """Tienda con la que se registra una venta/crédito: la del usuario si tiene una."""
+    if user.tienda_id:
+        if requested and requested != user.tienda_id:
+            raise HTTPException(status_code=403, detail="Sin acceso a otra tienda")
+        return user.tienda_id
+    return requested
@@ -0,0 +1,230 @@
+import asyncio, os, time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.core.etag import watermarks
+from app.db.credit_flow import trunc
+from app.db.scope import NO_STORE
+
+# Series de reportes en memoria: totales diarios por tienda en matrices NumPy
+# (métrica x tienda x día, centavos en int64) cargadas una vez por worker. Los
+# buckets day/week/month, saldos acumulados y tasas se calculan con operaciones
+# vectorizadas sobre esas matrices; cambiar de granularidad no consulta la BD.
+#
+# Frescura: cada ANALYTICS_CHECK_SECONDS se leen las marcas de agua del dominio
+# (report_watermarks); si cambiaron se recargan los últimos
+# ANALYTICS_REFRESH_DAYS días, o desde antes si report_touched_days registra
+# escrituras en días más viejos (sync offline atrasado, anulaciones de días
+# pasados). La recarga completa periódica queda como red de seguridad.
+
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "1") == "1"
+ANALYTICS_CHECK_SECONDS = float(os.getenv("ANALYTICS_CHECK_SECONDS", "1"))
+ANALYTICS_REFRESH_DAYS = int(os.getenv("ANALYTICS_REFRESH_DAYS", "3"))
+ANALYTICS_FULL_RELOAD_SECONDS = float(os.getenv("ANALYTICS_FULL_RELOAD_SECONDS", "3600"))
+
+_EPOCH = date(1970, 1, 1)
+
+def _num(d: date) -> int:
+    return (d - _EPOCH).days
+
+async def _touched(client, domain: str) -> Dict[int, int]:
+    """Versión por día pasado tocado (día desde 1970 -> versión)."""
+    rows = await client.query_raw(
+        "SELECT (day - DATE '1970-01-01') AS d, version FROM report_touched_days WHERE domain = $1", domain
+    )  # type: ignore
+    return {int(r["d"]): int(r["version"]) for r in rows}
+
+_SALES_SQL = f"""
+SELECT (x.day - DATE '1970-01-01') AS d, x.tienda,
+       SUM(x.n)::bigint AS num_ventas, SUM(x.c)::bigint AS total
+FROM (
+  SELECT s.created_at::date AS day, COALESCE(s.tienda_id::text, '{NO_STORE}') AS tienda,
+         COUNT(*) AS n, ROUND(SUM(s.total) * 100) AS c
+  FROM sales s
+  WHERE s.created_at >= COALESCE($1::date, '-infinity') AND COALESCE(s.anulada,false) = false
+  GROUP BY 1, 2
+  UNION ALL
+  SELECT a.day, COALESCE(a.tienda_id::text, '{NO_STORE}'), SUM(a.num_ventas), ROUND(SUM(a.total_vendido) * 100)
+  FROM sales_archive_daily a
+  WHERE a.day >= COALESCE($1::date, '-infinity')
+  GROUP BY 1, 2
+) x
+GROUP BY 1, 2
+"""
+
+_CREDITS_SQL = f"""
+SELECT (x.day - DATE '1970-01-01') AS d, x.tienda,
+       SUM(x.issued)::bigint AS issued, SUM(x.paid)::bigint AS paid
+FROM (
+  SELECT c.created_at::date AS day, COALESCE(c.tienda_id::text, '{NO_STORE}') AS tienda,
+         ROUND(c.total * 100) AS issued, 0 AS paid
+  FROM credits c
+  WHERE c.created_at >= COALESCE($1::date, '-infinity')
+  UNION ALL
+  SELECT p.paid_at::date, COALESCE(c.tienda_id::text, '{NO_STORE}'), 0, ROUND(p.amount * 100)
+  FROM credit_payments p
+  JOIN credits c ON c.id = p.credit_id
+  WHERE p.paid_at >= COALESCE($1::date, '-infinity')
+) x
+GROUP BY 1, 2
+"""
+
+class DailySeries:
+    """Totales diarios por tienda de un dominio de marcas de agua."""
+
+    def __init__(self, domain: str, metrics: Tuple[str, ...], sql: str):
+        self.domain = domain
+        self.metrics = metrics
+        self.sql = sql
+        self.first = 0                      # día (desde 1970) de la columna 0
+        self.stores: Dict[str, int] = {}    # tienda_id -> fila
+        self.data: Optional[np.ndarray] = None
+        self.marks: Optional[Dict[str, int]] = None
+        self.touched: Dict[int, int] = {}
+        self.checked_at = 0.0
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self.data is not None and time.monotonic() - self.checked_at < ANALYTICS_CHECK_SECONDS
+
+    async def ensure(self, client) -> None:
+        if self._fresh():
+            return
+        async with self._lock:
+            if self._fresh():
+                return
+            # marcas antes que datos: una escritura intermedia solo provoca otra recarga
+            marks = await watermarks(client, self.domain)
+            today = _num(date.today())
+            if self.data is None or time.monotonic() - self.loaded_at >= ANALYTICS_FULL_RELOAD_SECONDS:
+                touched = await _touched(client, self.domain)
+                await self._load(client, None, today)
+                self.loaded_at = time.monotonic()
+                self.touched = touched
+            elif marks != self.marks or today >= self.first + self.data.shape[2]:
+                since = today - ANALYTICS_REFRESH_DAYS
+                touched = await _touched(client, self.domain)
+                older = [d for d, v in touched.items() if self.touched.get(d) != v and d < since]
+                await self._load(client, min(older) if older else since, today)
+                self.touched = touched
+            self.marks = marks
+            self.checked_at = time.monotonic()
+
+    async def _load(self, client, since: Optional[int], today: int) -> None:
+        rows = await client.query_raw(self.sql, _EPOCH + timedelta(days=since) if since is not None else None)  # type: ignore
+        days = np.fromiter((r["d"] for r in rows), dtype=np.int64, count=len(rows))
+        if since is None:
+            self.data, self.stores = None, {}
+            self.first = int(days.min()) if len(days) else today
+        else:
+            since = max(since, self.first)
+        self._resize(min(self.first, int(days.min()) if len(days) else today), today)
+        for r in rows:
+            if r["tienda"] not in self.stores:
+                self._add_store(r["tienda"])
+        if since is not None:
+            self.data[:, :, since - self.first:] = 0
+        if not len(rows):
+            return
+        rows_idx = np.fromiter((self.stores[r["tienda"]] for r in rows), dtype=np.int64, count=len(rows))
+        vals = np.array([[r[m] for m in self.metrics] for r in rows], dtype=np.int64)
+        self.data[:, rows_idx, days - self.first] = vals.T
+
+    def _resize(self, first: int, last: int) -> None:
+        n = last - first + 1
+        grown = np.zeros((len(self.metrics), len(self.stores), n), dtype=np.int64)
+        if self.data is not None:
+            keep = min(self.data.shape[2], last - self.first + 1)
+            off = self.first - first
+            grown[:, :, off:off + keep] = self.data[:, :, :keep]
+        self.data, self.first = grown, first
+
+    def _add_store(self, tienda: str) -> None:
+        self.stores[tienda] = len(self.stores)
+        self.data = np.concatenate(
+            [self.data, np.zeros((self.data.shape[0], 1, self.data.shape[2]), dtype=np.int64)], axis=1)
+
+    def earliest(self, tienda: Optional[str]) -> Optional[int]:
+        """Primer día con datos (de la tienda o de la cadena)."""
+        if self.data is None:
+            return None
+        if tienda is None:
+            src = self.data
+        elif tienda in self.stores:
+            src = self.data[:, self.stores[tienda]:self.stores[tienda] + 1, :]
+        else:
+            return None
+        nz = np.flatnonzero(src.any(axis=(0, 1)))
+        return self.first + int(nz[0]) if len(nz) else None
+
+    def window(self, tienda: Optional[str], start: int, end: int) -> np.ndarray:
+        """Métricas diarias (métrica x día) en [start, end], con ceros fuera de lo cargado."""
+        out = np.zeros((len(self.metrics), end - start + 1), dtype=np.int64)
+        if self.data is None:
+            return out
+        lo, hi = max(start, self.first), min(end, self.first + self.data.shape[2] - 1)
+        if lo > hi:
+            return out
+        src = self.data[:, :, lo - self.first:hi - self.first + 1]
+        if tienda is None:
+            vals = src.sum(axis=1)
+        elif tienda in self.stores:
+            vals = src[:, self.stores[tienda], :]
+        else:
+            return out
+        out[:, lo - start:hi - start + 1] = vals
+        return out
+
+_sales = DailySeries("sales", ("num_ventas", "total"), _SALES_SQL)
+_credits = DailySeries("credits", ("issued", "paid"), _CREDITS_SQL)
+
+async def preload(client) -> None:
+    """Carga ambas series (calentamiento al arrancar el worker)."""
+    await _sales.ensure(client)
+    await _credits.ensure(client)
+
+def _rollup(series: DailySeries, g: str, d_from: Optional[date], d_to: Optional[date],
+            tienda: Optional[str]) -> Tuple[List[str], np.ndarray]:
+    """Buckets completos (inicio del bucket de d_from .. d_to) y sus sumas (métrica x bucket)."""
+    today = date.today()
+    first = _num(d_from) if d_from else series.earliest(tienda)
+    start = _num(trunc(_EPOCH + timedelta(days=first), g)) if first is not None else _num(today)
+    end = _num(d_to or today)
+    if start > end:
+        return [], np.zeros((len(series.metrics), 0), dtype=np.int64)
+    days = np.arange(start, end + 1, dtype=np.int64)
+    if g == "day":
+        ids = days
+    elif g == "week":
+        ids = (days + 3) // 7  # 1970-01-01 fue jueves; semanas desde el lunes
+    else:
+        ids = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    sums = np.add.reduceat(series.window(tienda, start, end), starts, axis=1)
+    labels = np.datetime_as_string(days[starts].astype("datetime64[D]")).tolist()
+    return labels, sums
+
+async def sales_timeseries(client, g: str, d_from: Optional[date], d_to: Optional[date],
+                           tienda: Optional[str] = None) -> List[dict]:
+    """Ventas no anuladas (incluye particiones archivadas) por bucket."""
+    await _sales.ensure(client)
+    labels, (n, total) = _rollup(_sales, g, d_from, d_to, tienda)
+    return [
+        {"bucket": b, "total_vendido": t, "num_ventas": c}
+        for b, t, c in zip(labels, (total / 100).tolist(), n.tolist())
+    ]
+
+async def credit_flow(client, g: str, d_from: Optional[date], d_to: Optional[date],
+                      tienda: Optional[str] = None) -> List[dict]:
+    """Mismas columnas que credit_flow.credit_flow, calculadas en memoria."""
+    await _credits.ensure(client)
+    labels, (issued, paid) = _rollup(_credits, g, d_from, d_to, tienda)
+    net = issued - paid
+    rate = np.round(np.divide(paid, issued, out=np.zeros(len(labels)), where=issued > 0), 4)
+    return [
+        {"bucket": b, "credit_issued": i, "payments_received": p, "net_change": nc,
+         "outstanding_end": o, "repayment_rate": r}
+        for b, i, p, nc, o, r in zip(labels, (issued / 100).tolist(), (paid / 100).tolist(),
+                                     (net / 100).tolist(), (np.cumsum(net) / 100).tolist(), rate.tolist())
+    ]
@@ -0,0 +1,14 @@
+import os
+from datetime import timedelta
+
+# Transacciones de mantenimiento (reconstrucción de acumulados, archivo de
+# particiones): sobre millones de filas duran minutos y Prisma corta una
+# transacción interactiva a los 5s por defecto.
+
+BULK_TX_TIMEOUT_SECONDS = int(os.getenv("BULK_TX_TIMEOUT_SECONDS", "3600"))
+BULK_TX_MAX_WAIT_SECONDS = int(os.getenv("BULK_TX_MAX_WAIT_SECONDS", "30"))  # esperando conexión libre
+
+def bulk_tx(client):
+    """client.tx() con tiempos para trabajo masivo."""
+    return client.tx(timeout=timedelta(seconds=BULK_TX_TIMEOUT_SECONDS),
+                     max_wait=timedelta(seconds=BULK_TX_MAX_WAIT_SECONDS))
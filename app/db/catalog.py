@@ -0,0 +1,94 @@
+import os
+from typing import Any, AsyncIterator, Dict, List
+from app.db.inventory import LIVE_STOCK
+
+# Sincronización incremental del catálogo: cada alta/cambio de producto toma un
+# número de catalog_version_seq (trigger) y cada borrado deja una lápida con el
+# suyo. Un POS guarda el cursor (última versión vista) y pide solo lo posterior.
+# Las ventas no tocan la fila del producto (libro de stock, ver inventory): su
+# efecto en el stock llega con la nueva versión que deja cada compactación.
+
+# Cambios más recientes que esto no se entregan todavía: su transacción puede
+# seguir abierta y una versión menor podría aparecer después del cursor.
+CATALOG_SETTLE_SECONDS = int(os.getenv("CATALOG_SETTLE_SECONDS", "5"))
+
+# stock actual (saldo compactado + libro); products se consulta con alias p
+PRODUCT_COLUMNS = f"""
+  p.id, p.codigo_unico, p.nombre, p.categoria, p.departamento, p.tipo,
+  p.costo, p.precio, {LIVE_STOCK} AS stock, p.tienda_id, p.version, p.updated_at
+"""
+
+async def safe_cursor(client) -> int:
+    """Mayor versión que es seguro entregar (todas las menores ya son visibles)."""
+    row = await client.query_first(
+        """
+        SELECT COALESCE(
+          LEAST(
+            (SELECT MIN(version) FROM products
+              WHERE updated_at > now() - make_interval(secs => $1)),
+            (SELECT MIN(version) FROM product_tombstones
+              WHERE deleted_at > now() - make_interval(secs => $1))
+          ) - 1,
+          -- no last_value de la secuencia: en una réplica va hasta 32 valores
+          -- adelantado (WAL por lotes) y el cursor saltaría versiones futuras
+          GREATEST((SELECT MAX(version) FROM products),
+                   (SELECT MAX(version) FROM product_tombstones))
+        ) AS cursor
+        """,
+        CATALOG_SETTLE_SECONDS,
+    )  # type: ignore
+    return int(row["cursor"]) if row and row["cursor"] is not None else 0
+
+async def changes(client, since: int, limit: int) -> Dict[str, Any]:
+    """
+    Altas/cambios y borrados con version en (since, cursor], en orden de versión.
+    Si hay más de `limit`, devuelve has_more=true y el cursor del último entregado.
+    """
+    upper = await safe_cursor(client)
+    upserts = await client.query_raw(
+        f"""
+        SELECT {PRODUCT_COLUMNS} FROM products p
+        WHERE p.version > $1 AND p.version <= $2
+        ORDER BY p.version
+        LIMIT $3
+        """,
+        since, upper, limit + 1,
+    )  # type: ignore
+    deletions = await client.query_raw(
+        """
+        SELECT version, product_id, codigo_unico, deleted_at FROM product_tombstones
+        WHERE version > $1 AND version <= $2
+        ORDER BY version
+        LIMIT $3
+        """,
+        since, upper, limit + 1,
+    )  # type: ignore
+
+    merged: List[tuple] = sorted(
+        [(r["version"], "u", r) for r in upserts] + [(r["version"], "d", r) for r in deletions],
+        key=lambda x: x[0],
+    )
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+    cursor = merged[-1][0] if has_more else max(upper, since)
+    return {
+        "cursor": cursor,
+        "has_more": has_more,
+        "upserts": [r for _, kind, r in merged if kind == "u"],
+        "deletions": [r for _, kind, r in merged if kind == "d"],
+    }
+
+async def iter_products(client, page_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Recorre todo el catálogo por páginas (keyset sobre id)."""
+    last = "00000000-0000-0000-0000-000000000000"
+    while True:
+        rows = await client.query_raw(
+            f"SELECT {PRODUCT_COLUMNS} FROM products p WHERE p.id > $1::uuid ORDER BY p.id LIMIT $2",
+            last, page_size,
+        )  # type: ignore
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]["id"]
@@ -1,6 +1,113 @@
+import logging, os, time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from prisma import Prisma
-db = Prisma()
+from app.core.metrics import db_metrics, statement_label
+
+log = logging.getLogger("gratus.db")
+
+# --- Pool y timeouts ---
+# Vacío = valor por defecto del motor de Prisma (connection_limit = núcleos*2+1,
+# pool_timeout = 10s, connect_timeout = 5s, sin socket_timeout).
+DB_POOL_SIZE = os.getenv("DB_POOL_SIZE", "")
+DB_POOL_TIMEOUT = os.getenv("DB_POOL_TIMEOUT", "")        # seg. esperando conexión libre
+DB_CONNECT_TIMEOUT = os.getenv("DB_CONNECT_TIMEOUT", "")  # seg. para abrir conexión
+DB_QUERY_TIMEOUT = os.getenv("DB_QUERY_TIMEOUT", "")      # seg. por consulta
+
+def pool_settings() -> Dict[str, str]:
+    return {k: v for k, v in {
+        "connection_limit": DB_POOL_SIZE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "connect_timeout": DB_CONNECT_TIMEOUT,
+        "socket_timeout": DB_QUERY_TIMEOUT,
+    }.items() if v}
+
+def _with_pool_params(url: str) -> str:
+    """Agrega los parámetros de pool a la URL sin pisar los que ya traiga."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    for k, v in pool_settings().items():
+        query.setdefault(k, v)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+class InstrumentedPrisma(Prisma):
+    """
+    Prisma con contadores por sentencia (en curso, latencia, errores).
+    Todas las operaciones (ORM y SQL crudo) pasan por _execute.
+    """
+    async def _execute(self, **kwargs: Any) -> Any:
+        model = kwargs.get("model")
+        model = getattr(model, "__prisma_model__", model)
+        args = kwargs.get("arguments") or {}
+        query = args.get("query") if isinstance(args, dict) else None
+        label = statement_label(kwargs.get("method", "?"), model and str(model), query)
+        t0 = db_metrics.start()
+        try:
+            result = await super()._execute(**kwargs)  # type: ignore[misc]
+        except Exception:
+            db_metrics.finish(label, t0, error=True, sql=query)
+            raise
+        db_metrics.finish(label, t0, sql=query)
+        return result
+
+def _client(url: Optional[str]) -> Prisma:
+    kwargs: Dict[str, Any] = {}
+    if url:
+        kwargs["datasource"] = {"url": _with_pool_params(url)}
+    if DB_QUERY_TIMEOUT:
+        kwargs["http"] = {"timeout": float(DB_QUERY_TIMEOUT)}
+    return InstrumentedPrisma(**kwargs)
+
+db = _client(os.getenv("DATABASE_URL", ""))
+
+# --- Réplica de lectura (opcional) ---
+# READ_DATABASE_URL apunta a una réplica (o a la misma BD en local). Reportes,
+# listados y exportaciones leen de ahí mientras el retraso de replicación no
+# supere REPLICA_MAX_LAG_SECONDS; si la supera o la réplica falla, se usa el primario.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", "")
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+
+db_read = _client(READ_DATABASE_URL) if READ_DATABASE_URL else db
+
+_replica_state = {"checked_at": 0.0, "ok": True}
+
+async def _replica_lag() -> float:
+    row = await db_read.query_first("""
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() THEN 0
+      WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+      ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::float8 AS lag
+    """)  # type: ignore
+    return float(row["lag"]) if row else 0.0
+
+async def read_db() -> Prisma:
+    """
+    Cliente para lecturas que toleran REPLICA_MAX_LAG_SECONDS de atraso.
+    Las escrituras (ventas, abonos, anulaciones) siempre usan `db`.
+    """
+    if db_read is db:
+        return db
+    now = time.monotonic()
+    if now - _replica_state["checked_at"] >= REPLICA_LAG_CHECK_SECONDS:
+        _replica_state["checked_at"] = now
+        try:
+            _replica_state["ok"] = db_read.is_connected() and await _replica_lag() <= REPLICA_MAX_LAG_SECONDS
+        except Exception as e:
+            log.warning("réplica no disponible, usando primario: %s", e)
+            _replica_state["ok"] = False
+    return db_read if _replica_state["ok"] else db
+
 async def connect_db():
     await db.connect()
+    if db_read is not db:
+        try:
+            await db_read.connect()
+        except Exception as e:
+            log.warning("no se pudo conectar a la réplica, usando primario: %s", e)
+
 async def disconnect_db():
+    if db_read is not db and db_read.is_connected():
+        await db_read.disconnect()
     await db.disconnect()
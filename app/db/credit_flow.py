@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from app.core.money import to_cents, from_cents
+from app.db.scope import store_filter
+
+# Motor único de flujo de cartera: emitido, abonado, neto, saldo acumulado y
+# tasa de recuperación por bucket (day|week|month) en una sola consulta.
+# Los buckets ya cerrados (anteriores al bucket actual) no cambian, así que se
+# guardan en memoria y solo se vuelve a consultar el bucket en curso.
+# Todo se separa por tienda (None = toda la cadena).
+
+_MAX_CACHE = 20000
+_closed: Dict[Tuple[Optional[str], str, date], Tuple[int, int]] = {}   # (tienda, g, bucket) -> (issued, paid) en centavos
+_earliest: Dict[Optional[str], date] = {}
+
+def trunc(d: date, g: str) -> date:
+    if g == "day":
+        return d
+    if g == "week":
+        return d - timedelta(days=d.weekday())  # lunes, igual que date_trunc('week')
+    return d.replace(day=1)
+
+def next_bucket(d: date, g: str) -> date:
+    if g == "day":
+        return d + timedelta(days=1)
+    if g == "week":
+        return d + timedelta(days=7)
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+async def _earliest_date(client, tienda: Optional[str] = None) -> Optional[date]:
+    if tienda not in _earliest:
+        params: list = []
+        tf = store_filter("c.tienda_id", tienda, params)
+        row = await client.query_first(f"""
+        SELECT LEAST(
+          (SELECT MIN(c.created_at)::date FROM credits c WHERE true{tf}),
+          (SELECT MIN(p.paid_at)::date FROM credit_payments p JOIN credits c ON c.id = p.credit_id WHERE true{tf})
+        )::text AS dmin
+        """, *params)  # type: ignore
+        if row and row.get("dmin"):
+            _earliest[tienda] = date.fromisoformat(row["dmin"])
+    return _earliest.get(tienda)
+
+async def _fetch(client, g: str, start: date, end: date, tienda: Optional[str] = None) -> Dict[date, Tuple[int, int]]:
+    """Emitido y abonado por bucket en [start, end), un solo recorrido."""
+    params: list = [start, end]
+    tf = store_filter("c.tienda_id", tienda, params)
+    pay_join = "JOIN credits c ON c.id = p.credit_id" if tf else ""
+    q = f"""
+    SELECT x.bucket_date::text AS bucket,
+           COALESCE(SUM(x.issued),0) AS credit_issued,
+           COALESCE(SUM(x.paid),0)   AS payments_received
+    FROM (
+      SELECT date_trunc('{g}', c.created_at)::date AS bucket_date, c.total AS issued, 0::numeric AS paid
+      FROM credits c
+      WHERE c.created_at >= $1::date AND c.created_at < $2::date{tf}
+      UNION ALL
+      SELECT date_trunc('{g}', p.paid_at)::date, 0::numeric, p.amount
+      FROM credit_payments p
+      {pay_join}
+      WHERE p.paid_at >= $1::date AND p.paid_at < $2::date{tf}
+    ) x
+    GROUP BY 1
+    """
+    rows = await client.query_raw(q, *params)  # type: ignore
+    return {
+        date.fromisoformat(r["bucket"]): (to_cents(r["credit_issued"]), to_cents(r["payments_received"]))
+        for r in rows
+    }
+
+async def credit_flow(client, g: str, d_from: Optional[date], d_to: Optional[date],
+                      tienda: Optional[str] = None) -> List[dict]:
+    """
+    Serie de cartera por bucket completo entre d_from y d_to (por defecto desde
+    el primer crédito/pago hasta hoy):
+    - credit_issued, payments_received, net_change
+    - outstanding_end: acumulado de net_change dentro del rango
+    - repayment_rate: payments / issued (0 si no hubo emisión)
+    """
+    today = date.today()
+    dmin = d_from or await _earliest_date(client, tienda) or today
+    dmax = d_to or today
+    if dmin > dmax:
+        return []
+
+    # un día de gracia: con réplica de lectura, un bucket recién cerrado podría
+    # no tener aún todas sus filas
+    current = trunc(today - timedelta(days=1), g)
+    buckets: List[date] = []
+    b = trunc(dmin, g)
+    while b <= dmax:
+        buckets.append(b)
+        b = next_bucket(b, g)
+
+    missing = [b for b in buckets if b >= current or (tienda, g, b) not in _closed]
+    fresh: Dict[date, Tuple[int, int]] = {}
+    if missing:
+        fresh = await _fetch(client, g, missing[0], next_bucket(missing[-1], g), tienda)
+        if len(_closed) > _MAX_CACHE:
+            _closed.clear()
+        for b in missing:
+            if b < current:
+                _closed[(tienda, g, b)] = fresh.get(b, (0, 0))
+
+    out: List[dict] = []
+    running = 0
+    for b in buckets:
+        issued, paid = fresh[b] if b in fresh else _closed.get((tienda, g, b), (0, 0))
+        net = issued - paid
+        running += net
+        rate = (Decimal(paid) / Decimal(issued)).quantize(Decimal("0.0001")) if issued > 0 else Decimal(0)
+        out.append({
+            "bucket": b.isoformat(),
+            "credit_issued": from_cents(issued),
+            "payments_received": from_cents(paid),
+            "net_change": from_cents(net),
+            "outstanding_end": from_cents(running),
+            "repayment_rate": rate,
+        })
+    return out
@@ -0,0 +1,97 @@
+from typing import Any, Dict, Optional
+from app.db.bulk import bulk_tx
+
+# Saldo por cliente (saldo pendiente, créditos abiertos, vencimiento más
+# próximo) mantenido en la misma transacción que crea el crédito o registra el
+# abono. La aprobación de una venta a crédito y el top de deudores leen una fila
+# en vez de agregar toda la cartera del cliente.
+#
+# Lo vencido no se guarda: cambia con la fecha sin que nadie escriba. exposure()
+# lo deriva de proximo_vencimiento y suma el monto vencido de los créditos
+# abiertos del cliente (idx_credits_customer_open, solo créditos con saldo).
+
+async def lock_exposure(client, customer_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Bloquea al cliente (serializa créditos concurrentes del mismo cliente) y
+    devuelve su límite y saldo actual, o None si no existe.
+    """
+    return await client.query_first(
+        """
+        SELECT cu.limite_credito, COALESCE(cb.saldo, 0) AS saldo
+        FROM customers cu
+        LEFT JOIN customer_balances cb ON cb.customer_id = cu.id
+        WHERE cu.id = $1::uuid
+        FOR UPDATE OF cu
+        """,
+        customer_id,
+    )  # type: ignore
+
+async def add_credit(client, customer_id: str, amount, due_date) -> None:
+    """Suma un crédito nuevo. Llamar dentro de la transacción que lo crea."""
+    await client.execute_raw(
+        """
+        INSERT INTO customer_balances (customer_id, saldo, creditos_abiertos, proximo_vencimiento)
+        VALUES ($1::uuid, $2::numeric, 1, $3::date)
+        ON CONFLICT (customer_id) DO UPDATE SET
+          saldo = customer_balances.saldo + EXCLUDED.saldo,
+          creditos_abiertos = customer_balances.creditos_abiertos + 1,
+          proximo_vencimiento = LEAST(customer_balances.proximo_vencimiento, EXCLUDED.proximo_vencimiento),
+          updated_at = now()
+        """,
+        customer_id, amount, due_date,
+    )  # type: ignore
+
+async def apply_payment(client, customer_id: str, amount, closed: bool) -> None:
+    """
+    Resta un abono. Si saldó el crédito, recalcula el vencimiento más próximo
+    entre los créditos abiertos del cliente (idx_credits_customer_open). Llamar
+    después de actualizar el crédito, en la misma transacción.
+    """
+    await client.execute_raw(
+        """
+        UPDATE customer_balances SET
+          saldo = saldo - $2::numeric,
+          creditos_abiertos = creditos_abiertos - (CASE WHEN $3::boolean THEN 1 ELSE 0 END),
+          proximo_vencimiento = CASE WHEN $3::boolean
+            THEN (SELECT MIN(c.due_date) FROM credits c WHERE c.customer_id = $1::uuid AND c.saldo > 0)
+            ELSE proximo_vencimiento END,
+          updated_at = now()
+        WHERE customer_id = $1::uuid
+        """,
+        customer_id, amount, closed,
+    )  # type: ignore
+
+async def exposure(client, customer_id: str) -> Optional[Dict[str, Any]]:
+    """Exposición del cliente: límite, saldo, disponible y lo vencido (si hay y cuánto)."""
+    return await client.query_first(
+        """
+        SELECT cu.id AS customer_id, cu.nombre, cu.limite_credito,
+               COALESCE(cb.saldo, 0) AS saldo,
+               COALESCE(cb.creditos_abiertos, 0) AS creditos_abiertos,
+               cb.proximo_vencimiento,
+               COALESCE(cb.proximo_vencimiento < current_date, false) AS vencido,
+               COALESCE((
+                 SELECT SUM(c.saldo) FROM credits c
+                 WHERE c.customer_id = cu.id AND c.saldo > 0 AND c.due_date < current_date
+               ), 0) AS monto_vencido,
+               cu.limite_credito - COALESCE(cb.saldo, 0) AS disponible
+        FROM customers cu
+        LEFT JOIN customer_balances cb ON cb.customer_id = cu.id
+        WHERE cu.id = $1::uuid
+        """,
+        customer_id,
+    )  # type: ignore
+
+async def rebuild(client) -> int:
+    """Recalcula todos los saldos desde credits. Devuelve filas escritas."""
+    async with bulk_tx(client) as tx:
+        await tx.execute_raw("DELETE FROM customer_balances")  # type: ignore
+        return await tx.execute_raw(
+            """
+            INSERT INTO customer_balances (customer_id, saldo, creditos_abiertos, proximo_vencimiento)
+            SELECT customer_id, SUM(saldo), COUNT(*), MIN(due_date)
+            FROM credits
+            WHERE saldo > 0
+            GROUP BY 1
+            """
+        )  # type: ignore
@@ -0,0 +1,55 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+from app.db.scope import NO_STORE
+
+# Cierres de día inmutables: al cerrar se guarda el cuerpo completo de
+# close_day (resumen, por método e items) y los GET de días cerrados lo sirven
+# tal cual, sin agregar ventas. Un re-cierre (anulaciones tardías) agrega una
+# revisión nueva con su motivo; las anteriores quedan para auditoría.
+# tienda_id = NO_STORE es el cierre de toda la cadena.
+
+def store_key(tienda: Optional[str]) -> str:
+    return tienda or NO_STORE
+
+async def latest(client, d: date, tienda: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Última revisión del cierre: {revision, body} con body ya serializado, o None."""
+    return await client.query_first(
+        """
+        SELECT revision, snapshot::text AS body
+        FROM day_closes
+        WHERE day = $1::date AND tienda_id = $2::uuid
+        ORDER BY revision DESC
+        LIMIT 1
+        """,
+        d, store_key(tienda),
+    )  # type: ignore
+
+async def insert(client, d: date, tienda: Optional[str], revision: int, snapshot: str,
+                 closed_by: Optional[str], motivo: Optional[str]) -> bool:
+    """
+    Guarda la revisión dada. False si otra petición ya la insertó (cierre
+    concurrente); nunca reescribe una revisión existente.
+    """
+    rows = await client.query_raw(
+        """
+        INSERT INTO day_closes (day, tienda_id, revision, snapshot, closed_by, motivo)
+        VALUES ($1::date, $2::uuid, $3, $4::jsonb, $5::uuid, $6)
+        ON CONFLICT (day, tienda_id, revision) DO NOTHING
+        RETURNING revision
+        """,
+        d, store_key(tienda), revision, snapshot, closed_by, motivo,
+    )  # type: ignore
+    return bool(rows)
+
+async def history(client, d: date, tienda: Optional[str]) -> List[Dict[str, Any]]:
+    """Revisiones del cierre con sus totales (sin los items)."""
+    return await client.query_raw(
+        """
+        SELECT revision, closed_at, closed_by, motivo,
+               snapshot->'summary' AS summary
+        FROM day_closes
+        WHERE day = $1::date AND tienda_id = $2::uuid
+        ORDER BY revision
+        """,
+        d, store_key(tienda),
+    )  # type: ignore
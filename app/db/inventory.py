@@ -0,0 +1,291 @@
+import asyncio, logging, os
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Stock como libro de movimientos (stock_movements, solo inserción): ventas,
+# anulaciones, ajustes y entradas agregan una fila en vez de actualizar
+# products.stock. products.stock es el saldo compactado hasta
+# stock_compaction.through_id y el stock actual es ese saldo más los
+# movimientos posteriores (LIVE_STOCK). compact() pliega cada
+# INVENTORY_COMPACT_SECONDS los movimientos confirmados y guarda el saldo de
+# cierre de cada día en stock_snapshots; el stock a una fecha sale del último
+# cierre más los movimientos de ese día.
+#
+# Quien escribe en el libro toma el candado compartido LEDGER_LOCK hasta su
+# commit; compact() toma el exclusivo antes de elegir el corte, así ningún
+# movimiento con id menor al corte queda sin confirmar (los ids se asignan
+# antes del commit) y todo lo registrado después tiene created_at posterior.
+# Las ventas y adjust() toman un candado por producto (advisory, no el de la
+# fila: ediciones del catálogo y compact() no lo esperan) y revisan el stock
+# bajo él: dos ventas del último artículo no pasan ambas. El costo es que las
+# ventas de un mismo producto se serializan durante su transacción; las de
+# productos distintos no se esperan.
+# created_at es la hora de registro: una venta offline entra al sincronizarse.
+
+INVENTORY_COMPACT_SECONDS = int(os.getenv("INVENTORY_COMPACT_SECONDS", "60"))
+# espera máxima de compact() por el candado exclusivo; si vence, reintenta en la próxima vuelta
+INVENTORY_COMPACT_LOCK_TIMEOUT = os.getenv("INVENTORY_COMPACT_LOCK_TIMEOUT", "2s")
+
+LEDGER_LOCK = "hashtext('stock_ledger')"
+
+log = logging.getLogger("gratus.inventory")
+
+def live_stock_sql(alias: str = "p") -> str:
+    """Expresión SQL del stock actual del producto `alias` (saldo + movimientos sin compactar)."""
+    return f"""(COALESCE({alias}.stock, 0) + COALESCE((
+      SELECT SUM(m.delta) FROM stock_movements m
+      WHERE m.product_id = {alias}.id AND m.id > (SELECT through_id FROM stock_compaction)
+    ), 0))::int"""
+
+LIVE_STOCK = live_stock_sql()
+
+async def current(client, product_ids: Iterable[str]) -> Dict[str, int]:
+    """Stock actual por id de producto."""
+    ids = list(product_ids)
+    if not ids:
+        return {}
+    rows = await client.query_raw(
+        f"SELECT p.id, {LIVE_STOCK} AS stock FROM products p WHERE p.id = ANY($1::uuid[])", ids
+    )  # type: ignore
+    return {r["id"]: int(r["stock"]) for r in rows}
+
+async def _lock_ledger(tx) -> None:
+    # antes que los bloqueos de productos: compact() los espera teniendo el exclusivo
+    await tx.execute_raw(f"SELECT 1 FROM pg_advisory_xact_lock_shared({LEDGER_LOCK})")  # type: ignore
+
+async def _lock_products(tx, ids: List[str]) -> None:
+    # en orden de id (unnest respeta el del arreglo) para no cruzarse con otra venta
+    await tx.execute_raw(
+        "SELECT 1 FROM unnest($1::text[]) AS id, LATERAL pg_advisory_xact_lock(hashtext('stock:' || id))",
+        sorted(ids),
+    )  # type: ignore
+
+async def lock(tx, product_ids: Iterable[str]) -> Dict[str, int]:
+    """
+    Dentro de una transacción: bloquea el stock de los productos hasta el
+    commit y devuelve su stock actual (incluye lo confirmado mientras se esperaba).
+    """
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    await _lock_ledger(tx)
+    await _lock_products(tx, ids)
+    return await current(tx, ids)
+
+async def lock_and_check(tx, needs: Dict[str, int]) -> List[str]:
+    """Bloquea los productos y devuelve los ids cuyo stock no alcanza para needs."""
+    stock = await lock(tx, needs.keys())
+    return [pid for pid, qty in needs.items() if stock.get(pid, 0) < qty]
+
+async def record(client, kind: str, rows: Iterable[Tuple[str, int, Optional[str]]],
+                 motivo: Optional[str] = None) -> None:
+    """Agrega movimientos (product_id, delta, ref_id); los deltas en cero se omiten."""
+    rows = [r for r in rows if r[1]]
+    if not rows:
+        return
+    # el candado va en la misma sentencia: vale también fuera de una transacción
+    await client.execute_raw(
+        f"""
+        WITH l AS (SELECT 1 FROM pg_advisory_xact_lock_shared({LEDGER_LOCK}))
+        INSERT INTO stock_movements (product_id, delta, kind, ref_id, motivo)
+        SELECT m.product_id, m.delta, $3, m.ref_id, $5
+        FROM l, unnest($1::uuid[], $2::int[], $4::uuid[]) AS m(product_id, delta, ref_id)
+        """,
+        [r[0] for r in rows], [r[1] for r in rows], kind, [r[2] for r in rows], motivo,
+    )  # type: ignore
+
+async def apply_deltas(client, deltas: Dict[str, int], kind: str, ref_id: Optional[str] = None) -> None:
+    """Un movimiento por producto (por id). Negativo = salida."""
+    await record(client, kind, [(pid, d, ref_id) for pid, d in deltas.items()])
+
+async def adjust(client, values: Dict[str, int], kind: str = "adjustment", motivo: Optional[str] = None,
+                 counts: bool = False) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Ajustes por codigo_unico que no dejan el stock negativo. values son deltas,
+    o conteos absolutos con counts=True (se registra la diferencia).
+    Devuelve (aplicados [{codigo_unico, stock, version}], rechazados [{codigo_unico, motivo}]).
+    """
+    async with client.tx() as tx:
+        return await lock_and_adjust(tx, values, kind, motivo, counts)
+
+async def lock_and_adjust(tx, values: Dict[str, int], kind: str = "adjustment", motivo: Optional[str] = None,
+                          counts: bool = False) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Como adjust(), dentro de una transacción abierta por quien llama."""
+    codes = list(values.keys())
+    # el mismo candado por producto que las ventas: se serializan entre sí
+    await _lock_ledger(tx)
+    ids = await tx.query_raw(
+        "SELECT id FROM products WHERE codigo_unico = ANY($1::text[])", codes
+    )  # type: ignore
+    await _lock_products(tx, [r["id"] for r in ids])
+    # sentencia aparte: ve los movimientos confirmados mientras se esperaba el bloqueo
+    rows = await tx.query_raw(
+        f"SELECT p.id, p.codigo_unico, p.version, {LIVE_STOCK} AS stock FROM products p "
+        "WHERE p.codigo_unico = ANY($1::text[])",
+        codes,
+    )  # type: ignore
+    found = {r["codigo_unico"]: r for r in rows}
+    applied: List[Dict[str, Any]] = []
+    moves: List[Tuple[str, int, Optional[str]]] = []
+    for c in codes:
+        r = found.get(c)
+        if r is None:
+            continue
+        delta = values[c] - r["stock"] if counts else values[c]
+        if r["stock"] + delta >= 0:
+            moves.append((r["id"], delta, None))
+            applied.append({"codigo_unico": c, "stock": r["stock"] + delta, "version": r["version"]})
+    await record(tx, kind, moves, motivo)
+    done = {a["codigo_unico"] for a in applied}
+    rejected = [
+        {"codigo_unico": c, "motivo": "stock_insuficiente" if c in found else "no_existe"}
+        for c in codes if c not in done
+    ]
+    return applied, rejected
+
+async def _try_compact_lock(tx) -> bool:
+    row = await tx.query_first(
+        "SELECT pg_try_advisory_xact_lock(hashtext('compact_stock')) AS ok")  # type: ignore
+    return bool(row and row["ok"])
+
+async def compact(client) -> Dict[str, int]:
+    """
+    Pliega en products.stock los movimientos confirmados y guarda los cierres de
+    los días completos. Varios workers pueden llamarla a la vez: solo uno compacta.
+    El pliegue es una transacción corta con el candado exclusivo del libro; los
+    cierres van en otra, sin él, para no detener a las ventas mientras se calculan.
+    """
+    async with client.tx() as tx:
+        if not await _try_compact_lock(tx):
+            return {}
+        # espera a que terminen las transacciones que ya escribieron en el libro;
+        # las nuevas esperan a este commit
+        await tx.execute_raw(f"SET LOCAL lock_timeout = '{INVENTORY_COMPACT_LOCK_TIMEOUT}'")  # type: ignore
+        await tx.execute_raw(f"SELECT 1 FROM pg_advisory_xact_lock({LEDGER_LOCK})")  # type: ignore
+        # saldo y marca en una sola sentencia: un lector ve ambos antes o ambos después
+        folded = await tx.query_first(
+            """
+            WITH c AS (
+              SELECT through_id AS lo,
+                     (SELECT COALESCE(MAX(id), 0) FROM stock_movements) AS hi,
+                     clock_timestamp() AS at
+              FROM stock_compaction
+            ),
+            d AS (
+              SELECT m.product_id, SUM(m.delta)::int AS delta
+              FROM stock_movements m, c
+              WHERE m.id > c.lo AND m.id <= c.hi
+              GROUP BY 1
+            ),
+            upd AS (
+              UPDATE products p SET stock = COALESCE(p.stock, 0) + d.delta
+              FROM d WHERE p.id = d.product_id AND d.delta <> 0
+              RETURNING p.id
+            ),
+            mark AS (
+              UPDATE stock_compaction s SET through_id = GREATEST(c.lo, c.hi), through = c.at
+              FROM c RETURNING s.through_id
+            )
+            SELECT (SELECT COUNT(*) FROM upd)::int AS products
+            """
+        )  # type: ignore
+    async with client.tx() as tx:
+        if not await _try_compact_lock(tx):
+            return {"products": folded["products"] if folded else 0, "snapshots": 0}
+        # día D cerrado: todo lo registrado antes de `through` ya está confirmado
+        # (se eligió con el exclusivo) y lo nuevo tiene created_at posterior
+        snap = await tx.query_first(
+            """
+            WITH c AS (
+              SELECT snapshot_day AS lo, through::date - 1 AS hi FROM stock_compaction
+            ),
+            days AS (
+              SELECT m.product_id, m.created_at::date AS day, SUM(m.delta)::int AS delta
+              FROM stock_movements m, c
+              WHERE m.created_at >= (c.lo + 1)::timestamptz AND m.created_at < (c.hi + 1)::timestamptz
+              GROUP BY 1, 2
+            ),
+            base AS (
+              SELECT DISTINCT ON (s.product_id) s.product_id, s.stock
+              FROM stock_snapshots s, c
+              WHERE s.day <= c.lo AND s.product_id IN (SELECT product_id FROM days)
+              ORDER BY s.product_id, s.day DESC
+            ),
+            ins AS (
+              INSERT INTO stock_snapshots (day, product_id, stock)
+              SELECT d.day, d.product_id,
+                     COALESCE(b.stock, 0) + SUM(d.delta) OVER (PARTITION BY d.product_id ORDER BY d.day)
+              FROM days d LEFT JOIN base b ON b.product_id = d.product_id
+              ON CONFLICT (product_id, day) DO NOTHING
+              RETURNING 1
+            ),
+            mark AS (
+              UPDATE stock_compaction s SET snapshot_day = c.hi FROM c WHERE c.hi > c.lo RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM ins)::int AS snapshots
+            """
+        )  # type: ignore
+    return {"products": folded["products"] if folded else 0,
+            "snapshots": snap["snapshots"] if snap else 0}
+
+async def maintain_forever(client) -> None:
+    while True:
+        try:
+            n = await compact(client)
+            if n.get("snapshots"):
+                log.info("cierres de stock guardados: %s", n["snapshots"])
+        except Exception as e:
+            log.warning("no se pudo compactar el libro de stock: %s", e)
+        await asyncio.sleep(INVENTORY_COMPACT_SECONDS)
+
+async def started(client) -> Optional[date]:
+    """Día de apertura del libro (antes no hay historial)."""
+    row = await client.query_first("SELECT started_at::date AS day FROM stock_compaction")  # type: ignore
+    return row["day"] if row else None
+
+async def stock_at(client, day: date, codigo_unico: Optional[str] = None,
+                   skip: int = 0, take: int = 100) -> List[Dict[str, Any]]:
+    """Stock de cierre de `day` por producto: último cierre guardado + movimientos posteriores del rango."""
+    params: List[Any] = [day, skip, take]
+    where = ""
+    if codigo_unico:
+        params.append(codigo_unico)
+        where = "WHERE p.codigo_unico = $4"
+    return await client.query_raw(
+        f"""
+        SELECT p.id, p.codigo_unico, p.nombre,
+               (COALESCE(s.stock, 0) + COALESCE((
+                 SELECT SUM(m.delta) FROM stock_movements m
+                 WHERE m.product_id = p.id
+                   AND m.created_at >= COALESCE(s.day + 1, DATE '-infinity')::timestamptz
+                   AND m.created_at < ($1::date + 1)::timestamptz
+               ), 0))::int AS stock
+        FROM products p
+        LEFT JOIN LATERAL (
+          SELECT day, stock FROM stock_snapshots
+          WHERE product_id = p.id AND day <= $1::date
+          ORDER BY day DESC
+          LIMIT 1
+        ) s ON true
+        {where}
+        ORDER BY p.codigo_unico
+        OFFSET $2 LIMIT $3
+        """,
+        *params,
+    )  # type: ignore
+
+async def movements(client, product_id: str, d_from: Optional[date], d_to: Optional[date],
+                    limit: int = 500) -> List[Dict[str, Any]]:
+    """Movimientos del producto en [d_from, d_to], más recientes primero."""
+    return await client.query_raw(
+        """
+        SELECT id, delta, kind, ref_id, motivo, created_at
+        FROM stock_movements
+        WHERE product_id = $1::uuid
+          AND created_at >= COALESCE($2::date, DATE '-infinity')::timestamptz
+          AND created_at < COALESCE($3::date + 1, DATE 'infinity')::timestamptz
+        ORDER BY created_at DESC, id DESC
+        LIMIT $4
+        """,
+        product_id, d_from, d_to, limit,
+    )  # type: ignore
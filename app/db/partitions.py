@@ -0,0 +1,133 @@
+import asyncio, logging, os, re
+from datetime import date
+from typing import Any, Dict, List
+from app.db.bulk import bulk_tx
+
+# sales y sale_items están particionadas por mes (sales_y2025m01, ...).
+# Una tarea de fondo mantiene creadas las particiones del mes actual y los
+# próximos PARTITION_MONTHS_AHEAD; archive() desprende los meses viejos
+# dejando sus totales diarios en sales_archive_daily.
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_CHECK_SECONDS = int(os.getenv("PARTITION_CHECK_SECONDS", str(6 * 3600)))
+
+log = logging.getLogger("gratus.partitions")
+
+_PARTITIONED = ("sales", "sale_items")
+_MONTH_RE = re.compile(r"_y(\d{4})m(\d{2})$")
+
+async def ensure(client, months_ahead: int = PARTITION_MONTHS_AHEAD) -> int:
+    """Crea las particiones que falten; varios workers pueden llamarla a la vez."""
+    async with client.tx() as tx:
+        lock = await tx.query_first(
+            "SELECT pg_try_advisory_xact_lock(hashtext('ensure_sales_partitions')) AS ok")  # type: ignore
+        if not lock or not lock["ok"]:
+            return 0
+        row = await tx.query_first("SELECT ensure_sales_partitions($1) AS n", months_ahead)  # type: ignore
+        return int(row["n"]) if row else 0
+
+async def maintain_forever(client) -> None:
+    while True:
+        try:
+            n = await ensure(client)
+            if n:
+                log.info("particiones de ventas creadas: %s", n)
+        except Exception as e:
+            log.warning("no se pudieron crear particiones de ventas: %s", e)
+        await asyncio.sleep(PARTITION_CHECK_SECONDS)
+
+async def list_partitions(client) -> List[Dict[str, Any]]:
+    """Particiones mensuales adjuntas: [{table, partition, month}] ordenadas por mes."""
+    rows = await client.query_raw(
+        """
+        SELECT p.relname AS parent, c.relname AS partition
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = ANY($1::text[]) AND p.relnamespace = 'public'::regnamespace
+        """,
+        list(_PARTITIONED),
+    )  # type: ignore
+    out = []
+    for r in rows:
+        m = _MONTH_RE.search(r["partition"])
+        if m:
+            out.append({"table": r["parent"], "partition": r["partition"],
+                        "month": date(int(m.group(1)), int(m.group(2)), 1)})
+    return sorted(out, key=lambda x: (x["month"], x["table"]))
+
+async def archive(client, before: date, drop: bool = False) -> List[str]:
+    """
+    Desprende los meses que terminan antes de `before` (primer día de mes).
+    Por mes, en una transacción: totales diarios -> sales_archive_daily,
+    DETACH de sales y sale_items y traslado al esquema archive (o DROP).
+    """
+    months: Dict[date, Dict[str, str]] = {}
+    for p in await list_partitions(client):
+        if p["month"] < date(before.year, before.month, 1):
+            months.setdefault(p["month"], {})[p["table"]] = p["partition"]
+
+    done: List[str] = []
+    for month, parts in sorted(months.items()):
+        async with bulk_tx(client) as tx:
+            if "sales" in parts:
+                await tx.execute_raw(
+                    f"""
+                    INSERT INTO sales_archive_daily
+                      (day, tienda_id, num_ventas, total_vendido, num_ventas_all, total_all, descuentos)
+                    SELECT created_at::date, tienda_id,
+                           COUNT(*) FILTER (WHERE NOT COALESCE(anulada,false)),
+                           COALESCE(SUM(total) FILTER (WHERE NOT COALESCE(anulada,false)), 0),
+                           COUNT(*),
+                           COALESCE(SUM(total), 0),
+                           COALESCE(SUM(descuento) FILTER (WHERE NOT COALESCE(anulada,false)), 0)
+                    FROM "{parts['sales']}"
+                    GROUP BY 1, 2
+                    ON CONFLICT (day, COALESCE(tienda_id, '00000000-0000-0000-0000-000000000000'::uuid)) DO UPDATE SET
+                      num_ventas     = sales_archive_daily.num_ventas     + EXCLUDED.num_ventas,
+                      total_vendido  = sales_archive_daily.total_vendido  + EXCLUDED.total_vendido,
+                      num_ventas_all = sales_archive_daily.num_ventas_all + EXCLUDED.num_ventas_all,
+                      total_all      = sales_archive_daily.total_all      + EXCLUDED.total_all,
+                      descuentos     = sales_archive_daily.descuentos     + EXCLUDED.descuentos
+                    """
+                )  # type: ignore
+            for table, part in parts.items():
+                await tx.execute_raw(f'ALTER TABLE "{table}" DETACH PARTITION "{part}"')  # type: ignore
+                if drop:
+                    await tx.execute_raw(f'DROP TABLE "{part}"')  # type: ignore
+                else:
+                    await tx.execute_raw(f'ALTER TABLE "{part}" SET SCHEMA archive')  # type: ignore
+                done.append(part)
+        log.info("mes %s archivado: %s", month.isoformat()[:7], ", ".join(parts.values()))
+    return done
+
+
+if __name__ == "__main__":
+    # python -m app.db.partitions ensure [meses]
+    # python -m app.db.partitions list
+    # python -m app.db.partitions archive YYYY-MM-DD [--drop]
+    import sys
+    from datetime import datetime
+    from app.db.client import db
+
+    async def _main(argv):
+        cmd = argv[0] if argv else "list"
+        await db.connect()
+        try:
+            if cmd == "ensure":
+                n = await ensure(db, int(argv[1]) if len(argv) > 1 else PARTITION_MONTHS_AHEAD)
+                print(f"particiones creadas: {n}")
+            elif cmd == "archive":
+                if len(argv) < 2:
+                    raise SystemExit("uso: archive YYYY-MM-DD [--drop]")
+                before = datetime.strptime(argv[1], "%Y-%m-%d").date()
+                parts = await archive(db, before, drop="--drop" in argv)
+                print(f"archivadas: {', '.join(parts) or 'ninguna'}")
+            else:
+                for p in await list_partitions(db):
+                    print(f"{p['table']:12s} {p['partition']:24s} {p['month']}")
+        finally:
+            await db.disconnect()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
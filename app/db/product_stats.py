@@ -0,0 +1,108 @@
+from datetime import date
+from typing import List, Optional
+from app.db.scope import NO_STORE, store_filter
+from app.db.bulk import bulk_tx
+
+# Acumulado por producto, día y tienda (unidades, vendido, utilidad) mantenido al
+# crear/anular ventas. Los reportes de top productos leen de aquí en vez de
+# agrupar todo el histórico de sale_items.
+
+_APPLY_SQL = f"""
+INSERT INTO product_daily_stats (producto_id, day, tienda_id, unidades, vendido, utilidad)
+SELECT si.producto_id, s.created_at::date, COALESCE(s.tienda_id, '{NO_STORE}'),
+       $2::int * SUM(si.cantidad),
+       $2::int * SUM(si.subtotal),
+       $2::int * SUM(si.subtotal - COALESCE(p.costo,0) * si.cantidad)
+FROM sale_items si
+JOIN sales s ON s.id = si.venta_id AND s.created_at = si.created_at
+JOIN products p ON p.id = si.producto_id
+WHERE si.venta_id = ANY($1::uuid[])
+GROUP BY 1, 2, 3
+ON CONFLICT (producto_id, day, tienda_id) DO UPDATE SET
+  unidades = product_daily_stats.unidades + EXCLUDED.unidades,
+  vendido  = product_daily_stats.vendido  + EXCLUDED.vendido,
+  utilidad = product_daily_stats.utilidad + EXCLUDED.utilidad
+"""
+
+async def apply_sales(client, sale_ids: List[str], sign: int = 1) -> None:
+    """
+    Suma (sign=1, venta creada) o resta (sign=-1, venta anulada) los items de
+    las ventas al acumulado diario. Debe llamarse dentro de la misma
+    transacción que inserta los items / marca la anulación.
+    """
+    if not sale_ids:
+        return
+    await client.execute_raw(_APPLY_SQL, list(sale_ids), sign)  # type: ignore
+
+async def rebuild(client, date_from: Optional[date] = None, date_to: Optional[date] = None) -> int:
+    """
+    Recalcula el acumulado desde sale_items (solo ventas no anuladas) para el
+    rango dado, o todo el histórico si no se indica. Devuelve filas escritas.
+    Los días de particiones archivadas se conservan: sus items ya no están.
+    """
+    async with bulk_tx(client) as tx:
+        await tx.execute_raw(
+            """
+            DELETE FROM product_daily_stats
+            WHERE ($1::date IS NULL OR day >= $1::date)
+              AND ($2::date IS NULL OR day <= $2::date)
+              AND NOT EXISTS (SELECT 1 FROM sales_archive_daily a WHERE a.day = product_daily_stats.day)
+            """,
+            date_from, date_to,
+        )  # type: ignore
+        return await tx.execute_raw(
+            f"""
+            INSERT INTO product_daily_stats (producto_id, day, tienda_id, unidades, vendido, utilidad)
+            SELECT si.producto_id, s.created_at::date, COALESCE(s.tienda_id, '{NO_STORE}'),
+                   SUM(si.cantidad), SUM(si.subtotal),
+                   SUM(si.subtotal - COALESCE(p.costo,0) * si.cantidad)
+            FROM sale_items si
+            JOIN sales s ON s.id = si.venta_id AND s.created_at = si.created_at
+            JOIN products p ON p.id = si.producto_id
+            WHERE COALESCE(s.anulada,false) = false
+              AND si.created_at >= COALESCE($1::date, '-infinity')
+              AND si.created_at < COALESCE($2::date + 1, 'infinity')
+            GROUP BY 1, 2, 3
+            """,
+            date_from, date_to,
+        )  # type: ignore
+
+async def top_products(client, date_from: Optional[date], date_to: Optional[date], limit: int,
+                       tienda: Optional[str] = None):
+    """Top N por unidades en el rango (ambos extremos opcionales, inclusive), de una tienda o de toda la cadena."""
+    params: list = [date_from, date_to, limit]
+    tf = store_filter("st.tienda_id", tienda, params)
+    q = f"""
+    SELECT p.codigo_unico, p.nombre,
+           SUM(st.unidades) AS unidades,
+           SUM(st.vendido) AS vendido,
+           SUM(st.utilidad) AS utilidad_estimada
+    FROM product_daily_stats st
+    JOIN products p ON p.id = st.producto_id
+    WHERE ($1::date IS NULL OR st.day >= $1::date)
+      AND ($2::date IS NULL OR st.day <= $2::date){tf}
+    GROUP BY p.codigo_unico, p.nombre
+    HAVING SUM(st.unidades) > 0
+    ORDER BY unidades DESC
+    LIMIT $3
+    """
+    return await client.query_raw(q, *params)  # type: ignore
+
+
+if __name__ == "__main__":
+    # python -m app.db.product_stats [YYYY-MM-DD] [YYYY-MM-DD]
+    import asyncio, sys
+    from datetime import datetime
+    from app.db.client import db
+
+    async def _main():
+        args = [datetime.strptime(a, "%Y-%m-%d").date() for a in sys.argv[1:3]]
+        args += [None] * (2 - len(args))
+        await db.connect()
+        try:
+            n = await rebuild(db, args[0], args[1])
+            print(f"product_daily_stats: {n} filas")
+        finally:
+            await db.disconnect()
+
+    asyncio.run(_main())
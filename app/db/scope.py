@@ -0,0 +1,14 @@
+from typing import Any, List, Optional
+
+# Filtro por tienda para SQL armado a mano. Con tienda=None no agrega nada
+# (toda la cadena), así el plan no arrastra un "$n IS NULL OR ..." que impide
+# usar los índices (tienda_id, fecha).
+
+NO_STORE = "00000000-0000-0000-0000-000000000000"  # tienda_id de product_daily_stats sin tienda
+
+def store_filter(column: str, tienda: Optional[str], params: List[Any]) -> str:
+    """Devuelve ' AND <column> = $n::uuid' y agrega el parámetro, o '' sin tienda."""
+    if not tienda:
+        return ""
+    params.append(tienda)
+    return f" AND {column} = ${len(params)}::uuid"
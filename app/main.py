@@ -1,10 +1,89 @@
+from contextlib import asynccontextmanager
+from datetime import date
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.db.client import connect_db, disconnect_db
-from app.routers import products, sales, invoices, reports, auth, customers, credits
-import os
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
+from app.db.client import connect_db, disconnect_db, db, db_read, read_db
+from app.db import partitions, catalog, analytics, inventory
+from app.core.jobs import report_jobs
+from app.core.live import hub as live_hub
+from app.core import http, google_auth
+from app.core.lifecycle import readiness
+from app.core.instrumentation import InstrumentationMiddleware
+from app.core.metrics import render_prometheus
+from app.core.responses import FastJSONResponse
+from app.routers import products, sales, invoices, reports, auth, customers, credits, admin, live
+import asyncio, os
 
-app = FastAPI(title="Gratus - Sistema de Gestión de Ventas")
+# --- Calentamiento (ver app.core.lifecycle) ---
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "4"))
+
+async def _warm_pool():
+    # consultas simultáneas: el motor abre varias conexiones del pool (TCP+TLS+auth)
+    clients = [db] if db_read is db else [db, db_read]
+    await asyncio.gather(*(
+        c.query_raw("SELECT 1 AS ok FROM pg_sleep(0.05)")  # type: ignore
+        for c in clients if c.is_connected()
+        for _ in range(WARMUP_DB_CONNECTIONS)
+    ))
+
+async def _warm_users():
+    # ruta ORM de user_from_token (corre en cada petición autenticada)
+    await db.users.find_first()
+
+async def _warm_catalog():
+    rdb = await read_db()
+    await catalog.safe_cursor(rdb)
+    # lleva las páginas del catálogo al caché de Postgres
+    await rdb.query_raw("SELECT COUNT(*) AS n FROM products")  # type: ignore
+    await db.products.find_first()
+
+async def _warm_kpis():
+    await sales.kpi_daily_data(await read_db(), date.today(), None)
+
+async def _warm_analytics():
+    if analytics.ANALYTICS_ENABLED:
+        await analytics.preload(await read_db())
+
+async def _warm_google():
+    if google_auth.GOOGLE_CLIENT_ID:
+        await google_auth.jwks.prefetch()
+
+_WARMUP = [
+    ("db_pool", _warm_pool),
+    ("users", _warm_users),
+    ("catalog", _warm_catalog),
+    ("kpi_today", _warm_kpis),
+    ("analytics", _warm_analytics),
+    ("google_jwks", _warm_google),
+]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_db()
+    http.client()  # conexiones salientes compartidas (Google OAuth/JWKS)
+    background = [
+        # particiones mensuales de ventas para los próximos meses
+        asyncio.create_task(partitions.maintain_forever(db)),
+        # compactación del libro de stock y cierres diarios
+        asyncio.create_task(inventory.maintain_forever(db)),
+        # LISTEN de eventos en vivo (tableros por SSE/WebSocket)
+        asyncio.create_task(live_hub.listen_forever()),
+        # /health/ready pasa a 200 al terminar
+        asyncio.create_task(readiness.warm_up(_WARMUP)),
+    ]
+    try:
+        yield
+    finally:
+        readiness.draining = True
+        for t in background:
+            t.cancel()
+        await report_jobs.shutdown()
+        await http.close()
+        await disconnect_db()
+
+app = FastAPI(title="Gratus - Sistema de Gestión de Ventas", lifespan=lifespan)
 
 # --- CORS ---
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
@@ -17,13 +96,20 @@ app.add_middleware(
 )
 # -------------
 
-@app.on_event("startup")
-async def startup():
-    await connect_db()
+# --- Compresión ---
+# brotli si está instalado brotli-asgi (cae a gzip para clientes sin br);
+# si no, gzip de Starlette. Respuestas que ya traen Content-Encoding (snapshot
+# del catálogo) y text/event-stream pasan sin tocar.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE, compresslevel=6)
+# -------------
 
-@app.on_event("shutdown")
-async def shutdown():
-    await disconnect_db()
+# Métricas por ruta (latencia, consultas y tiempo de BD por petición)
+app.add_middleware(InstrumentationMiddleware)
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(products.router, prefix="/products", tags=["Productos"])
@@ -32,4 +118,27 @@ app.include_router(invoices.router, prefix="/invoices", tags=["Facturas"])
 app.include_router(reports.router, prefix="/reports", tags=["Reportes"])
 app.include_router(customers.router, prefix="/customers", tags=["Clientes"])
 app.include_router(credits.router, prefix="/credits", tags=["Créditos"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
+app.include_router(live.router, prefix="/live", tags=["En vivo"])
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas en formato de texto Prometheus (app + motor de Prisma)."""
+    body = render_prometheus()
+    try:
+        body += await db.get_metrics(format="prometheus")
+    except Exception:
+        pass
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/health", include_in_schema=False)
+@app.get("/health/live", include_in_schema=False)
+async def health_live():
+    """Liveness: el proceso atiende; no toca la BD (un corte de BD no debe reiniciarlo)."""
+    return {"status": "ok"}
 
+@app.get("/health/ready", include_in_schema=False)
+async def health_ready():
+    """Readiness: 200 cuando terminó el calentamiento y hay conexión a la BD; si no, 503."""
+    ok = readiness.ready and not readiness.draining and db.is_connected()
+    return FastJSONResponse(readiness.status(), status_code=200 if ok else 503)
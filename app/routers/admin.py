@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from app.db.client import db, db_read, pool_settings
+from app.core.security import require_role
+from app.core.metrics import db_metrics
+
+router = APIRouter()
+
+@router.get("/db/metrics", dependencies=[Depends(require_role("admin"))])
+async def db_pool_metrics(top: int = 50):
+    """
+    Uso del pool y latencias:
+    - pool: configuración efectiva (vacío = defaults de Prisma)
+    - client: consultas en curso, errores y histogramas por sentencia (medido en la app)
+    - engine: métricas del motor de Prisma (conexiones abiertas/ocupadas/libres,
+      espera por conexión `prisma_client_queries_wait*`, duración de consultas)
+    """
+    out = {"pool": pool_settings(), "client": db_metrics.snapshot(top), "engine": await db.get_metrics()}
+    if db_read is not db and db_read.is_connected():
+        out["engine_read"] = await db_read.get_metrics()
+    return out
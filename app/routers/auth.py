@@ -3,17 +3,13 @@ from pydantic import BaseModel, EmailStr
 from fastapi.responses import RedirectResponse
 from app.db.client import db
 from app.core.security import hash_password, verify_password, create_access_token, get_current_user
-import os, httpx, jwt, hmac, hashlib, secrets
+from app.core.google_auth import (GOOGLE_AUTH_URL, GOOGLE_CLIENT_ID, GOOGLE_REDIRECT_URI,
+                                  GoogleAuthError, exchange_code)
+import os, hmac, hashlib, secrets
 from urllib.parse import urlencode, quote
 
-from app.db.client import db
-from app.core.security import hash_password, verify_password, create_access_token
-
 router = APIRouter()
 
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
-GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:8000/auth/google/callback")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 STATE_SECRET = (os.getenv("OAUTH_STATE_SECRET") or os.getenv("SECRET_KEY") or "change-me").encode()
 
@@ -63,9 +59,6 @@ async def login(req: LoginRequest):
     return TokenResponse(access_token=token)
 
 # Google OAuth
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
-GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:8000/auth/google/callback")
 
 @router.get("/google/login")
 async def google_login():
@@ -82,7 +75,7 @@ async def google_login():
         "prompt": "consent",
         "state": state,  # importante para CSRF
     }
-    url = f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(params)}"
+    url = f"{GOOGLE_AUTH_URL}?{urlencode(params)}"
 
     # 302 al login de Google + cookie con state
     resp = RedirectResponse(url=url, status_code=302)
@@ -99,28 +92,15 @@ async def google_login():
 class GoogleCallbackBody(BaseModel):
     code: str
 
-@router.post("/google/callback", response_model=TokenResponse)
-async def google_callback(body: GoogleCallbackBody):
-    async with httpx.AsyncClient() as client:
-        token_resp = await client.post("https://oauth2.googleapis.com/token", data={
-            "code": body.code,
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "redirect_uri": GOOGLE_REDIRECT_URI,
-            "grant_type": "authorization_code",
-        })
-        if token_resp.status_code != 200:
-            raise HTTPException(400, "No se pudo intercambiar el código de Google")
-        token_json = token_resp.json()
-        id_token = token_json.get("id_token")
-        if not id_token:
-            raise HTTPException(400, "Google no retornó id_token")
-        claims = jwt.decode(id_token, options={"verify_signature": False})
-        email = claims.get("email")
-        sub = claims.get("sub")
-        name = claims.get("name") or "Usuario"
+async def _google_user(code: str):
+    """Intercambia el code, verifica el id_token y busca/crea el usuario."""
+    claims = await exchange_code(code)
+    email = claims.get("email")
+    sub = claims.get("sub")
+    name = claims.get("name") or "Usuario"
     if not email or not sub:
-        raise HTTPException(400, "Token de Google inválido")
+        raise GoogleAuthError("invalid_google_token", "Token de Google inválido")
+
     user = await db.users.find_unique(where={"email": email})
     if not user:
         admins = await db.users.find_many(where={"rol": "admin"}, take=1)
@@ -135,11 +115,19 @@ async def google_callback(body: GoogleCallbackBody):
     else:
         if not user.google_sub:
             await db.users.update(where={"id": user.id}, data={"google_sub": sub, "provider": "GOOGLE"})
+    return user
+
+@router.post("/google/callback", response_model=TokenResponse)
+async def google_callback(body: GoogleCallbackBody):
+    try:
+        user = await _google_user(body.code)
+    except GoogleAuthError as e:
+        raise HTTPException(400, e.detail)
     token = create_access_token(subject=user.id, role=(user.rol or "cajero"))
     return TokenResponse(access_token=token)
 
 @router.get("/google/callback", response_model=TokenResponse)
-async def google_callback(request: Request):
+async def google_callback_redirect(request: Request):
     # Google devolverá ?code=...&state=...
     code = request.query_params.get("code")
     state_recv = request.query_params.get("state")
@@ -150,51 +138,11 @@ async def google_callback(request: Request):
     if not state_cookie or not _verify_state(state_cookie, state_recv):
         raise HTTPException(400, "State inválido.")
 
-    # Intercambia code por tokens
-    async with httpx.AsyncClient() as client:
-        token_resp = await client.post("https://oauth2.googleapis.com/token", data={
-            "code": code,
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "redirect_uri": GOOGLE_REDIRECT_URI,
-            "grant_type": "authorization_code",
-        })
-        if token_resp.status_code != 200:
-            # Redirige al front con error
-            to = f"{FRONTEND_URL}/auth/callback?error=oauth_exchange_failed"
-            return RedirectResponse(url=to, status_code=302)
-
-        token_json = token_resp.json()
-        id_token = token_json.get("id_token")
-        if not id_token:
-            to = f"{FRONTEND_URL}/auth/callback?error=missing_id_token"
-            return RedirectResponse(url=to, status_code=302)
-
-        # En dev: sin verificar firma. En prod: valida JWKS de Google.
-        claims = jwt.decode(id_token, options={"verify_signature": False})
-        email = claims.get("email")
-        sub = claims.get("sub")
-        name = claims.get("name") or "Usuario"
-
-    if not email or not sub:
-        to = f"{FRONTEND_URL}/auth/callback?error=invalid_google_token"
-        return RedirectResponse(url=to, status_code=302)
-
-    # Busca/crea usuario
-    user = await db.users.find_unique(where={"email": email})
-    if not user:
-        admins = await db.users.find_many(where={"rol": "admin"}, take=1)
-        role = "admin" if len(admins) == 0 else "cajero"
-        user = await db.users.create(data={
-            "nombre": name,
-            "email": email,
-            "provider": "GOOGLE",
-            "google_sub": sub,
-            "rol": role,
-        })
-    else:
-        if not user.google_sub:
-            await db.users.update(where={"id": user.id}, data={"google_sub": sub, "provider": "GOOGLE"})
+    try:
+        user = await _google_user(code)
+    except GoogleAuthError as e:
+        # Redirige al front con error
+        return RedirectResponse(url=f"{FRONTEND_URL}/auth/callback?error={e.code}", status_code=302)
 
     # Emite tu JWT
     jwt_token = create_access_token(subject=user.id, role=(user.rol or "cajero"))
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
 from typing import List, Optional, Any, Dict
 from datetime import datetime, date
 from pydantic import BaseModel, Field, validator
-from app.db.client import db
-from app.core.security import require_role
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
+from app.db.client import db, read_db
+from app.core.security import require_role, store_scope, sale_store
+from app.core.money import Money, to_cents, from_cents, line_total
+from app.core import idempotency, etag
+from app.core.live import hub as live, sale_event, credit_event
+from app.core.responses import FastJSONResponse, query_json, wants_ndjson, ndjson_query
+from app.db import product_stats, inventory, customer_balances
+from app.db.scope import store_filter
 from fastapi.responses import StreamingResponse, PlainTextResponse
 import io, csv
 
@@ -16,14 +19,14 @@ router = APIRouter()
 class CreditSaleItem(BaseModel):
   codigo_unico: str
   cantidad: int = Field(..., gt=0)
-  precio_unitario: float = Field(..., gt=0)
+  precio_unitario: Money = Field(..., gt=0)  # centavos
 
 class CreditSaleCreate(BaseModel):
   customer_id: str
   usuario_id: Optional[str] = None
   tienda_id: Optional[str] = None
   metodo_pago: str = "credito"   # fijo crédito
-  descuento: float = 0
+  descuento: Money = Field(0, ge=0)  # centavos
   due_date: date
   items: List[CreditSaleItem]
 
@@ -34,7 +37,7 @@ class CreditSaleCreate(BaseModel):
     return v
 
 class PaymentIn(BaseModel):
-  amount: float = Field(..., gt=0)
+  amount: Money = Field(..., gt=0)  # centavos
   metodo_pago: str = "efectivo"
   notes: Optional[str] = None
   usuario_id: Optional[str] = None
@@ -45,33 +48,56 @@ def _parse_date(s: Optional[str]) -> Optional[date]:
 
 # ---------- Endpoints ----------
 
-@router.post("/sales", dependencies=[Depends(require_role("admin","cajero"))])
-async def create_credit_sale(body: CreditSaleCreate):
+@router.post("/sales")
+async def create_credit_sale(body: CreditSaleCreate, user=Depends(require_role("admin","cajero"))):
+  # venta y crédito quedan en la tienda del usuario si tiene una asignada
+  body.tienda_id = sale_store(user, body.tienda_id)
   codes = [i.codigo_unico for i in body.items]
   prods = await db.products.find_many(where={"codigo_unico": {"in": codes}})
   pmap = {p.codigo_unico: p for p in prods}
+  stock = await inventory.current(db, [p.id for p in prods])
 
   for it in body.items:
     p = pmap.get(it.codigo_unico)
     if not p:
       raise HTTPException(400, f"Producto no existe: {it.codigo_unico}")
-    if (p.stock or 0) < it.cantidad:
+    if stock[p.id] < it.cantidad:
       raise HTTPException(400, f"Stock insuficiente para {p.nombre} ({it.codigo_unico})")
 
-  subtotal = sum(it.precio_unitario * it.cantidad for it in body.items)
-  total = subtotal - float(body.descuento or 0)
+  subtotal = sum(line_total(it.precio_unitario, it.cantidad) for it in body.items)
+  total = subtotal - body.descuento
   if total <= 0:
     raise HTTPException(400, "El total debe ser mayor a 0")
 
   sale_data = {
     "metodo_pago": "credito",
-    "descuento": body.descuento,
-    "total": total
+    "descuento": from_cents(body.descuento),
+    "total": from_cents(total)
   }
   if body.usuario_id: sale_data["usuario_id"] = body.usuario_id
   if body.tienda_id:  sale_data["tienda_id"]  = body.tienda_id
 
+  needs: Dict[str, int] = {}
+  for it in body.items:
+    pid = pmap[it.codigo_unico].id
+    needs[pid] = needs.get(pid, 0) + it.cantidad
+
+  deltas: Dict[str, int] = {}
   async with db.tx() as tx:
+    # límite de crédito: se lee con el cliente bloqueado hasta el commit
+    expo = await customer_balances.lock_exposure(tx, body.customer_id)
+    if not expo:
+      raise HTTPException(404, "Cliente no encontrado")
+    if expo["limite_credito"] is not None:
+      disponible = to_cents(expo["limite_credito"]) - to_cents(expo["saldo"])
+      if total > disponible:
+        raise HTTPException(409, f"Límite de crédito excedido (disponible {from_cents(max(disponible, 0))})")
+    # stock revisado de nuevo con los productos bloqueados
+    short = await inventory.lock_and_check(tx, needs)
+    if short:
+      p = next(p for p in prods if p.id == short[0])
+      raise HTTPException(400, f"Stock insuficiente para {p.nombre} ({p.codigo_unico})")
+
     sale = await tx.sales.create(data=sale_data)
     for it in body.items:
       p = pmap[it.codigo_unico]
@@ -79,25 +105,36 @@ async def create_credit_sale(body: CreditSaleCreate):
         "venta_id": sale.id,
         "producto_id": p.id,
         "cantidad": it.cantidad,
-        "precio_unitario": it.precio_unitario,
-        "subtotal": it.precio_unitario * it.cantidad
+        "precio_unitario": from_cents(it.precio_unitario),
+        "subtotal": from_cents(line_total(it.precio_unitario, it.cantidad)),
+        "created_at": sale.created_at,  # misma partición mensual que la venta
       })
-      await tx.products.update(where={"id": p.id}, data={"stock": (p.stock - it.cantidad)})
+      deltas[p.id] = deltas.get(p.id, 0) - it.cantidad
+    await inventory.apply_deltas(tx, deltas, "sale", sale.id)
+    await product_stats.apply_sales(tx, [sale.id])
 
     credit = await tx.credits.create(data={
       "sale_id": sale.id,
       "customer_id": body.customer_id,
-      "total": total,
-      "saldo": total,
+      "total": from_cents(total),
+      "saldo": from_cents(total),
       "due_date": body.due_date,
-      "status": "open"
+      "status": "open",
+      **({"tienda_id": body.tienda_id} if body.tienda_id else {}),
     })
+    await customer_balances.add_credit(tx, body.customer_id, from_cents(total), body.due_date)
+
+  await live.publish(db, sale_event("sale", sale.created_at, body.tienda_id, "credito", total, body.descuento))
+  await live.publish(db, credit_event("credit", body.tienda_id, credit.id, body.customer_id,
+                                      total, total, None, "open"))
 
-  return {"ok": True, "sale_id": sale.id, "credit_id": credit.id, "total": total, "saldo": total}
+  return {"ok": True, "sale_id": sale.id, "credit_id": credit.id, "total": from_cents(total), "saldo": from_cents(total)}
 
 
-@router.get("/", dependencies=[Depends(require_role("admin","cajero"))])
+@router.get("/")
 async def list_credits(
+  request: Request,
+  tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="list")),
   customer_id: Optional[str] = None,
   status: Optional[str] = Query(None, description="open|partial|closed|overdue"),
   overdue: Optional[bool] = Query(None, description="true para solo vencidos"),
@@ -123,6 +160,9 @@ async def list_credits(
   if date_to:
     filters.append("c.created_at::date <= $%s" % (len(params)+1))
     params.append(_parse_date(date_to))
+  if tienda:
+    filters.append("c.tienda_id = $%s::uuid" % (len(params)+1))
+    params.append(tienda)
 
   where = ("WHERE " + " AND ".join(filters)) if filters else ""
   params += [limit, offset]
@@ -136,12 +176,22 @@ async def list_credits(
   ORDER BY c.created_at DESC
   LIMIT ${len(params)-1} OFFSET ${len(params)}
   """
-  rows = await db.query_raw(q, *params)  # type: ignore
-  return rows
+  rdb = await read_db()
+  if wants_ndjson(request):
+    return ndjson_query(rdb, q, *params)
+  return FastJSONResponse(await query_json(rdb, q, *params))
 
 
 @router.get("/{credit_id}", dependencies=[Depends(require_role("admin","cajero"))])
-async def get_credit(credit_id: str):
+async def get_credit(credit_id: str, request: Request, response: Response):
+  # cada abono actualiza saldo/status del crédito, así que xmin cubre los pagos
+  ver = await db.query_first("SELECT xmin::text AS v FROM credits WHERE id = $1", credit_id)  # type: ignore
+  if not ver:
+    raise HTTPException(404, "Crédito no encontrado")
+  not_modified = etag.check(request, response, etag.make_etag("credit", credit_id, ver["v"]))
+  if not_modified:
+    return not_modified
+
   q = """
   SELECT c.id, c.sale_id, c.customer_id, cu.nombre as customer_nombre,
          c.total, c.saldo, c.due_date, c.status, c.created_at,
@@ -165,60 +215,94 @@ async def get_credit(credit_id: str):
   return rows[0]
 
 
-@router.post("/{credit_id}/payments", dependencies=[Depends(require_role("admin","cajero"))])
-async def add_payment(credit_id: str, body: PaymentIn):
-  credit = await db.credits.find_unique(where={"id": credit_id})
-  if not credit:
-    raise HTTPException(404, "Crédito no encontrado")
-  if float(credit.saldo) <= 0:
-    raise HTTPException(400, "El crédito ya está saldado")
+@router.post("/{credit_id}/payments")
+async def add_payment(
+  credit_id: str,
+  body: PaymentIn,
+  user=Depends(require_role("admin","cajero")),
+  idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+  """
+  Registra un abono. Con Idempotency-Key los reintentos devuelven la
+  respuesta original sin duplicar el abono.
+  """
+  return await idempotency.run(idempotency_key, f"payments:{credit_id}:{user.id}", body,
+                               lambda complete: _add_payment(credit_id, body, complete))
 
-  amount = float(body.amount)
+async def _add_payment(credit_id: str, body: PaymentIn, complete: idempotency.Complete):
+  amount = body.amount
   if amount <= 0:
     raise HTTPException(400, "El abono debe ser > 0")
-  if amount > float(credit.saldo):
-    raise HTTPException(400, f"Abono mayor al saldo ({credit.saldo})")
-
-  nuevo_saldo = float(credit.saldo) - amount
-  new_status = "closed" if nuevo_saldo == 0 else ("overdue" if (credit.due_date < date.today()) else "partial")
 
   async with db.tx() as tx:
+    # saldo leído con el crédito bloqueado: dos abonos simultáneos no parten del mismo saldo
+    await tx.query_raw("SELECT id FROM credits WHERE id = $1::uuid FOR UPDATE", credit_id)  # type: ignore
+    credit = await tx.credits.find_unique(where={"id": credit_id})
+    if not credit:
+      raise HTTPException(404, "Crédito no encontrado")
+    saldo = to_cents(credit.saldo or 0)
+    if saldo <= 0:
+      raise HTTPException(400, "El crédito ya está saldado")
+    if amount > saldo:
+      raise HTTPException(400, f"Abono mayor al saldo ({from_cents(saldo)})")
+
+    nuevo_saldo = saldo - amount
+    new_status = "closed" if nuevo_saldo == 0 else ("overdue" if (credit.due_date < date.today()) else "partial")
+
     pay = await tx.credit_payments.create(data={
       "credit_id": credit_id,
       "usuario_id": body.usuario_id,
-      "amount": amount,
+      "amount": from_cents(amount),
       "metodo_pago": body.metodo_pago,
       "notes": body.notes
     })
-    await tx.credits.update(where={"id": credit_id}, data={"saldo": nuevo_saldo, "status": new_status})
+    await tx.credits.update(where={"id": credit_id}, data={"saldo": from_cents(nuevo_saldo), "status": new_status})
+    await customer_balances.apply_payment(tx, credit.customer_id, from_cents(amount), nuevo_saldo == 0)
+    result = {"ok": True, "payment_id": pay.id, "nuevo_saldo": from_cents(nuevo_saldo), "status": new_status}
+    await complete(tx, result)
 
-  return {"ok": True, "payment_id": pay.id, "nuevo_saldo": nuevo_saldo, "status": new_status}
+  await live.publish(db, credit_event("payment", credit.tienda_id, credit_id, credit.customer_id,
+                                      amount, nuevo_saldo, credit.status, new_status))
 
+  return result
 
-@router.get("/aging/report", dependencies=[Depends(require_role("admin","cajero"))])
-async def aging_report():
+
+@router.get("/aging/report")
+async def aging_report(tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report"))):
   """
   Buckets: 0–30, 31–60, 61–90, 90+ (solo créditos con saldo > 0)
   """
-  q = """
+  params: List[Any] = []
+  tf = store_filter("c.tienda_id", tienda, params)
+  q = f"""
   SELECT
     sum(case when c.saldo > 0 and c.due_date >= current_date then c.saldo else 0 end) as current,
     sum(case when c.saldo > 0 and c.due_date < current_date and current_date - c.due_date <= 30 then c.saldo else 0 end) as "0_30",
     sum(case when c.saldo > 0 and current_date - c.due_date between 31 and 60 then c.saldo else 0 end) as "31_60",
     sum(case when c.saldo > 0 and current_date - c.due_date between 61 and 90 then c.saldo else 0 end) as "61_90",
     sum(case when c.saldo > 0 and current_date - c.due_date > 90 then c.saldo else 0 end) as "90_plus"
-  FROM credits c;
+  FROM credits c
+  WHERE c.saldo > 0{tf}
   """
-  row = await db.query_first(q)  # type: ignore
+  rdb = await read_db()
+  row = await rdb.query_first(q, *params)  # type: ignore
   return row
 
 
-@router.get("/customers/{customer_id}/statement", dependencies=[Depends(require_role("admin","cajero"))])
-async def customer_statement(customer_id: str):
+@router.get("/customers/{customer_id}/exposure", dependencies=[Depends(require_role("admin","cajero"))])
+async def customer_exposure(customer_id: str):
   """
-  Estado de cuenta: créditos activos del cliente con pagos.
+  Exposición del cliente para aprobar un crédito: límite, saldo, disponible,
+  créditos abiertos, vencimiento más próximo y monto vencido. Lee una fila de
+  customer_balances y los créditos abiertos del cliente en la primaria (sin retraso de réplica).
   """
-  q = """
+  row = await customer_balances.exposure(db, customer_id)
+  if not row:
+    raise HTTPException(404, "Cliente no encontrado")
+  return row
+
+
+_STATEMENT_SQL = """
   SELECT
     cu.id as customer_id, cu.nombre,
     COALESCE(json_agg(json_build_object(
@@ -240,18 +324,42 @@ async def customer_statement(customer_id: str):
   WHERE cu.id = $1
   GROUP BY cu.id, cu.nombre
   """
-  rows = await db.query_raw(q, customer_id)  # type: ignore
+
+async def _statement_data(client, customer_id: str) -> Dict[str, Any]:
+  """Estado de cuenta del cliente (JSON, CSV y PDF leen lo mismo); 404 si no existe."""
+  rows = await client.query_raw(_STATEMENT_SQL, customer_id)  # type: ignore
   if not rows:
     raise HTTPException(404, "Cliente no encontrado")
   return rows[0]
 
-@router.get("/customers/{customer_id}/statement.csv", dependencies=[Depends(require_role("admin","cajero"))])
+@router.get("/customers/{customer_id}/statement", dependencies=[Depends(require_role("admin","cajero", limit="list"))])
+async def customer_statement(customer_id: str, request: Request, response: Response):
+  """
+  Estado de cuenta: créditos activos del cliente con pagos.
+  ETag = xmin del cliente y de cada uno de sus créditos.
+  """
+  rdb = await read_db()
+  ver = await rdb.query_first(
+    """
+    SELECT cu.xmin::text AS c,
+           (SELECT string_agg(c.xmin::text, ',' ORDER BY c.id) FROM credits c WHERE c.customer_id = cu.id) AS cr
+    FROM customers cu WHERE cu.id = $1
+    """,
+    customer_id,
+  )  # type: ignore
+  if not ver:
+    raise HTTPException(404, "Cliente no encontrado")
+  not_modified = etag.check(request, response, etag.make_etag("statement", customer_id, ver["c"], ver["cr"]))
+  if not_modified:
+    return not_modified
+  return await _statement_data(rdb, customer_id)
+
+@router.get("/customers/{customer_id}/statement.csv", dependencies=[Depends(require_role("admin","cajero", limit="export"))])
 async def customer_statement_csv(customer_id: str):
   """
   Exporta el estado de cuenta del cliente en CSV.
   """
-  # reutilizamos la consulta del estado de cuenta
-  data = await customer_statement(customer_id)
+  data = await _statement_data(await read_db(), customer_id)
 
   buf = io.StringIO()
   writer = csv.writer(buf)
@@ -261,10 +369,10 @@ async def customer_statement_csv(customer_id: str):
 
   for c in data["credits"]:
     pays = c.get("payments") or []
-    total_pays = sum(float(p.get("amount",0) or 0) for p in pays)
+    total_pays = sum(to_cents(p.get("amount") or 0) for p in pays)
     writer.writerow([
       c["credit_id"], c["sale_id"], c["total"], c["saldo"], c["due_date"], c["status"],
-      len(pays), total_pays
+      len(pays), from_cents(total_pays)
     ])
 
   resp = PlainTextResponse(buf.getvalue(), media_type="text/csv; charset=utf-8")
@@ -273,12 +381,18 @@ async def customer_statement_csv(customer_id: str):
   return resp
 
 
-@router.get("/customers/{customer_id}/statement.pdf", dependencies=[Depends(require_role("admin","cajero"))])
+@router.get("/customers/{customer_id}/statement.pdf", dependencies=[Depends(require_role("admin","cajero", limit="export"))])
 async def customer_statement_pdf(customer_id: str):
   """
   Exporta el estado de cuenta del cliente en PDF sencillo (1–2 páginas).
   """
-  data = await customer_statement(customer_id)
+  # ReportLab se importa aquí y no al cargar el módulo: pesa en el arranque
+  # del worker y solo lo usa esta exportación
+  from reportlab.lib.pagesizes import A4
+  from reportlab.pdfgen import canvas
+  from reportlab.lib.units import cm
+
+  data = await _statement_data(await read_db(), customer_id)
 
   buffer = io.BytesIO()
   c = canvas.Canvas(buffer, pagesize=A4)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional, List
-from pydantic import BaseModel, EmailStr
-from app.db.client import db
+from pydantic import BaseModel, EmailStr, Field
+from app.db.client import db, read_db
 from app.core.security import require_role
+from app.core.money import Money, from_cents
 
 router = APIRouter()
 
@@ -11,15 +12,33 @@ class CustomerIn(BaseModel):
   telefono: Optional[str] = None
   email: Optional[EmailStr] = None
   direccion: Optional[str] = None
+  limite_credito: Optional[Money] = Field(None, ge=0)  # centavos; None = sin límite
+
+class CreditLimitIn(BaseModel):
+  limite_credito: Optional[Money] = Field(None, ge=0)  # centavos; None = sin límite
 
 @router.post("/", dependencies=[Depends(require_role("admin","cajero"))])
 async def create_customer(body: CustomerIn):
-  return await db.customers.create(data=body.dict())
+  data = body.dict()
+  if data["limite_credito"] is not None:
+    data["limite_credito"] = from_cents(data["limite_credito"])
+  else:
+    del data["limite_credito"]
+  return await db.customers.create(data=data)
+
+@router.put("/{customer_id}/credit-limit", dependencies=[Depends(require_role("admin"))])
+async def set_credit_limit(customer_id: str, body: CreditLimitIn):
+  limite = from_cents(body.limite_credito) if body.limite_credito is not None else None
+  updated = await db.customers.update_many(where={"id": customer_id}, data={"limite_credito": limite})
+  if not updated:
+    raise HTTPException(404, "Cliente no encontrado")
+  return {"ok": True, "customer_id": customer_id, "limite_credito": limite}
 
-@router.get("/", dependencies=[Depends(require_role("admin","cajero"))])
+@router.get("/", dependencies=[Depends(require_role("admin","cajero", limit="list"))])
 async def list_customers(q: Optional[str] = Query(None), take: int = 50, skip: int = 0):
+  rdb = await read_db()
   if q:
-    return await db.customers.find_many(
+    return await rdb.customers.find_many(
       where={"OR":[
         {"nombre": {"contains": q, "mode": "insensitive"}},
         {"email": {"contains": q, "mode": "insensitive"}},
@@ -27,4 +46,4 @@ async def list_customers(q: Optional[str] = Query(None), take: int = 50, skip: i
       ]},
       take=take, skip=skip, order={"created_at": "desc"}
     )
-  return await db.customers.find_many(take=take, skip=skip, order={"created_at": "desc"})
+  return await rdb.customers.find_many(take=take, skip=skip, order={"created_at": "desc"})
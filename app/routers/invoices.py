@@ -10,7 +10,7 @@ async def _next_invoice_number():
 
 @router.post("/{sale_id}")
 async def generate_invoice(sale_id: str, _=Depends(require_role("admin"))):
-    sale = await db.sales.find_unique(where={"id": sale_id}, include={"items": True})
+    sale = await db.sales.find_first(where={"id": sale_id})
     if not sale:
         raise HTTPException(404, "Venta no encontrada")
     consecutivo = await _next_invoice_number()
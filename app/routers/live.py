@@ -0,0 +1,93 @@
+import asyncio
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.core.security import user_from_token, sale_store
+from app.core.live import hub, LIVE_KEEPALIVE_SECONDS
+
+router = APIRouter()
+
+# EventSource y WebSocket del navegador no envían Authorization: el token va
+# en ?access_token= (o en el header, para clientes que sí pueden).
+
+async def _live_store(token: Optional[str], tienda_id: Optional[UUID]) -> Optional[str]:
+    if not token:
+        raise HTTPException(401, "Falta access_token")
+    user = await user_from_token(token)
+    if (user.rol or "cajero") not in ("admin", "cajero"):
+        raise HTTPException(403, "Permisos insuficientes")
+    return sale_store(user, str(tienda_id) if tienda_id else None)
+
+def _bearer(request_headers) -> Optional[str]:
+    auth = request_headers.get("authorization") or ""
+    return auth[7:] if auth.lower().startswith("bearer ") else None
+
+@router.get("/events")
+async def live_events(
+    request: Request,
+    access_token: Optional[str] = Query(None),
+    tienda_id: Optional[UUID] = Query(None),
+):
+    """
+    Server-Sent Events con los deltas de ventas, anulaciones y abonos
+    (de la tienda del usuario, o de toda la cadena si no tiene una).
+    """
+    tienda = await _live_store(access_token or _bearer(request.headers), tienda_id)
+    sub = hub.subscribe(tienda)
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(sub.queue.get(), LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"  # mantiene vivos proxies y balanceadores
+                    continue
+                yield b"data: " + payload + b"\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/ws")
+async def live_ws(
+    websocket: WebSocket,
+    access_token: Optional[str] = Query(None),
+    tienda_id: Optional[UUID] = Query(None),
+):
+    """Mismos eventos que /live/events por WebSocket (un mensaje de texto JSON por evento)."""
+    try:
+        tienda = await _live_store(access_token or _bearer(websocket.headers), tienda_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    await websocket.accept()
+    sub = hub.subscribe(tienda)
+
+    async def drain():
+        # el cliente no envía nada útil; leer detecta el cierre
+        while True:
+            await websocket.receive_text()
+
+    reader = asyncio.create_task(drain())
+    try:
+        while not reader.done():
+            getter = asyncio.ensure_future(sub.queue.get())
+            done, _ = await asyncio.wait({reader, getter}, timeout=LIVE_KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await websocket.send_text(getter.result().decode())
+            else:
+                getter.cancel()
+                if not done:
+                    await websocket.send_text('{"type":"ping"}')
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        hub.unsubscribe(sub)
+        reader.cancel()
+        if reader.done() and not reader.cancelled():
+            reader.exception()  # WebSocketDisconnect esperado
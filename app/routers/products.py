@@ -1,27 +1,252 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.db.client import db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Literal, Optional
+from datetime import date
+from uuid import UUID
+from pydantic import BaseModel, Field, validator
+from prisma.errors import UniqueViolationError
+import json, zlib
+from app.db.client import db, read_db
 from app.core.security import require_role
+from app.core.money import Money, from_cents
+from app.db import catalog, inventory
+from app.core import etag
+from app.core.responses import FastJSONResponse, wants_ndjson, ndjson_query
 
 router = APIRouter()
 
+# ---------- Schemas ----------
+class ProductCreate(BaseModel):
+    codigo_unico: str = Field(..., min_length=1, max_length=50)
+    nombre: str = Field(..., min_length=1, max_length=150)
+    categoria: Optional[str] = Field(None, max_length=100)
+    departamento: Optional[str] = Field(None, max_length=100)
+    tipo: Optional[str] = Field(None, max_length=100)
+    costo: Optional[Money] = Field(None, ge=0)  # centavos
+    precio: Money = Field(..., ge=0)            # centavos
+    stock: int = Field(0, ge=0)
+    tienda_id: Optional[UUID] = None
+
+class ProductPatch(BaseModel):
+    """Solo los campos enviados se escriben; para entradas/salidas de stock usar /stock."""
+    nombre: Optional[str] = Field(None, min_length=1, max_length=150)
+    categoria: Optional[str] = Field(None, max_length=100)
+    departamento: Optional[str] = Field(None, max_length=100)
+    tipo: Optional[str] = Field(None, max_length=100)
+    costo: Optional[Money] = Field(None, ge=0)
+    precio: Optional[Money] = Field(None, ge=0)
+    stock: Optional[int] = Field(None, ge=0)  # conteo absoluto
+    tienda_id: Optional[UUID] = None
+
+    @validator("nombre", "precio", "stock", pre=True)
+    def not_null(cls, v):
+        # omitir el campo lo deja igual; null explícito no borra un campo obligatorio
+        if v is None:
+            raise ValueError("no puede ser null")
+        return v
+
+class StockAdjustIn(BaseModel):
+    delta: int  # positivo = entrada, negativo = salida
+    motivo: Optional[str] = Field(None, max_length=200)
+    tipo: Literal["adjustment", "receipt"] = "adjustment"  # receipt = mercancía recibida
+
+class StockAdjustItem(BaseModel):
+    codigo_unico: str = Field(..., min_length=1)
+    delta: int
+
+class StockAdjustBatchIn(BaseModel):
+    items: List[StockAdjustItem] = Field(..., min_length=1, max_length=5000)
+    motivo: Optional[str] = Field(None, max_length=200)
+    tipo: Literal["adjustment", "receipt"] = "adjustment"
+
+def _product_data(fields: Dict[str, Any]) -> Dict[str, Any]:
+    data = dict(fields)
+    for k in ("costo", "precio"):
+        if data.get(k) is not None:
+            data[k] = from_cents(data[k])
+    if data.get("tienda_id") is not None:
+        data["tienda_id"] = str(data["tienda_id"])
+    return data
+
 @router.get("/")
-async def list_products(skip: int = 0, take: int = 100, _=Depends(require_role("admin","cajero"))):
-    return await db.products.find_many(skip=skip, take=take, order={"created_at": "desc"})
+async def list_products(request: Request, skip: int = 0, take: int = 100, _=Depends(require_role("admin","cajero", limit="list"))):
+    rdb = await read_db()
+    if wants_ndjson(request):
+        return ndjson_query(
+            rdb,
+            f"SELECT {catalog.PRODUCT_COLUMNS}, p.created_at FROM products p "
+            "ORDER BY p.created_at DESC OFFSET $1 LIMIT $2",
+            skip, take,
+        )
+    prods = await rdb.products.find_many(skip=skip, take=take, order={"created_at": "desc"})
+    stock = await inventory.current(rdb, [p.id for p in prods])
+    return FastJSONResponse([p.model_copy(update={"stock": stock.get(p.id, p.stock)}) for p in prods])
+
+@router.get("/changes")
+async def catalog_changes(
+    since: int = Query(0, ge=0, description="cursor devuelto por la sincronización anterior"),
+    limit: int = Query(1000, ge=1, le=5000),
+    _=Depends(require_role("admin","cajero")),
+):
+    """
+    Cambios del catálogo desde `since`: upserts (productos creados/modificados)
+    y deletions (lápidas). Guardar `cursor` y repetir mientras has_more=true.
+    """
+    rdb = await read_db()
+    return await catalog.changes(rdb, since, limit)
+
+@router.get("/snapshot.ndjson.gz")
+async def catalog_snapshot(_=Depends(require_role("admin","cajero"))):
+    """
+    Catálogo completo en NDJSON comprimido con gzip para la primera
+    sincronización. La primera línea trae el cursor para pedir /changes.
+    """
+    rdb = await read_db()
+    cursor = await catalog.safe_cursor(rdb)
+
+    async def body():
+        gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+        yield gz.compress((json.dumps({"cursor": cursor}) + "\n").encode())
+        async for rows in catalog.iter_products(rdb):
+            chunk = "".join(json.dumps(jsonable_encoder(r), separators=(",", ":")) + "\n" for r in rows)
+            out = gz.compress(chunk.encode())
+            if out:
+                yield out
+        yield gz.flush()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={
+            "Content-Encoding": "gzip",
+            "Content-Disposition": 'attachment; filename="catalogo.ndjson.gz"',
+            "X-Catalog-Cursor": str(cursor),
+        },
+    )
 
 @router.get("/{codigo_unico}")
-async def get_by_code(codigo_unico: str, _=Depends(require_role("admin","cajero"))):
+async def get_by_code(codigo_unico: str, request: Request, response: Response, _=Depends(require_role("admin","cajero"))):
     prod = await db.products.find_unique(where={"codigo_unico": codigo_unico})
     if not prod:
         raise HTTPException(404, "Producto no encontrado")
-    return prod
+    # version (catalog_version_seq) cambia con cada escritura del producto; las
+    # ventas solo agregan movimientos, así que el stock actual entra aparte
+    stock = (await inventory.current(db, [prod.id])).get(prod.id, prod.stock)
+    not_modified = etag.check(request, response, etag.make_etag("product", prod.id, prod.version, stock))
+    if not_modified:
+        return not_modified
+    return prod.model_copy(update={"stock": stock})
 
 @router.post("/")
-async def create_product(data: dict, _=Depends(require_role("admin","cajero"))):
-    return await db.products.create(data=data)
+async def create_product(body: ProductCreate, _=Depends(require_role("admin","cajero"))):
+    data = _product_data(body.model_dump())
+    data["stock"] = 0  # el stock inicial entra al libro como recepción
+    try:
+        async with db.tx() as tx:
+            prod = await tx.products.create(data=data)
+            await inventory.apply_deltas(tx, {prod.id: body.stock}, "receipt")
+    except UniqueViolationError:
+        raise HTTPException(409, f"Ya existe un producto con código {body.codigo_unico}")
+    return prod.model_copy(update={"stock": body.stock})
+
+@router.patch("/{codigo_unico}")
+async def patch_product(codigo_unico: str, body: ProductPatch, _=Depends(require_role("admin","cajero"))):
+    """
+    Actualización parcial: escribe solo los campos enviados y responde solo
+    esos campos más codigo_unico y version.
+    """
+    changes = _product_data(body.model_dump(exclude_unset=True))
+    if not changes:
+        raise HTTPException(400, "Nada que actualizar")
+    # un conteo absoluto de stock se registra como ajuste en el libro
+    count = changes.pop("stock", None)
+    out: Dict[str, Any] = {"codigo_unico": codigo_unico}
+    # campos y conteo juntos: o se aplican ambos o ninguno
+    async with db.tx() as tx:
+        if changes:
+            prod = await tx.products.update(where={"codigo_unico": codigo_unico}, data=changes)
+            if not prod:
+                raise HTTPException(404, "Producto no encontrado")
+            out.update(codigo_unico=prod.codigo_unico, version=prod.version,
+                       **{k: getattr(prod, k) for k in changes})
+        if count is not None:
+            applied, rejected = await inventory.lock_and_adjust(
+                tx, {codigo_unico: count}, motivo="conteo", counts=True)
+            if rejected:
+                raise HTTPException(404, "Producto no encontrado")
+            out.setdefault("version", applied[0]["version"])
+            out["stock"] = applied[0]["stock"]
+    return out
 
 @router.put("/{codigo_unico}")
-async def update_product(codigo_unico: str, data: dict, _=Depends(require_role("admin","cajero"))):
-    return await db.products.update(where={"codigo_unico": codigo_unico}, data=data)
+async def update_product(codigo_unico: str, body: ProductPatch, _=Depends(require_role("admin","cajero"))):
+    """
+    Compatibilidad: escribe los campos enviados igual que PATCH (los omitidos
+    no se tocan) y responde el producto completo con su stock actual.
+    """
+    await patch_product(codigo_unico, body)
+    prod = await db.products.find_unique(where={"codigo_unico": codigo_unico})
+    if not prod:
+        raise HTTPException(404, "Producto no encontrado")
+    stock = await inventory.current(db, [prod.id])
+    return prod.model_copy(update={"stock": stock.get(prod.id, prod.stock)})
+
+@router.post("/stock/adjustments")
+async def adjust_stock_batch(body: StockAdjustBatchIn, _=Depends(require_role("admin","cajero"))):
+    """
+    Ajustes de stock masivos (conteos de inventario) en una sola transacción.
+    Los deltas del mismo código se suman; un ajuste que dejaría stock negativo
+    o de un código inexistente se rechaza sin afectar a los demás.
+    """
+    deltas: Dict[str, int] = {}
+    for it in body.items:
+        deltas[it.codigo_unico] = deltas.get(it.codigo_unico, 0) + it.delta
+    applied, rejected = await inventory.adjust(db, deltas, body.tipo, body.motivo)
+    return {"ok": not rejected, "applied": applied, "rejected": rejected}
+
+@router.post("/{codigo_unico}/stock")
+async def adjust_stock(codigo_unico: str, body: StockAdjustIn, _=Depends(require_role("admin","cajero"))):
+    """Entrada/salida de stock relativa y atómica; 409 si quedaría negativo."""
+    applied, rejected = await inventory.adjust(db, {codigo_unico: body.delta}, body.tipo, body.motivo)
+    if rejected:
+        if rejected[0]["motivo"] == "no_existe":
+            raise HTTPException(404, "Producto no encontrado")
+        raise HTTPException(409, "Stock insuficiente para el ajuste")
+    return applied[0]
+
+@router.get("/stock/as-of")
+async def stock_as_of(
+    fecha: date = Query(..., description="YYYY-MM-DD; stock al cierre de ese día"),
+    codigo_unico: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    take: int = Query(100, ge=1, le=5000),
+    _=Depends(require_role("admin", limit="report")),
+):
+    """
+    Stock por producto al cierre de `fecha`, desde el último cierre diario
+    guardado más los movimientos de los días siguientes (sin recorrer ventas).
+    """
+    rdb = await read_db()
+    desde = await inventory.started(rdb)
+    if desde and fecha < desde:
+        raise HTTPException(400, f"El libro de stock empieza el {desde}; no hay historial anterior")
+    return FastJSONResponse(await inventory.stock_at(rdb, fecha, codigo_unico, skip, take))
+
+@router.get("/{codigo_unico}/movements")
+async def stock_movements(
+    codigo_unico: str,
+    date_from: Optional[date] = Query(None, description="YYYY-MM-DD"),
+    date_to: Optional[date] = Query(None, description="YYYY-MM-DD"),
+    limit: int = Query(500, ge=1, le=5000),
+    _=Depends(require_role("admin","cajero", limit="list")),
+):
+    """Movimientos de stock del producto (ventas, anulaciones, ajustes, entradas), más recientes primero."""
+    rdb = await read_db()
+    prod = await rdb.products.find_unique(where={"codigo_unico": codigo_unico})
+    if not prod:
+        raise HTTPException(404, "Producto no encontrado")
+    return FastJSONResponse(await inventory.movements(rdb, prod.id, date_from, date_to, limit))
 
 @router.delete("/{codigo_unico}")
 async def delete_product(codigo_unico: str, _=Depends(require_role("admin","cajero"))):
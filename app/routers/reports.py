@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Depends, Query
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from typing import Any, List, Optional, Literal
 from datetime import datetime, date
-from app.db.client import db
-from app.core.security import require_role
+from pydantic import BaseModel, Field
+from app.db.client import db, read_db
+from app.core.security import require_role, store_scope
+from app.core.jobs import report_jobs, QueueFull
+from app.core import etag
+from app.core.responses import wants_ndjson, ndjson_query, ndjson_rows
+from app.db import product_stats, credit_flow, analytics
+from app.db.scope import store_filter
 
 router = APIRouter()
 
@@ -15,35 +22,66 @@ def _to_datestr(d: Optional[date]) -> Optional[str]:
     return d.isoformat() if isinstance(d, date) else (d if d is None else str(d))
 
 @router.get("/summary")
-async def summary(_=Depends(require_role("admin"))):
-    q = "SELECT (SELECT COUNT(*) FROM products) AS num_productos, (SELECT COUNT(*) FROM sales) AS num_ventas, (SELECT COALESCE(SUM(total),0) FROM sales) AS total_vendido"
-    row = await db.query_first(q)  # type: ignore
+async def summary(request: Request, response: Response, tienda: Optional[str] = Depends(store_scope("admin", limit="report"))):
+    # las particiones archivadas cuentan desde su acumulado diario
+    params: List[Any] = []
+    tf = store_filter("tienda_id", tienda, params)
+    where = (" WHERE " + tf[len(" AND "):]) if tf else ""
+    q = f"""
+    SELECT (SELECT COUNT(*) FROM products) AS num_productos,  -- catálogo compartido
+           (SELECT COUNT(*) FROM sales{where}) + (SELECT COALESCE(SUM(num_ventas_all),0) FROM sales_archive_daily{where}) AS num_ventas,
+           (SELECT COALESCE(SUM(total),0) FROM sales{where}) + (SELECT COALESCE(SUM(total_all),0) FROM sales_archive_daily{where}) AS total_vendido
+    """
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "sales", "catalog", scope=tienda)
+    if not_modified:
+        return not_modified
+    row = await rdb.query_first(q, *params)  # type: ignore
     return row
 
 @router.get("/top-products")
-async def top_products(limit: int = 10):
-    q = """    SELECT p.codigo_unico, p.nombre,
-    SUM(si.cantidad) AS unidades,
-    SUM(si.subtotal) AS vendido,
-    SUM((COALESCE(p.precio,0) - COALESCE(p.costo,0)) * si.cantidad) AS utilidad_estimada
-    FROM sale_items si
-    JOIN products p ON p.id = si.producto_id
-    GROUP BY p.codigo_unico, p.nombre
-    ORDER BY unidades DESC
-    LIMIT $1
+async def top_products(
+    request: Request,
+    response: Response,
+    limit: int = 10,
+    date_from: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    date_to: Optional[str] = Query(None, description="YYYY-MM-DD (inclusive)"),
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report")),
+):
     """
-    rows = await db.query_raw(q, limit)  # type: ignore
-    return rows
+    Top productos por unidades (excluye ventas anuladas), leído del acumulado
+    diario product_daily_stats.
+    """
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "sales", "catalog", scope=tienda)
+    if not_modified:
+        return not_modified
+    return await product_stats.top_products(rdb, _parse_date(date_from), _parse_date(date_to), limit, tienda)
+
+@router.post("/top-products/rebuild", dependencies=[Depends(require_role("admin", limit="report"))])
+async def top_products_rebuild(
+    date_from: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    date_to: Optional[str] = Query(None, description="YYYY-MM-DD (inclusive)"),
+):
+    """
+    Reconstruye el acumulado diario de productos desde sale_items.
+    """
+    rows = await product_stats.rebuild(db, _parse_date(date_from), _parse_date(date_to))
+    return {"ok": True, "rows": rows}
 
-@router.get("/credits/overview", dependencies=[Depends(require_role("admin","cajero"))])
-async def credits_overview():
+@router.get("/credits/overview")
+async def credits_overview(request: Request, response: Response,
+                           tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report"))):
     """
     Totales de cartera: total créditos, saldo pendiente, saldo vencido y distribución por estado.
     """
-    q = """
+    params: List[Any] = []
+    tf = store_filter("tienda_id", tienda, params)
+    q = f"""
     WITH base AS (
       SELECT total, saldo, status, (CASE WHEN saldo > 0 AND due_date < current_date THEN true ELSE false END) AS vencido
       FROM credits
+      WHERE true{tf}
     )
     SELECT
       COALESCE((SELECT SUM(total) FROM base),0) AS total_creditos,
@@ -54,64 +92,94 @@ async def credits_overview():
         'partial', (SELECT COALESCE(SUM(saldo),0) FROM base WHERE status='partial'),
         'closed',  (SELECT COALESCE(SUM(saldo),0) FROM base WHERE status='closed'),
         'overdue', (SELECT COALESCE(SUM(saldo),0) FROM base WHERE status='overdue')
-      ), '{}') AS por_estado
-    ;
+      ), '{{}}') AS por_estado
     """
-    row = await db.query_first(q)  # type: ignore
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "credits", scope=tienda)
+    if not_modified:
+        return not_modified
+    row = await rdb.query_first(q, *params)  # type: ignore
     return row
 
-@router.get("/credits/top-debtors", dependencies=[Depends(require_role("admin","cajero"))])
-async def credits_top_debtors(limit: int = Query(10, ge=1, le=100)):
+@router.get("/credits/top-debtors")
+async def credits_top_debtors(request: Request, response: Response, limit: int = Query(10, ge=1, le=100),
+                              tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report"))):
     """
-    Top clientes por saldo pendiente (>0), descendente.
+    Top clientes por saldo pendiente (>0), descendente. Para toda la cadena se
+    lee customer_balances por su índice de saldo; por tienda se agrega credits.
     """
-    q = """
-    SELECT cu.id as customer_id, cu.nombre,
-           COALESCE(SUM(c.saldo),0) AS saldo_total,
-           COUNT(*) as num_creditos
-    FROM credits c
-    JOIN customers cu ON cu.id = c.customer_id
-    WHERE c.saldo > 0
-    GROUP BY cu.id, cu.nombre
-    ORDER BY saldo_total DESC
-    LIMIT $1
-    """
-    rows = await db.query_raw(q, limit)  # type: ignore
+    params: List[Any] = [limit]
+    tf = store_filter("c.tienda_id", tienda, params)
+    if tf:
+        q = f"""
+        SELECT cu.id as customer_id, cu.nombre,
+               COALESCE(SUM(c.saldo),0) AS saldo_total,
+               COUNT(*) as num_creditos
+        FROM credits c
+        JOIN customers cu ON cu.id = c.customer_id
+        WHERE c.saldo > 0{tf}
+        GROUP BY cu.id, cu.nombre
+        ORDER BY saldo_total DESC
+        LIMIT $1
+        """
+    else:
+        q = """
+        SELECT cu.id as customer_id, cu.nombre,
+               cb.saldo AS saldo_total,
+               cb.creditos_abiertos AS num_creditos
+        FROM customer_balances cb
+        JOIN customers cu ON cu.id = cb.customer_id
+        WHERE cb.saldo > 0
+        ORDER BY cb.saldo DESC
+        LIMIT $1
+        """
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "credits", scope=tienda)
+    if not_modified:
+        return not_modified
+    rows = await rdb.query_raw(q, *params)  # type: ignore
     return rows
 
-@router.get("/credits/upcoming-due", dependencies=[Depends(require_role("admin","cajero"))])
-async def credits_upcoming_due(days: int = Query(7, ge=1, le=60)):
+@router.get("/credits/upcoming-due")
+async def credits_upcoming_due(request: Request, response: Response, days: int = Query(7, ge=1, le=60),
+                               tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report"))):
     """
     Créditos con saldo > 0 que vencen en los próximos N días (incluye hoy).
     """
-    q = """
+    params: List[Any] = [days]
+    tf = store_filter("c.tienda_id", tienda, params)
+    q = f"""
     SELECT c.id as credit_id, cu.id as customer_id, cu.nombre,
            c.saldo, c.due_date, c.status
     FROM credits c
     JOIN customers cu ON cu.id = c.customer_id
     WHERE c.saldo > 0
-      AND c.due_date BETWEEN current_date AND current_date + ($1 || ' days')::interval
+      AND c.due_date BETWEEN current_date AND current_date + ($1 || ' days')::interval{tf}
     ORDER BY c.due_date ASC
     """
-    rows = await db.query_raw(q, days)  # type: ignore
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "credits", scope=tienda)
+    if not_modified:
+        return not_modified
+    rows = await rdb.query_raw(q, *params)  # type: ignore
     return rows
 
-@router.get("/sales/timeseries", dependencies=[Depends(require_role("admin","cajero"))])
-async def sales_timeseries(
-    granularity: str = Query("day", regex="^(day|week|month)$"),
-    date_from: Optional[str] = None,
-    date_to: Optional[str] = None
-):
+def _sales_timeseries_query(granularity: str, date_from: Optional[str], date_to: Optional[str],
+                            tienda: Optional[str] = None):
     g = {"day":"day","week":"week","month":"month"}[granularity]
     d_from = _parse_date(date_from)
     d_to   = _parse_date(date_to)
     d_from_s = _to_datestr(d_from)
     d_to_s   = _to_datestr(d_to)
+    params: List[Any] = [d_from_s, d_to_s]  # <-- strings
+    tf_s = store_filter("s.tienda_id", tienda, params)
+    tf_a = tf_s.replace("s.tienda_id", "a.tienda_id")
 
     q = f"""
     WITH bounds AS (
       SELECT
-        COALESCE($1::date, (SELECT MIN(created_at)::date FROM sales)) AS dmin,
+        COALESCE($1::date, LEAST((SELECT MIN(s.created_at)::date FROM sales s WHERE true{tf_s}),
+                                  (SELECT MIN(a.day) FROM sales_archive_daily a WHERE true{tf_a}))) AS dmin,
         COALESCE($2::date, current_date) AS dmax
     ),
     series AS (
@@ -119,12 +187,23 @@ async def sales_timeseries(
       FROM bounds
     ),
     summed AS (
-      SELECT date_trunc('{g}', s.created_at)::date AS bucket_date,
-             COUNT(*) AS num_ventas,
-             COALESCE(SUM(s.total),0) AS total_vendido
-      FROM sales s
-      WHERE s.created_at::date BETWEEN (SELECT dmin FROM bounds) AND (SELECT dmax FROM bounds)
-        AND COALESCE(s.anulada,false) = false
+      SELECT bucket_date, SUM(num_ventas) AS num_ventas, SUM(total_vendido) AS total_vendido
+      FROM (
+        SELECT date_trunc('{g}', s.created_at)::date AS bucket_date,
+               COUNT(*) AS num_ventas,
+               COALESCE(SUM(s.total),0) AS total_vendido
+        FROM sales s
+        -- rango sobre created_at con parámetros: poda particiones al ejecutar
+        WHERE s.created_at >= COALESCE($1::date, '-infinity')
+          AND s.created_at < COALESCE($2::date, current_date) + 1
+          AND COALESCE(s.anulada,false) = false{tf_s}
+        GROUP BY 1
+        UNION ALL
+        SELECT date_trunc('{g}', a.day)::date, SUM(a.num_ventas), SUM(a.total_vendido)
+        FROM sales_archive_daily a
+        WHERE a.day BETWEEN (SELECT dmin FROM bounds) AND (SELECT dmax FROM bounds){tf_a}
+        GROUP BY 1
+      ) x
       GROUP BY 1
     )
     SELECT s.bucket_date::text AS bucket,
@@ -132,22 +211,83 @@ async def sales_timeseries(
            COALESCE(sumd.num_ventas,0)     AS num_ventas
     FROM series s
     LEFT JOIN summed sumd USING (bucket_date)
-    ORDER BY s.bucket_date;
+    ORDER BY s.bucket_date
     """
-    rows = await db.query_raw(q, d_from_s, d_to_s)  # <-- strings
+    return q, params
+
+async def _sales_timeseries(granularity: str, date_from: Optional[str], date_to: Optional[str],
+                            tienda: Optional[str] = None, rdb=None):
+    rdb = rdb or await read_db()
+    if analytics.ANALYTICS_ENABLED:
+        return await analytics.sales_timeseries(rdb, granularity, _parse_date(date_from), _parse_date(date_to), tienda)
+    q, params = _sales_timeseries_query(granularity, date_from, date_to, tienda)
+    rows = await rdb.query_raw(q, *params)
     return rows
 
+@router.get("/sales/timeseries")
+async def sales_timeseries(
+    request: Request,
+    response: Response,
+    granularity: str = Query("day", regex="^(day|week|month)$"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report")),
+):
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "sales", scope=tienda)
+    if not_modified:
+        return not_modified
+    if wants_ndjson(request):
+        if analytics.ANALYTICS_ENABLED:
+            rows = await _sales_timeseries(granularity, date_from, date_to, tienda, rdb)
+            return ndjson_rows(rows, headers=response.headers)
+        q, params = _sales_timeseries_query(granularity, date_from, date_to, tienda)
+        return ndjson_query(rdb, q, *params, headers=response.headers)
+    return await _sales_timeseries(granularity, date_from, date_to, tienda, rdb)
+
+
+@router.get("/credits/flow")
+async def credits_flow(
+    request: Request,
+    response: Response,
+    granularity: str = Query("day", regex="^(day|week|month)$"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report")),
+):
+    """
+    Flujo de cartera por bucket en una sola pasada:
+    credit_issued, payments_received, net_change, outstanding_end y repayment_rate.
+    """
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "credits", scope=tienda)
+    if not_modified:
+        return not_modified
+    rows = await _flow(rdb, granularity, date_from, date_to, tienda)
+    if wants_ndjson(request):
+        return ndjson_rows(rows, headers=response.headers)
+    return rows
+
+async def _flow(rdb, granularity: str, date_from: Optional[str], date_to: Optional[str], tienda: Optional[str]):
+    """Flujo de cartera desde las series en memoria, o en SQL si están desactivadas."""
+    engine = analytics.credit_flow if analytics.ANALYTICS_ENABLED else credit_flow.credit_flow
+    return await engine(rdb, granularity, _parse_date(date_from), _parse_date(date_to), tienda)
+
+async def _credits_flow(granularity: str, date_from: Optional[str], date_to: Optional[str],
+                        tienda: Optional[str] = None):
+    rdb = await read_db()
+    return await _flow(rdb, granularity, date_from, date_to, tienda)
 
-@router.get("/credits/timeseries", dependencies=[Depends(require_role("admin","cajero"))])
+
+@router.get("/credits/timeseries")
 async def credits_timeseries(
+    request: Request,
+    response: Response,
     granularity: str = Query("day", regex="^(day|week|month)$"),
     date_from: Optional[str] = None,
-    date_to: Optional[str] = None
+    date_to: Optional[str] = None,
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report")),
 ):
-    g = {"day":"day","week":"week","month":"month"}[granularity]
-    d_from = _parse_date(date_from)
-    d_to   = _parse_date(date_to)
-    
     """
     Serie temporal de cartera:
     - credit_issued: total de créditos creados en el período (sum(credits.total))
@@ -155,119 +295,113 @@ async def credits_timeseries(
     - net_change: issued - payments
     - outstanding_end: saldo acumulado al fin de cada bucket (aprox = sum(issued) - sum(payments) acumulado)
     """
-    g = {"day":"day","week":"week","month":"month"}[granularity]
-    d_from = _parse_date(date_from)
-    d_to   = _parse_date(date_to)
-
-    q = f"""
-    WITH bounds AS (
-      SELECT
-        COALESCE($1::date, LEAST(
-          (SELECT MIN(created_at)::date FROM credits),
-          (SELECT MIN(paid_at)::date FROM credit_payments)
-        )) AS dmin,
-        COALESCE($2::date, current_date) AS dmax
-    ),
-    series AS (
-      SELECT generate_series(dmin, dmax, '1 {g}'::interval)::date AS bucket_date
-      FROM bounds
-    ),
-    issued AS (
-      SELECT date_trunc('{g}', c.created_at)::date AS bucket_date,
-             COALESCE(SUM(c.total),0) AS credit_issued
-      FROM credits c
-      WHERE c.created_at::date BETWEEN (SELECT dmin FROM bounds) AND (SELECT dmax FROM bounds)
-      GROUP BY 1
-    ),
-    paid AS (
-      SELECT date_trunc('{g}', p.paid_at)::date AS bucket_date,
-             COALESCE(SUM(p.amount),0) AS payments_received
-      FROM credit_payments p
-      WHERE p.paid_at::date BETWEEN (SELECT dmin FROM bounds) AND (SELECT dmax FROM bounds)
-      GROUP BY 1
-    ),
-    merged AS (
-      SELECT s.bucket_date,
-             COALESCE(i.credit_issued,0)    AS credit_issued,
-             COALESCE(p.payments_received,0) AS payments_received
-      FROM series s
-      LEFT JOIN issued i USING (bucket_date)
-      LEFT JOIN paid   p USING (bucket_date)
-      ORDER BY s.bucket_date
-    ),
-    running AS (
-      SELECT bucket_date::text AS bucket,
-             credit_issued,
-             payments_received,
-             (credit_issued - payments_received) AS net_change,
-             SUM(credit_issued - payments_received)
-               OVER (ORDER BY bucket_date ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS outstanding_end
-      FROM merged
-    )
-    SELECT * FROM running;
-    """
-    rows = await db.query_raw(q, d_from, d_to)  # type: ignore
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "credits", scope=tienda)
+    if not_modified:
+        return not_modified
+    rows = await _credits_timeseries(granularity, date_from, date_to, tienda, rdb)
+    if wants_ndjson(request):
+        return ndjson_rows(rows, headers=response.headers)
     return rows
 
+async def _credits_timeseries(granularity: str, date_from: Optional[str], date_to: Optional[str],
+                              tienda: Optional[str] = None, rdb=None):
+    rdb = rdb or await read_db()
+    rows = await _flow(rdb, granularity, date_from, date_to, tienda)
+    return [
+        {k: r[k] for k in ("bucket", "credit_issued", "payments_received", "net_change", "outstanding_end")}
+        for r in rows
+    ]
+
 
-@router.get("/credits/repayment-rate", dependencies=[Depends(require_role("admin","cajero"))])
+@router.get("/credits/repayment-rate")
 async def credits_repayment_rate(
+    request: Request,
+    response: Response,
     granularity: str = Query("month", regex="^(month|week|day)$"),
     date_from: Optional[str] = None,
-    date_to: Optional[str] = None
+    date_to: Optional[str] = None,
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report")),
 ):
-    g = {"day":"day","week":"week","month":"month"}[granularity]
-    d_from = _parse_date(date_from)
-    d_to   = _parse_date(date_to)
     """
     Tasa de recuperación = pagos / créditos emitidos por período.
     Para períodos sin emisión, devuelve 0.
     """
-    g = {"day":"day","week":"week","month":"month"}[granularity]
-    d_from = _parse_date(date_from)
-    d_to   = _parse_date(date_to)
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "credits", scope=tienda)
+    if not_modified:
+        return not_modified
+    rows = await _credits_repayment_rate(granularity, date_from, date_to, tienda, rdb)
+    if wants_ndjson(request):
+        return ndjson_rows(rows, headers=response.headers)
+    return rows
 
-    q = f"""
-    WITH bounds AS (
-      SELECT
-        COALESCE($1::date, LEAST(
-          (SELECT MIN(created_at)::date FROM credits),
-          (SELECT MIN(paid_at)::date FROM credit_payments)
-        )) AS dmin,
-        COALESCE($2::date, current_date) AS dmax
-    ),
-    series AS (
-      SELECT generate_series(dmin, dmax, '1 {g}'::interval)::date AS bucket_date
-      FROM bounds
-    ),
-    issued AS (
-      SELECT date_trunc('{g}', c.created_at)::date AS bucket_date,
-             COALESCE(SUM(c.total),0) AS credit_issued
-      FROM credits c
-      WHERE c.created_at::date BETWEEN (SELECT dmin FROM bounds) AND (SELECT dmax FROM bounds)
-      GROUP BY 1
-    ),
-    paid AS (
-      SELECT date_trunc('{g}', p.paid_at)::date AS bucket_date,
-             COALESCE(SUM(p.amount),0) AS payments_received
-      FROM credit_payments p
-      WHERE p.paid_at::date BETWEEN (SELECT dmin FROM bounds) AND (SELECT dmax FROM bounds)
-      GROUP BY 1
-    ),
-    merged AS (
-      SELECT s.bucket_date,
-             COALESCE(i.credit_issued,0) AS credit_issued,
-             COALESCE(p.payments_received,0) AS payments_received
-      FROM series s
-      LEFT JOIN issued i USING (bucket_date)
-      LEFT JOIN paid   p USING (bucket_date)
-      ORDER BY s.bucket_date
-    )
-    SELECT bucket_date::text AS bucket,
-           credit_issued,
-           payments_received,
-           CASE WHEN credit_issued > 0 THEN ROUND((payments_received / credit_issued)::numeric, 4) ELSE 0 END AS repayment_rate
-    FROM merged;
+async def _credits_repayment_rate(granularity: str, date_from: Optional[str], date_to: Optional[str],
+                                  tienda: Optional[str] = None, rdb=None):
+    rdb = rdb or await read_db()
+    rows = await _flow(rdb, granularity, date_from, date_to, tienda)
+    return [
+        {k: r[k] for k in ("bucket", "credit_issued", "payments_received", "repayment_rate")}
+        for r in rows
+    ]
+
+
+# ---------------------------
+# Trabajos asíncronos de reportes
+# ---------------------------
+
+class ReportJobIn(BaseModel):
+    report: Literal["sales_timeseries", "credits_flow", "credits_timeseries", "credits_repayment_rate"]
+    granularity: str = Field("day", pattern="^(day|week|month)$")
+    date_from: Optional[str] = Field(None, description="YYYY-MM-DD")
+    date_to: Optional[str] = Field(None, description="YYYY-MM-DD (inclusive)")
+
+# Los trabajos llaman a la versión sin Request/ETag de cada reporte
+_REPORT_JOBS = {
+    "sales_timeseries": _sales_timeseries,
+    "credits_flow": _credits_flow,
+    "credits_timeseries": _credits_timeseries,
+    "credits_repayment_rate": _credits_repayment_rate,
+}
+
+@router.post("/jobs", status_code=202)
+async def submit_report_job(body: ReportJobIn, tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report"))):
+    """
+    Encola un reporte pesado y devuelve el job_id. Si ya hay un trabajo
+    idéntico en curso se devuelve ese mismo.
     """
-    rows = await db.query_raw(q, d_from, d_to)  # type: ignore
-    return rows
\ No newline at end of file
+    # validar fechas antes de encolar
+    for s in (body.date_from, body.date_to):
+        try:
+            _parse_date(s)
+        except ValueError:
+            raise HTTPException(422, f"Fecha inválida: {s}")
+
+    fn = _REPORT_JOBS[body.report]
+    params = body.model_dump(exclude={"report"})
+    params["tienda"] = tienda  # la tienda entra en la llave de deduplicación
+    try:
+        job = report_jobs.submit(body.report, params, lambda: fn(**params))
+    except QueueFull:
+        raise HTTPException(503, "Cola de reportes llena, intenta más tarde")
+    return job.info()
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(require_role("admin","cajero"))])
+async def get_report_job(job_id: str, wait: float = Query(0, ge=0, le=30, description="Long-poll en segundos")):
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Trabajo no encontrado o vencido")
+    await report_jobs.wait(job, wait)
+    return job.info()
+
+@router.get("/jobs/{job_id}/result", dependencies=[Depends(require_role("admin","cajero"))])
+async def get_report_job_result(job_id: str, wait: float = Query(0, ge=0, le=30, description="Long-poll en segundos")):
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Trabajo no encontrado o vencido")
+    await report_jobs.wait(job, wait)
+    if job.status == "error":
+        raise HTTPException(500, f"El reporte falló: {job.error}")
+    if job.status != "done":
+        return JSONResponse(status_code=202, content=job.info())
+    return job.result
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
 from typing import List, Dict, Any, Optional
-from datetime import datetime, date
-from uuid import UUID
+from datetime import datetime, date, timezone
+from uuid import UUID, uuid4
+import json, logging, os
 from pydantic import BaseModel, Field, validator
-from app.db.client import db
-from app.core.security import require_role
+from app.db.client import db, read_db
+from app.core.security import require_role, store_scope, sale_store
+from app.core.money import Money, to_cents, from_cents, line_total
+from app.core import idempotency, etag
+from app.core.live import hub as live, sale_event
+from app.core.responses import FastJSONResponse, RawJSON, dumps, query_json, wants_ndjson, ndjson_query
+from app.db import product_stats, inventory, day_closes
+from app.db.scope import store_filter
 
 router = APIRouter()
+log = logging.getLogger("gratus.sales")
 
 # ---------------------------
 # Pydantic Schemas (input)
@@ -15,13 +23,13 @@ router = APIRouter()
 class SaleItemIn(BaseModel):
     codigo_unico: str = Field(..., min_length=1)
     cantidad: int = Field(..., gt=0)
-    precio_unitario: float = Field(..., gt=0)
+    precio_unitario: Money = Field(..., gt=0)  # centavos
 
 class SaleCreate(BaseModel):
     usuario_id: Optional[str] = None
     tienda_id: Optional[str] = None
     metodo_pago: str = Field(..., min_length=1)  # efectivo|tarjeta|transferencia|etc
-    descuento: float = Field(0, ge=0)
+    descuento: Money = Field(0, ge=0)  # centavos
     items: List[SaleItemIn]
 
     @validator("items")
@@ -30,10 +38,19 @@ class SaleCreate(BaseModel):
             raise ValueError("Debe incluir items de venta")
         return v
 
+class SyncSaleIn(SaleCreate):
+    client_uuid: UUID              # generado por el POS, hace idempotente el reenvío
+    created_at: datetime           # momento real de la venta en el POS
+
+class SalesSyncIn(BaseModel):
+    sales: List[SyncSaleIn] = Field(..., min_length=1, max_length=5000)
+
 # ---------------------------
 # Helpers
 # ---------------------------
 
+SYNC_CHUNK_SIZE = int(os.getenv("SYNC_CHUNK_SIZE", "200"))
+
 def _parse_date(s: Optional[str]) -> Optional[date]:
     if not s:
         return None
@@ -43,34 +60,61 @@ def _parse_date(s: Optional[str]) -> Optional[date]:
 # Endpoints
 # ---------------------------
 
-@router.post("/", dependencies=[Depends(require_role("admin","cajero"))])
-async def create_sale(payload: SaleCreate):
+@router.post("/")
+async def create_sale(
+    payload: SaleCreate,
+    user=Depends(require_role("admin","cajero")),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """
+    Registra una venta. Con Idempotency-Key los reintentos devuelven la
+    respuesta original sin volver a descontar stock.
+    La venta queda en la tienda del usuario si tiene una asignada.
+    """
+    payload.tienda_id = sale_store(user, payload.tienda_id)
+    return await idempotency.run(idempotency_key, f"sales:{user.id}", payload,
+                                 lambda complete: _create_sale(payload, complete))
+
+async def _create_sale(payload: SaleCreate, complete: idempotency.Complete):
     codes = [i.codigo_unico for i in payload.items]
     prods = await db.products.find_many(where={"codigo_unico": {"in": codes}})
     pmap = {p.codigo_unico: p for p in prods}
+    stock = await inventory.current(db, [p.id for p in prods])
 
     for it in payload.items:
         p = pmap.get(it.codigo_unico)
         if not p:
             raise HTTPException(400, f"Producto no existe: {it.codigo_unico}")
-        if (p.stock or 0) < it.cantidad:
+        if stock[p.id] < it.cantidad:
             raise HTTPException(400, f"Stock insuficiente para {p.nombre} ({p.codigo_unico})")
 
-    subtotal = sum(it.precio_unitario * it.cantidad for it in payload.items)
-    total = subtotal - float(payload.descuento or 0)
+    # Aritmética en centavos; Decimal solo al escribir/responder
+    subtotal = sum(line_total(it.precio_unitario, it.cantidad) for it in payload.items)
+    total = subtotal - payload.descuento
     if total < 0:
         raise HTTPException(400, "El total no puede ser negativo")
 
     sale_data: Dict[str, Any] = {
         "metodo_pago": payload.metodo_pago,
-        "descuento": payload.descuento,
-        "total": total,
+        "descuento": from_cents(payload.descuento),
+        "total": from_cents(total),
     }
     # incluir solo si vienen
     if payload.usuario_id: sale_data["usuario_id"] = payload.usuario_id
     if payload.tienda_id:  sale_data["tienda_id"]  = payload.tienda_id
 
+    needs: Dict[str, int] = {}
+    for it in payload.items:
+        pid = pmap[it.codigo_unico].id
+        needs[pid] = needs.get(pid, 0) + it.cantidad
+
+    deltas: Dict[str, int] = {}
     async with db.tx() as tx:
+        # revisión bajo bloqueo: otra venta pudo llevarse el stock desde la lectura de arriba
+        short = await inventory.lock_and_check(tx, needs)
+        if short:
+            p = next(p for p in prods if p.id == short[0])
+            raise HTTPException(400, f"Stock insuficiente para {p.nombre} ({p.codigo_unico})")
         sale = await tx.sales.create(data=sale_data)
         for it in payload.items:
             p = pmap[it.codigo_unico]
@@ -78,18 +122,169 @@ async def create_sale(payload: SaleCreate):
                 "venta_id": sale.id,
                 "producto_id": p.id,
                 "cantidad": it.cantidad,
-                "precio_unitario": it.precio_unitario,
-                "subtotal": it.precio_unitario * it.cantidad
+                "precio_unitario": from_cents(it.precio_unitario),
+                "subtotal": from_cents(line_total(it.precio_unitario, it.cantidad)),
+                "created_at": sale.created_at,  # misma partición mensual que la venta
             })
-            await tx.products.update(where={"id": p.id}, data={"stock": (p.stock - it.cantidad)})
+            deltas[p.id] = deltas.get(p.id, 0) - it.cantidad
+        await inventory.apply_deltas(tx, deltas, "sale", sale.id)
+        await product_stats.apply_sales(tx, [sale.id])
+        result = {"ok": True, "sale_id": sale.id, "subtotal": from_cents(subtotal), "descuento": from_cents(payload.descuento), "total": from_cents(total)}
+        await complete(tx, result)
+
+    await live.publish(db, sale_event("sale", sale.created_at, payload.tienda_id, payload.metodo_pago,
+                                     total, payload.descuento))
+    return result
+
+
+@router.post("/sync")
+async def sync_sales(body: SalesSyncIn, user=Depends(require_role("admin","cajero"))):
+    """
+    Sincroniza ventas hechas offline por un POS, en el orden recibido.
+    - Ventas cuyo client_uuid ya existe -> "duplicate" (con su sale_id)
+    - Copias repetidas dentro del lote -> el resultado final de la primera copia
+    - Producto inexistente / stock insuficiente / total negativo -> "conflict"
+    - El resto se aplica en transacciones de SYNC_CHUNK_SIZE ventas con
+      inserción masiva de ventas e items y un solo INSERT de movimientos de stock por lote.
+    """
+    results: List[Dict[str, Any]] = [{"client_uuid": str(s.client_uuid)} for s in body.sales]
+
+    uuids = [str(s.client_uuid) for s in body.sales]
+    existing = await db.sales.find_many(where={"client_uuid": {"in": uuids}})
+    seen: Dict[str, str] = {s.client_uuid: s.id for s in existing if s.client_uuid}
+    first: Dict[str, int] = {}             # client_uuid -> índice de la copia aceptada
+    repeats: List[tuple] = []              # (índice, índice de la primera copia)
 
-    return {"ok": True, "sale_id": sale.id, "subtotal": subtotal, "descuento": float(payload.descuento or 0), "total": total}
+    codes = list({it.codigo_unico for s in body.sales for it in s.items})
+    prods = await db.products.find_many(where={"codigo_unico": {"in": codes}})
+    pmap = {p.codigo_unico: p for p in prods}
+    pbyid = {p.id: p for p in prods}
+    stock = await inventory.current(db, pbyid.keys())
+
+    accepted: List[Dict[str, Any]] = []   # {"idx", "sale", "items", "deltas"}
+    for idx, sale in enumerate(body.sales):
+        cu = str(sale.client_uuid)
+        if cu in seen:
+            results[idx].update(status="duplicate", sale_id=seen[cu])
+            continue
+        if cu in first:
+            # aún no se escribe nada: se resuelve cuando se sepa cómo terminó la primera
+            repeats.append((idx, first[cu]))
+            continue
+
+        reason = None
+        need: Dict[str, int] = {}
+        for it in sale.items:
+            p = pmap.get(it.codigo_unico)
+            if not p:
+                reason = f"Producto no existe: {it.codigo_unico}"
+                break
+            need[p.id] = need.get(p.id, 0) + it.cantidad
+        if reason is None:
+            for pid, qty in need.items():
+                if stock[pid] < qty:
+                    p = pbyid[pid]
+                    reason = f"Stock insuficiente para {p.nombre} ({p.codigo_unico})"
+                    break
+        subtotal = sum(line_total(it.precio_unitario, it.cantidad) for it in sale.items)
+        total = subtotal - sale.descuento
+        if reason is None and total < 0:
+            reason = "El total no puede ser negativo"
+        if reason:
+            results[idx].update(status="conflict", reason=reason)
+            continue
+
+        for pid, qty in need.items():
+            stock[pid] -= qty
+        sale_id = str(uuid4())
+        first[cu] = idx
+        sale_row: Dict[str, Any] = {
+            "id": sale_id,
+            "client_uuid": cu,
+            "metodo_pago": sale.metodo_pago,
+            "descuento": from_cents(sale.descuento),
+            "total": from_cents(total),
+            "created_at": sale.created_at,
+        }
+        if sale.usuario_id: sale_row["usuario_id"] = sale.usuario_id
+        tienda = sale_store(user, sale.tienda_id)
+        if tienda:          sale_row["tienda_id"]  = tienda
+        items = [{
+            "venta_id": sale_id,
+            "producto_id": pmap[it.codigo_unico].id,
+            "cantidad": it.cantidad,
+            "precio_unitario": from_cents(it.precio_unitario),
+            "subtotal": from_cents(line_total(it.precio_unitario, it.cantidad)),
+            "created_at": sale.created_at,
+        } for it in sale.items]
+        accepted.append({"idx": idx, "sale": sale_row, "items": items, "deltas": need,
+                         "total": total, "descuento": sale.descuento})
+
+    for i in range(0, len(accepted), SYNC_CHUNK_SIZE):
+        chunk = accepted[i:i + SYNC_CHUNK_SIZE]
+        fits: List[Dict[str, Any]] = []
+        short: List[Dict[str, Any]] = []
+        try:
+            async with db.tx() as tx:
+                # bajo bloqueo: las ventas en línea confirmadas desde la lectura de arriba
+                # pudieron dejar sin stock a ventas del lote (se marcan conflict, en orden)
+                live_stock = await inventory.lock(tx, {pid for a in chunk for pid in a["deltas"]})
+                for a in chunk:
+                    if all(live_stock.get(pid, 0) >= qty for pid, qty in a["deltas"].items()):
+                        for pid, qty in a["deltas"].items():
+                            live_stock[pid] -= qty
+                        fits.append(a)
+                    else:
+                        short.append(a)
+                if fits:
+                    await tx.sales.create_many(data=[a["sale"] for a in fits])
+                    await tx.sale_items.create_many(data=[it for a in fits for it in a["items"]])
+                    # un movimiento por venta y producto
+                    await inventory.record(tx, "sale", [
+                        (pid, -qty, a["sale"]["id"]) for a in fits for pid, qty in a["deltas"].items()
+                    ])
+                    await product_stats.apply_sales(tx, [a["sale"]["id"] for a in fits])
+        except Exception:
+            log.exception("sync_sales: no se pudo aplicar el lote %d", i // SYNC_CHUNK_SIZE)
+            for a in chunk:
+                results[a["idx"]].update(status="error", reason="No se pudo aplicar el lote; reintentar")
+            continue
+        for a in short:
+            p = next(pbyid[pid] for pid, qty in a["deltas"].items() if live_stock.get(pid, 0) < qty)
+            results[a["idx"]].update(status="conflict",
+                                     reason=f"Stock insuficiente para {p.nombre} ({p.codigo_unico})")
+        for a in fits:
+            results[a["idx"]].update(status="applied", sale_id=a["sale"]["id"])
+        # un delta por (día, tienda, método) del lote
+        kpis: Dict[tuple, Dict[str, Any]] = {}
+        for a in fits:
+            row = a["sale"]
+            ev = sale_event("sync", row["created_at"], row.get("tienda_id"), row["metodo_pago"],
+                           a["total"], a["descuento"])
+            k = (ev["day"], ev["tienda_id"], ev["metodo_pago"])
+            if k in kpis:
+                for f in ("num_ventas", "total", "descuento"):
+                    kpis[k][f] += ev[f]
+            else:
+                kpis[k] = ev
+        for ev in kpis.values():
+            await live.publish(db, ev)
+
+    for idx, orig in repeats:
+        results[idx].update({k: v for k, v in results[orig].items() if k != "client_uuid"})
+
+    counts: Dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {"ok": True, "counts": counts, "results": results}
 
 
 @router.get("/{sale_id}", dependencies=[Depends(require_role("admin","cajero"))])
-async def get_sale(sale_id: str):
+async def get_sale(sale_id: str, request: Request, response: Response):
     """
     Trae la venta y sus items con datos de producto.
+    ETag = xmin de la venta: los items no cambian después de creada y anularla
+    reescribe la fila.
     """
     # Validar que el sale_id no sea "undefined" o vacío
     if not sale_id or sale_id == "undefined":
@@ -121,17 +316,26 @@ async def get_sale(sale_id: str):
         'subtotal', si.subtotal
       ) ORDER BY si.id) FILTER (WHERE si.id IS NOT NULL), '[]') AS items
     FROM sales s
-    LEFT JOIN sale_items si ON si.venta_id = s.id
+    LEFT JOIN sale_items si ON si.venta_id = s.id AND si.created_at = s.created_at
     LEFT JOIN products p ON p.id = si.producto_id
     WHERE s.id = $1::uuid  -- CAST EXPLÍCITO A UUID
     GROUP BY s.id
     """
     
+    ver = await db.query_first("SELECT xmin::text AS v FROM sales WHERE id = $1::uuid", str(sale_uuid))  # type: ignore
+    if not ver:
+        raise HTTPException(status_code=404, detail="Venta no encontrada")
+    not_modified = etag.check(request, response, etag.make_etag("sale", str(sale_uuid), ver["v"]))
+    if not_modified:
+        return not_modified
+
     try:
         rows = await db.query_raw(q, str(sale_uuid))  # type: ignore
         if not rows:
             raise HTTPException(status_code=404, detail="Venta no encontrada")
         return rows[0]
+    except HTTPException:
+        raise
     except Exception as e:
         # Log del error para debugging
         print(f"Error en get_sale: {e}")
@@ -141,11 +345,12 @@ async def get_sale(sale_id: str):
         )
 
 
-@router.get("/", dependencies=[Depends(require_role("admin","cajero"))])
+@router.get("/")
 async def list_sales(
+    request: Request,
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="list")),
     date_from: Optional[str] = Query(None, description="YYYY-MM-DD"),
     date_to: Optional[str]   = Query(None, description="YYYY-MM-DD (inclusive)"),
-    tienda_id: Optional[str] = None,
     usuario_id: Optional[str] = None,
     metodo_pago: Optional[str] = None,
     anulada: Optional[bool] = None,
@@ -159,15 +364,16 @@ async def list_sales(
     filters = []
     params: List[Any] = []
 
+    # rangos sobre created_at (sin ::date) para que se poden las particiones
     if date_from:
-        filters.append("s.created_at::date >= $%s" % (len(params)+1))
+        filters.append("s.created_at >= $%s::date" % (len(params)+1))
         params.append(_parse_date(date_from))
     if date_to:
-        filters.append("s.created_at::date <= $%s" % (len(params)+1))
+        filters.append("s.created_at < $%s::date + 1" % (len(params)+1))
         params.append(_parse_date(date_to))
-    if tienda_id:
-        filters.append("s.tienda_id = $%s" % (len(params)+1))
-        params.append(tienda_id)
+    if tienda:
+        filters.append("s.tienda_id = $%s::uuid" % (len(params)+1))
+        params.append(tienda)
     if usuario_id:
         filters.append("s.usuario_id = $%s" % (len(params)+1))
         params.append(usuario_id)
@@ -189,12 +395,19 @@ async def list_sales(
     ORDER BY s.created_at DESC
     LIMIT ${len(params)-1} OFFSET ${len(params)}
     """
-    rows = await db.query_raw(q, *params)  # type: ignore
-    return rows
-
-
-@router.get("/kpi/daily", dependencies=[Depends(require_role("admin","cajero"))])
-async def kpi_daily(day: Optional[str] = Query(None, description="YYYY-MM-DD; por defecto hoy")):
+    rdb = await read_db()
+    if wants_ndjson(request):
+        return ndjson_query(rdb, q, *params)
+    return FastJSONResponse(await query_json(rdb, q, *params))
+
+
+@router.get("/kpi/daily")
+async def kpi_daily(
+    request: Request,
+    response: Response,
+    day: Optional[str] = Query(None, description="YYYY-MM-DD; por defecto hoy"),
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report")),
+):
     """
     KPIs del día: #ventas, total vendido, total por método de pago y top 5 productos.
     """
@@ -203,90 +416,192 @@ async def kpi_daily(day: Optional[str] = Query(None, description="YYYY-MM-DD; po
     else:
         d = datetime.now().date()
 
+    rdb = await read_db()
+    not_modified = await etag.check_report(rdb, request, response, "sales", "catalog", scope=tienda)
+    if not_modified:
+        return not_modified
+    return await kpi_daily_data(rdb, d, tienda)
+
+async def kpi_daily_data(client, d: date, tienda: Optional[str]) -> Dict[str, Any]:
+    """Cuerpo de /kpi/daily; el arranque lo usa para calentar las consultas del día."""
     # Totales básicos y por método
-    q1 = """
+    params: List[Any] = [d]
+    tf = store_filter("tienda_id", tienda, params)
+    q1 = f"""
     WITH base AS (
       SELECT * FROM sales
-      WHERE created_at::date = $1 AND COALESCE(anulada,false) = false
+      WHERE created_at >= $1::date AND created_at < $1::date + 1 AND COALESCE(anulada,false) = false{tf}
     )
     SELECT
       (SELECT COUNT(*) FROM base) AS num_ventas,
       COALESCE((SELECT SUM(total) FROM base), 0) AS total_vendido
     """
-    head = await db.query_first(q1, d)  # type: ignore
+    head = await client.query_first(q1, *params)  # type: ignore
 
-    q2 = """
+    q2 = f"""
     SELECT metodo_pago, COALESCE(SUM(total),0) AS total
     FROM sales
-    WHERE created_at::date = $1 AND COALESCE(anulada,false) = false
+    WHERE created_at >= $1::date AND created_at < $1::date + 1 AND COALESCE(anulada,false) = false{tf}
     GROUP BY 1
     ORDER BY 2 DESC
     """
-    by_method = await db.query_raw(q2, d)  # type: ignore
+    by_method = await client.query_raw(q2, *params)  # type: ignore
 
-    q3 = """
-    SELECT p.codigo_unico, p.nombre, SUM(si.cantidad) AS unidades, SUM(si.subtotal) AS vendido
-    FROM sale_items si
-    JOIN sales s ON s.id = si.venta_id
-    JOIN products p ON p.id = si.producto_id
-    WHERE s.created_at::date = $1 AND COALESCE(s.anulada,false) = false
-    GROUP BY p.codigo_unico, p.nombre
-    ORDER BY unidades DESC
-    LIMIT 5
-    """
-    top_products = await db.query_raw(q3, d)  # type: ignore
+    top_products = await product_stats.top_products(client, d, d, 5, tienda)
 
     return {"day": str(d), "head": head, "by_method": by_method, "top_products": top_products}
 
 
-@router.get("/close/day", dependencies=[Depends(require_role("admin","cajero"))])
-async def close_day(day: Optional[str] = Query(None, description="YYYY-MM-DD; por defecto hoy")):
+async def _close_day_data(client, d: date, tienda: Optional[str]) -> Dict[str, Any]:
     """
-    Resumen de cierre de día:
+    Resumen de cierre calculado desde ventas:
     - Ventas, total, total por método
     - Productos vendidos (cantidades y total)
     - Descuentos totales
     """
-    if day:
-        d = _parse_date(day)
-    else:
-        d = datetime.now().date()
-
-    q_head = """
+    params: List[Any] = [d]
+    tf = store_filter("tienda_id", tienda, params)
+    q_head = f"""
     SELECT
       COUNT(*) AS num_ventas,
       COALESCE(SUM(total),0) AS total_vendido,
       COALESCE(SUM(descuento),0) AS descuentos
     FROM sales
-    WHERE created_at::date = $1 AND COALESCE(anulada,false) = false
+    WHERE created_at >= $1::date AND created_at < $1::date + 1 AND COALESCE(anulada,false) = false{tf}
     """
-    head = await db.query_first(q_head, d)  # type: ignore
+    head = await client.query_first(q_head, *params)  # type: ignore
 
-    q_pay = """
+    q_pay = f"""
     SELECT metodo_pago, COALESCE(SUM(total),0) AS total
     FROM sales
-    WHERE created_at::date = $1 AND COALESCE(anulada,false) = false
+    WHERE created_at >= $1::date AND created_at < $1::date + 1 AND COALESCE(anulada,false) = false{tf}
     GROUP BY 1
     ORDER BY 2 DESC
     """
-    by_method = await db.query_raw(q_pay, d)  # type: ignore
+    by_method = await client.query_raw(q_pay, *params)  # type: ignore
 
-    q_items = """
+    item_params: List[Any] = [d]
+    tf_items = store_filter("s.tienda_id", tienda, item_params)
+    q_items = f"""
     SELECT p.codigo_unico, p.nombre,
            SUM(si.cantidad) AS unidades,
            SUM(si.subtotal) AS vendido
     FROM sale_items si
-    JOIN sales s ON s.id = si.venta_id
+    JOIN sales s ON s.id = si.venta_id AND s.created_at = si.created_at
     JOIN products p ON p.id = si.producto_id
-    WHERE s.created_at::date = $1 AND COALESCE(s.anulada,false) = false
+    WHERE si.created_at >= $1::date AND si.created_at < $1::date + 1
+      AND COALESCE(s.anulada,false) = false{tf_items}
     GROUP BY p.codigo_unico, p.nombre
     ORDER BY unidades DESC
     """
-    items = await db.query_raw(q_items, d)  # type: ignore
+    # el detalle por producto puede ser grande: Postgres arma el JSON
+    items = await query_json(client, q_items, *item_params)
 
     return {"day": str(d), "summary": head, "by_method": by_method, "items": items}
 
 
+@router.get("/close/day")
+async def close_day(
+    request: Request,
+    response: Response,
+    day: Optional[str] = Query(None, description="YYYY-MM-DD; por defecto hoy"),
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report")),
+):
+    """
+    Resumen de cierre de día. Si el día ya se cerró (POST /sales/close/day)
+    se sirve la última revisión guardada, sin recalcular; si no, se calcula
+    desde las ventas.
+    """
+    if day:
+        d = _parse_date(day)
+    else:
+        d = datetime.now().date()
+
+    rdb = await read_db()
+    snap = await day_closes.latest(rdb, d, tienda)
+    if snap:
+        not_modified = etag.check(request, response,
+                                  etag.make_etag("day_close", str(d), day_closes.store_key(tienda), snap["revision"]))
+        if not_modified:
+            return not_modified
+        return FastJSONResponse(RawJSON(snap["body"].encode()), headers=response.headers)
+
+    not_modified = await etag.check_report(rdb, request, response, "sales", "catalog", scope=tienda)
+    if not_modified:
+        return not_modified
+    data = await _close_day_data(rdb, d, tienda)
+    return FastJSONResponse(data, headers=response.headers)
+
+
+@router.post("/close/day")
+async def close_day_snapshot(
+    day: Optional[str] = Query(None, description="YYYY-MM-DD; por defecto hoy"),
+    motivo: Optional[str] = Query(None, max_length=500, description="Obligatorio para re-cerrar un día ya cerrado"),
+    tienda: Optional[str] = Depends(store_scope("admin","cajero", limit="report")),
+    user=Depends(require_role("admin","cajero")),
+):
+    """
+    Cierra el día: guarda el resumen (por tienda o de toda la cadena) como
+    revisión inmutable. Re-cerrar un día ya cerrado (anulaciones tardías)
+    requiere admin y motivo, y agrega una revisión nueva.
+    """
+    d = _parse_date(day) if day else datetime.now().date()
+    current = await day_closes.latest(db, d, tienda)
+    if current:
+        if not motivo:
+            raise HTTPException(409, f"El día {d} ya está cerrado (revisión {current['revision']}); indica motivo para re-cerrar")
+        if user.rol != "admin":
+            raise HTTPException(403, "Solo admin puede re-cerrar un día")
+    revision = current["revision"] + 1 if current else 1
+
+    data = await _close_day_data(db, d, tienda)
+    data["cierre"] = {
+        "revision": revision,
+        "closed_at": datetime.now(timezone.utc),
+        "closed_by": user.id,
+        "motivo": motivo,
+    }
+    body = dumps(data)
+    if not await day_closes.insert(db, d, tienda, revision, body.decode(), user.id, motivo):
+        raise HTTPException(409, "Cierre concurrente del mismo día; vuelve a consultarlo")
+    return FastJSONResponse(RawJSON(body))
+
+
+@router.get("/close/day/audit", dependencies=[Depends(require_role("admin"))])
+async def close_day_audit(
+    day: str = Query(..., description="YYYY-MM-DD"),
+    tienda: Optional[str] = Depends(store_scope("admin", limit="report")),
+):
+    """
+    Revisiones del cierre y los totales actuales del día, para detectar
+    cambios posteriores al cierre (diferencia != 0 -> re-cerrar).
+    """
+    d = _parse_date(day)
+    rdb = await read_db()
+    revisions = await day_closes.history(rdb, d, tienda)
+    if not revisions:
+        raise HTTPException(404, f"El día {d} no está cerrado")
+    params: List[Any] = [d]
+    tf = store_filter("tienda_id", tienda, params)
+    actual = await rdb.query_first(f"""
+    SELECT COUNT(*) AS num_ventas, COALESCE(SUM(total),0) AS total_vendido
+    FROM sales
+    WHERE created_at >= $1::date AND created_at < $1::date + 1 AND COALESCE(anulada,false) = false{tf}
+    """, *params)  # type: ignore
+    closed = revisions[-1]["summary"]
+    if isinstance(closed, str):
+        closed = json.loads(closed)
+    return {
+        "day": str(d),
+        "revisions": revisions,
+        "actual": actual,
+        "diferencia": {
+            "num_ventas": int(actual["num_ventas"]) - int(closed["num_ventas"]),
+            "total_vendido": from_cents(to_cents(actual["total_vendido"]) - to_cents(closed["total_vendido"])),
+        },
+    }
+
+
 @router.post("/{sale_id}/cancel", dependencies=[Depends(require_role("admin"))])
 async def cancel_sale(sale_id: str):
     """
@@ -314,30 +629,40 @@ async def cancel_sale(sale_id: str):
     # Usar el UUID validado
     sale_id_str = str(sale_uuid)
     
-    sale = await db.sales.find_unique(where={"id": sale_id_str})
+    sale = await db.sales.find_first(where={"id": sale_id_str})
     if not sale:
         raise HTTPException(404, "Venta no encontrada")
     if getattr(sale, "anulada", False):
         raise HTTPException(status_code=409, detail="La venta ya está anulada")
 
     # Traer items de venta
-    items = await db.sale_items.find_many(where={"venta_id": sale_id_str})
+    items = await db.sale_items.find_many(where={"venta_id": sale_id_str, "created_at": sale.created_at})
     if not items:
         raise HTTPException(400, "Venta sin items, no se puede anular correctamente")
 
-    # Restaurar stock en transacción
+    # Restaurar stock en transacción (movimientos de anulación)
+    deltas: Dict[str, int] = {}
+    for it in items:
+        deltas[it.producto_id] = deltas.get(it.producto_id, 0) + it.cantidad
+    # el evento se arma antes de confirmar: un dato raro en la venta no puede
+    # convertir en error una anulación ya hecha
+    event = sale_event("cancel", sale.created_at, sale.tienda_id, sale.metodo_pago,
+                       -to_cents(sale.total or 0), -to_cents(sale.descuento or 0), -1)
     async with db.tx() as tx:
-        # Restaurar stock
-        for it in items:
-            prod = await tx.products.find_unique(where={"id": it.producto_id})
-            if not prod:
-                raise HTTPException(400, f"Producto no encontrado para item {it.id}")
-            await tx.products.update(
-                where={"id": prod.id},
-                data={"stock": (prod.stock or 0) + it.cantidad}
-            )
-        # Marcar anulado
-        await tx.sales.update(where={"id": sale_id_str}, data={"anulada": True})
+        # Marcar anulado solo si sigue vigente: de dos anulaciones simultáneas,
+        # la segunda espera el bloqueo de la fila, no la encuentra y recibe 409
+        # sin descontar otra vez el acumulado ni el stock
+        n = await tx.sales.update_many(
+            where={"id": sale_id_str, "created_at": sale.created_at,
+                   "OR": [{"anulada": False}, {"anulada": None}]},
+            data={"anulada": True},
+        )
+        if not n:
+            raise HTTPException(status_code=409, detail="La venta ya está anulada")
+        await product_stats.apply_sales(tx, [sale_id_str], -1)
+        await inventory.apply_deltas(tx, deltas, "void", sale_id_str)
+
+    await live.publish(db, event)
 
     return {"ok": True, "sale_id": sale_id_str, "message": "Venta anulada y stock restaurado"}
 
@@ -0,0 +1,38 @@
+"""
+Compara dos resultados de bench/run.py:
+
+    python -m bench.compare bench/results/antes.json bench/results/despues.json
+"""
+import json, sys
+
+METRICS = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms"]
+
+def _delta(a: float, b: float) -> str:
+    if not a:
+        return "   n/a"
+    return f"{(b - a) / a * 100:+6.1f}%"
+
+def main(base_path: str, new_path: str) -> None:
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"base {base['meta']['commit']}  ->  nuevo {new['meta']['commit']}")
+    print(f"{'escenario':28s} " + "  ".join(f"{m:>30s}" for m in METRICS))
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        a = base["results"].get(name)
+        b = new["results"].get(name)
+        if not a or not b:
+            print(f"{name:28s} (solo en {'base' if a else 'nuevo'})")
+            continue
+        if a.get("failed") or b.get("failed"):
+            # con 429 la latencia mide el límite por usuario, no el código
+            print(f"{name:28s} (fallido en {'base' if a.get('failed') else 'nuevo'}: respuestas 429)")
+            continue
+        cols = [f"{a[m]:.1f} -> {b[m]:.1f} ({_delta(a[m], b[m]).strip()})" for m in METRICS]
+        print(f"{name:28s} " + "  ".join(f"{c:>30s}" for c in cols))
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        raise SystemExit(__doc__)
+    main(sys.argv[1], sys.argv[2])
@@ -0,0 +1,33 @@
+"""
+Micro-benchmark del cálculo de totales de una venta: float (como antes) vs
+centavos enteros (app.core.money). No requiere BD.
+
+    python -m bench.micro_money --items 5 --number 200000
+"""
+import argparse, random, timeit
+from decimal import Decimal
+from app.core.money import to_cents, from_cents, line_total
+
+def main(args) -> None:
+    items_f = [(round(random.uniform(1, 200), 2), random.randint(1, 5)) for _ in range(args.items)]
+    items_c = [(to_cents(p), q) for p, q in items_f]
+
+    def float_path():
+        subtotal = sum(p * q for p, q in items_f)
+        lines = [Decimal(str(p * q)) for p, q in items_f]  # conversión por línea al escribir
+        return Decimal(str(subtotal)), lines
+
+    def cents_path():
+        subtotal = sum(line_total(p, q) for p, q in items_c)
+        lines = [from_cents(line_total(p, q)) for p, q in items_c]
+        return from_cents(subtotal), lines
+
+    for name, fn in (("float", float_path), ("cents", cents_path)):
+        t = min(timeit.repeat(fn, number=args.number, repeat=3))
+        print(f"{name:6s} {t / args.number * 1e6:8.3f} µs/venta ({args.items} items)")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=5)
+    ap.add_argument("--number", type=int, default=200000)
+    main(ap.parse_args())
@@ -0,0 +1,215 @@
+"""
+Genera carga contra la API y reporta throughput y p50/p95/p99 por escenario
+en un JSON comparable entre commits (ver bench/compare.py).
+
+Requiere la API levantada (uvicorn app.main:app) sobre una BD sembrada con
+bench/seed.py, y las mismas variables de entorno (SECRET_KEY, DATABASE_URL)
+para emitir el token del usuario de benchmark. La API debe correr con
+RATE_LIMIT_ENABLED=0: toda la carga sale de un solo usuario y el límite por
+usuario la frenaría. Un escenario que recibe algún 429 (también en el
+calentamiento) se marca "failed", sus números no son comparables, y el
+proceso termina con error.
+
+    python -m bench.run --base-url http://localhost:8000 --concurrency 16 --duration 30
+    python -m bench.run --scenarios create_sale,get_by_code --out bench/results/antes.json
+"""
+import argparse, asyncio, json, math, os, random, statistics, subprocess, time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+import httpx
+from app.db.client import db
+from app.core.security import create_access_token
+from bench.seed import BENCH_ADMIN_EMAIL
+
+class Fixtures:
+    """Datos existentes que usan los escenarios (códigos, créditos abiertos)."""
+    def __init__(self, codes: List[str], credits: List[str]):
+        self.codes = codes
+        self.credits = credits
+
+async def load_fixtures() -> Tuple[str, Fixtures]:
+    await db.connect()
+    try:
+        user = await db.users.find_unique(where={"email": BENCH_ADMIN_EMAIL})
+        if not user:
+            raise SystemExit("No existe el usuario de benchmark; corre primero python -m bench.seed")
+        codes = await db.query_raw(
+            "SELECT codigo_unico FROM products WHERE codigo_unico LIKE 'BENCH-%' AND stock > 1000 LIMIT 2000")  # type: ignore
+        credits = await db.query_raw(
+            "SELECT id FROM credits WHERE saldo > 100 ORDER BY random() LIMIT 2000")  # type: ignore
+    finally:
+        await db.disconnect()
+    token = create_access_token(subject=user.id, role="admin", expires_in=24 * 3600)
+    return token, Fixtures([r["codigo_unico"] for r in codes], [r["id"] for r in credits])
+
+# ---------- Escenarios ----------
+# Cada escenario devuelve (método, url, json|None)
+
+Scenario = Callable[[Fixtures], Tuple[str, str, Any]]
+
+def _create_sale(fx: Fixtures):
+    items = [{"codigo_unico": random.choice(fx.codes), "cantidad": random.randint(1, 3),
+              "precio_unitario": round(random.uniform(1, 200), 2)} for _ in range(random.randint(1, 5))]
+    return "POST", "/sales/", {"metodo_pago": "efectivo", "descuento": 0, "items": items}
+
+def _get_by_code(fx: Fixtures):
+    return "GET", f"/products/{random.choice(fx.codes)}", None
+
+def _add_payment(fx: Fixtures):
+    return "POST", f"/credits/{random.choice(fx.credits)}/payments", {"amount": 0.01, "metodo_pago": "efectivo"}
+
+def _kpi_daily(fx: Fixtures):
+    d = date.today() - timedelta(days=random.randint(0, 30))
+    return "GET", f"/sales/kpi/daily?day={d.isoformat()}", None
+
+def _report_summary(fx: Fixtures):
+    return "GET", "/reports/summary", None
+
+def _report_top_products(fx: Fixtures):
+    return "GET", "/reports/top-products?limit=10", None
+
+def _report_sales_timeseries(fx: Fixtures):
+    g = random.choice(["day", "week", "month"])
+    d_from = (date.today() - timedelta(days=365)).isoformat()
+    return "GET", f"/reports/sales/timeseries?granularity={g}&date_from={d_from}", None
+
+def _report_credits_flow(fx: Fixtures):
+    g = random.choice(["day", "week", "month"])
+    d_from = (date.today() - timedelta(days=365)).isoformat()
+    return "GET", f"/reports/credits/flow?granularity={g}&date_from={d_from}", None
+
+def _report_top_debtors(fx: Fixtures):
+    return "GET", "/reports/credits/top-debtors?limit=10", None
+
+SCENARIOS: Dict[str, Scenario] = {
+    "create_sale": _create_sale,
+    "get_by_code": _get_by_code,
+    "add_payment": _add_payment,
+    "kpi_daily": _kpi_daily,
+    "report_summary": _report_summary,
+    "report_top_products": _report_top_products,
+    "report_sales_timeseries": _report_sales_timeseries,
+    "report_credits_flow": _report_credits_flow,
+    "report_top_debtors": _report_top_debtors,
+}
+
+# ---------- Ejecución ----------
+
+def _pct(sorted_ms: List[float], p: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    k = min(len(sorted_ms) - 1, max(0, math.ceil(p / 100 * len(sorted_ms)) - 1))  # nearest-rank
+    return round(sorted_ms[k], 3)
+
+async def run_scenario(client: httpx.AsyncClient, fx: Fixtures, name: str, concurrency: int,
+                       duration: float, requests: int) -> Dict[str, Any]:
+    make = SCENARIOS[name]
+    lat: List[float] = []
+    errors: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+    remaining = [requests]
+
+    async def worker():
+        while True:
+            if requests:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            elif time.perf_counter() >= deadline:
+                return
+            method, url, body = make(fx)
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, url, json=body)
+                ok = r.status_code < 400
+                key = str(r.status_code)
+            except httpx.HTTPError as e:
+                ok, key = False, e.__class__.__name__
+            ms = (time.perf_counter() - t0) * 1000
+            if ok:
+                lat.append(ms)
+            else:
+                errors[key] = errors.get(key, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "requests": len(lat) + sum(errors.values()),
+        "ok": len(lat),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(lat) / elapsed, 2) if elapsed else 0,
+        "mean_ms": round(statistics.fmean(lat), 3) if lat else 0,
+        "p50_ms": _pct(lat, 50),
+        "p95_ms": _pct(lat, 95),
+        "p99_ms": _pct(lat, 99),
+        "max_ms": round(lat[-1], 3) if lat else 0,
+    }
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+async def main(args) -> None:
+    token, fx = await load_fixtures()
+    names = [n.strip() for n in args.scenarios.split(",")] if args.scenarios else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Escenarios desconocidos: {unknown}. Disponibles: {list(SCENARIOS)}")
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        for name in names:
+            throttled = 0
+            if args.warmup:
+                w = await run_scenario(client, fx, name, args.concurrency, args.warmup, 0)
+                throttled += w["errors"].get("429", 0)
+            results[name] = await run_scenario(client, fx, name, args.concurrency, args.duration, args.requests)
+            r = results[name]
+            throttled += r["errors"].get("429", 0)
+            r["failed"] = bool(throttled)
+            print(f"{name:28s} {r['throughput_rps']:>9.1f} rps  p50 {r['p50_ms']:>8.1f}  "
+                  f"p95 {r['p95_ms']:>8.1f}  p99 {r['p99_ms']:>8.1f} ms  errores {sum(r['errors'].values())}"
+                  + (f"  FALLIDO: {throttled} respuestas 429" if throttled else ""))
+
+    out = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+    path = args.out or os.path.join("bench", "results", f"{out['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
+    print(f"resultados -> {path}")
+    failed = [n for n, r in results.items() if r["failed"]]
+    if failed:
+        raise SystemExit(f"Escenarios limitados por la API (429): {failed}. "
+                         "Levanta la API con RATE_LIMIT_ENABLED=0")
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de los caminos críticos del POS")
+    ap.add_argument("--base-url", default=os.getenv("BENCH_BASE_URL", "http://localhost:8000"))
+    ap.add_argument("--scenarios", default="", help=f"lista separada por comas ({', '.join(SCENARIOS)})")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=20, help="segundos por escenario")
+    ap.add_argument("--requests", type=int, default=0, help="número fijo de peticiones (anula --duration)")
+    ap.add_argument("--warmup", type=float, default=3, help="segundos de calentamiento por escenario")
+    ap.add_argument("--timeout", type=float, default=30)
+    ap.add_argument("--out", default="", help="ruta del JSON (por defecto bench/results/<commit>.json)")
+    return ap.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
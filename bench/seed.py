@@ -0,0 +1,180 @@
+"""
+Siembra una BD local de Postgres con datos sintéticos realistas para los
+benchmarks: catálogo, años de ventas con items, créditos y abonos.
+
+Uso (contra una BD desechable; DATABASE_URL debe apuntar a ella):
+    python -m bench.seed --products 5000 --days 1095 --sales-per-day 300
+    python -m bench.seed --truncate ...   # vacía las tablas antes de sembrar
+
+Con --days 1095 --sales-per-day 3000 --items-per-sale 3 se obtienen ~10M
+sale_items (escenario del leaderboard de top productos).
+"""
+import argparse, asyncio, time
+from datetime import date, timedelta
+from app.db.client import db
+from app.db import product_stats, customer_balances, inventory
+
+BENCH_ADMIN_EMAIL = "bench-admin@gratus.local"
+
+TABLES = ["credit_payments", "credits", "customer_balances", "invoices", "product_daily_stats",
+          "sale_items", "sales", "sales_archive_daily", "customers", "products",
+          "product_tombstones", "idempotency_keys", "stores", "stock_movements", "stock_snapshots",
+          "stock_compaction", "day_closes", "report_touched_days"]
+
+async def _exec(sql: str, *args) -> int:
+    return await db.execute_raw(sql, *args)  # type: ignore
+
+async def seed_catalog(n_products: int, n_customers: int) -> None:
+    await _exec("""
+    INSERT INTO users (nombre, email, rol, provider, updated_at)
+    VALUES ('Bench Admin', $1, 'admin', 'LOCAL', now())
+    ON CONFLICT (email) DO NOTHING
+    """, BENCH_ADMIN_EMAIL)
+    await _exec("""
+    INSERT INTO products (codigo_unico, nombre, categoria, departamento, tipo, costo, precio, stock)
+    SELECT 'BENCH-' || lpad(g::text, 7, '0'),
+           'Producto ' || g,
+           'Cat ' || (g % 40),
+           'Dep ' || (g % 8),
+           'Tipo ' || (g % 5),
+           round((pr * 0.6)::numeric, 2),
+           pr,
+           0
+    FROM (SELECT g, round((1 + random() * 199)::numeric, 2) AS pr FROM generate_series(1, $1::int) g) x
+    ON CONFLICT (codigo_unico) DO NOTHING
+    """, n_products)
+    # apertura en el libro de stock: entra como movimiento y se pliega con compact()
+    await _exec("""
+    INSERT INTO stock_movements (product_id, delta, kind, motivo)
+    SELECT p.id, 1000000, 'receipt', 'apertura del libro'
+    FROM products p
+    WHERE p.codigo_unico LIKE 'BENCH-%'
+      AND NOT EXISTS (SELECT 1 FROM stock_movements m WHERE m.product_id = p.id)
+    """)
+    await _exec("""
+    INSERT INTO customers (nombre, telefono, email)
+    SELECT 'Bench Cliente ' || g, '300' || lpad(g::text, 7, '0'), 'cliente' || g || '@bench.local'
+    FROM generate_series(1, $1::int) g
+    """, n_customers)
+
+async def seed_sales(d_from: date, d_to: date, per_day: int, items_per_sale: int, credit_ratio: float) -> None:
+    """
+    Ventas del rango [d_from, d_to] con items, créditos y abonos.
+    bench_sales es UNLOGGED y no TEMP: el pool de Prisma puede usar otra
+    conexión en cada sentencia.
+    """
+    await _exec("DROP TABLE IF EXISTS bench_sales")
+    await _exec("""
+    CREATE UNLOGGED TABLE bench_sales AS
+    SELECT gen_random_uuid() AS id,
+           d + interval '8 hours' + random() * interval '13 hours' AS created_at,
+           CASE WHEN random() < $4::float8 THEN 'credito'
+                ELSE (ARRAY['efectivo','tarjeta','transferencia'])[1 + floor(random() * 3)::int] END AS metodo_pago,
+           random() < 0.01 AS anulada
+    FROM generate_series($1::date, $2::date, '1 day') d, generate_series(1, $3::int)
+    """, d_from, d_to, per_day, credit_ratio)
+    await _exec("""
+    INSERT INTO sales (id, usuario_id, metodo_pago, descuento, total, created_at, anulada)
+    SELECT b.id, (SELECT id FROM users WHERE email = $1), b.metodo_pago, 0, 0, b.created_at, b.anulada
+    FROM bench_sales b
+    """, BENCH_ADMIN_EMAIL)
+    await _exec("""
+    WITH ids AS (SELECT array_agg(id) AS a, count(*) AS n FROM products WHERE codigo_unico LIKE 'BENCH-%')
+    INSERT INTO sale_items (venta_id, producto_id, cantidad, precio_unitario, subtotal, created_at)
+    SELECT x.venta_id, p.id, x.cantidad, p.precio, p.precio * x.cantidad, x.created_at
+    FROM (
+      SELECT b.id AS venta_id, b.created_at,
+             ids.a[1 + floor(random() * ids.n)::int] AS producto_id,
+             1 + floor(random() * 4)::int AS cantidad
+      FROM bench_sales b, ids, generate_series(1, $1::int)
+    ) x
+    JOIN products p ON p.id = x.producto_id
+    """, items_per_sale)
+    await _exec("""
+    UPDATE sales s SET total = t.total
+    FROM (SELECT si.venta_id, SUM(si.subtotal) AS total
+          FROM sale_items si JOIN bench_sales b ON b.id = si.venta_id AND b.created_at = si.created_at
+          GROUP BY 1) t
+    WHERE s.id = t.venta_id AND s.created_at >= $1::date AND s.created_at < $2::date + 1
+    """, d_from, d_to)
+    # créditos: una por venta a crédito, cliente al azar, vence a 30 días
+    await _exec("""
+    WITH cust AS (SELECT array_agg(id) AS a, count(*) AS n FROM customers WHERE nombre LIKE 'Bench Cliente %')
+    INSERT INTO credits (sale_id, customer_id, total, saldo, due_date, status, created_at)
+    SELECT s.id, cust.a[1 + floor(random() * cust.n)::int], s.total, s.total,
+           (s.created_at + interval '30 days')::date, 'open', s.created_at
+    FROM sales s JOIN bench_sales b ON b.id = s.id, cust
+    WHERE b.metodo_pago = 'credito' AND NOT b.anulada
+    """)
+    # 0-3 abonos por crédito repartidos en los 45 días siguientes
+    await _exec("""
+    INSERT INTO credit_payments (credit_id, amount, metodo_pago, paid_at)
+    SELECT c.id, round((c.total / 4)::numeric, 2), 'efectivo',
+           c.created_at + (k * 15 + floor(random() * 10)::int) * interval '1 day'
+    FROM credits c JOIN bench_sales b ON b.id = c.sale_id,
+         generate_series(1, 3) k
+    WHERE k <= floor(random() * 4)::int
+      AND c.created_at + (k * 15) * interval '1 day' < now()
+    """)
+    await _exec("""
+    UPDATE credits c SET
+      saldo = c.total - p.pagado,
+      status = CASE WHEN c.total - p.pagado <= 0 THEN 'closed'
+                    WHEN c.due_date < current_date THEN 'overdue'
+                    ELSE 'partial' END
+    FROM (SELECT cp.credit_id, SUM(cp.amount) AS pagado
+          FROM credit_payments cp JOIN credits c2 ON c2.id = cp.credit_id
+          JOIN bench_sales b ON b.id = c2.sale_id
+          GROUP BY 1) p
+    WHERE c.id = p.credit_id
+    """)
+    await _exec("DROP TABLE IF EXISTS bench_sales")
+
+async def main(args) -> None:
+    await db.connect()
+    try:
+        t0 = time.perf_counter()
+        if args.truncate:
+            await _exec(f"TRUNCATE {', '.join(TABLES)} CASCADE")
+            # el libro de stock arranca de nuevo (misma fila que deja la migración)
+            await _exec("""
+            INSERT INTO stock_compaction (through, through_id, snapshot_day, started_at)
+            VALUES (now(), 0, current_date - 1, now())
+            """)
+        await seed_catalog(args.products, args.customers)
+        print(f"catálogo: {args.products} productos, {args.customers} clientes")
+
+        d_to = date.today() - timedelta(days=1)
+        d_from = d_to - timedelta(days=args.days - 1)
+        # particiones mensuales de todo el histórico (si no, todo cae en sales_default)
+        await _exec("SELECT create_sales_partitions($1::date, $2::date)", d_from, date.today())
+        chunk = timedelta(days=args.chunk_days)
+        d = d_from
+        while d <= d_to:
+            end = min(d + chunk - timedelta(days=1), d_to)
+            await seed_sales(d, end, args.sales_per_day, args.items_per_sale, args.credit_ratio)
+            print(f"ventas {d} .. {end}")
+            d = end + timedelta(days=1)
+
+        await product_stats.rebuild(db)
+        await customer_balances.rebuild(db)
+        await inventory.compact(db)
+        await _exec("ANALYZE")
+        print(f"listo en {time.perf_counter() - t0:.1f}s")
+    finally:
+        await db.disconnect()
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Siembra datos sintéticos para benchmarks")
+    ap.add_argument("--products", type=int, default=5000)
+    ap.add_argument("--customers", type=int, default=2000)
+    ap.add_argument("--days", type=int, default=1095, help="días de historia (por defecto 3 años)")
+    ap.add_argument("--sales-per-day", type=int, default=300)
+    ap.add_argument("--items-per-sale", type=int, default=3)
+    ap.add_argument("--credit-ratio", type=float, default=0.1, help="fracción de ventas a crédito")
+    ap.add_argument("--chunk-days", type=int, default=31, help="días por lote de inserción")
+    ap.add_argument("--truncate", action="store_true", help="vacía las tablas antes de sembrar")
+    return ap.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
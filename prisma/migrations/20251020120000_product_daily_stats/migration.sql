@@ -0,0 +1,27 @@
+-- CreateTable
+CREATE TABLE "product_daily_stats" (
+    "producto_id" UUID NOT NULL,
+    "day" DATE NOT NULL,
+    "unidades" INTEGER NOT NULL DEFAULT 0,
+    "vendido" DECIMAL(14,2) NOT NULL DEFAULT 0,
+    "utilidad" DECIMAL(14,2) NOT NULL DEFAULT 0,
+
+    CONSTRAINT "product_daily_stats_pkey" PRIMARY KEY ("producto_id", "day")
+);
+
+-- CreateIndex
+CREATE INDEX "idx_product_daily_stats_day" ON "product_daily_stats"("day");
+
+-- AddForeignKey
+ALTER TABLE "product_daily_stats" ADD CONSTRAINT "product_daily_stats_producto_id_fkey" FOREIGN KEY ("producto_id") REFERENCES "products"("id") ON DELETE CASCADE ON UPDATE NO ACTION;
+
+-- Backfill (ventas no anuladas)
+INSERT INTO "product_daily_stats" ("producto_id", "day", "unidades", "vendido", "utilidad")
+SELECT si.producto_id, s.created_at::date,
+       SUM(si.cantidad), SUM(si.subtotal),
+       SUM(si.subtotal - COALESCE(p.costo,0) * si.cantidad)
+FROM sale_items si
+JOIN sales s ON s.id = si.venta_id
+JOIN products p ON p.id = si.producto_id
+WHERE COALESCE(s.anulada,false) = false
+GROUP BY 1, 2;
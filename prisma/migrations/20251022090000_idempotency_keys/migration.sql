@@ -0,0 +1,15 @@
+-- CreateTable
+CREATE TABLE "idempotency_keys" (
+    "scope" VARCHAR(200) NOT NULL,
+    "key" VARCHAR(200) NOT NULL,
+    "request_hash" CHAR(64) NOT NULL,
+    "status" VARCHAR(10) NOT NULL DEFAULT 'pending',
+    "status_code" INTEGER,
+    "response" JSONB,
+    "created_at" TIMESTAMPTZ(6) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "idempotency_keys_pkey" PRIMARY KEY ("scope", "key")
+);
+
+-- CreateIndex
+CREATE INDEX "idx_idempotency_keys_created_at" ON "idempotency_keys"("created_at");
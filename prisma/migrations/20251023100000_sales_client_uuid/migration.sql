@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "sales" ADD COLUMN "client_uuid" UUID;
+
+-- CreateIndex
+CREATE UNIQUE INDEX "sales_client_uuid_key" ON "sales"("client_uuid");
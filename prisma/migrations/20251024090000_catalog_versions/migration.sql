@@ -0,0 +1,52 @@
+-- Versionado del catálogo para sincronización incremental de los POS
+
+-- CreateSequence
+CREATE SEQUENCE "catalog_version_seq";
+
+-- AlterTable
+ALTER TABLE "products" ADD COLUMN "version" BIGINT NOT NULL DEFAULT nextval('catalog_version_seq'),
+ADD COLUMN "updated_at" TIMESTAMPTZ(6) NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+-- CreateIndex
+CREATE INDEX "idx_products_version" ON "products"("version");
+CREATE INDEX "idx_products_updated_at" ON "products"("updated_at");
+
+-- CreateTable
+CREATE TABLE "product_tombstones" (
+    "version" BIGINT NOT NULL DEFAULT nextval('catalog_version_seq'),
+    "product_id" UUID NOT NULL,
+    "codigo_unico" VARCHAR(50),
+    "deleted_at" TIMESTAMPTZ(6) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "product_tombstones_pkey" PRIMARY KEY ("version")
+);
+
+CREATE INDEX "idx_product_tombstones_deleted_at" ON "product_tombstones"("deleted_at");
+
+-- Cada cambio real de un producto toma una versión nueva
+CREATE FUNCTION products_bump_version() RETURNS trigger AS $$
+BEGIN
+  NEW.version := nextval('catalog_version_seq');
+  NEW.updated_at := now();
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "products_bump_version"
+BEFORE UPDATE ON "products"
+FOR EACH ROW
+WHEN (OLD.* IS DISTINCT FROM NEW.*)
+EXECUTE FUNCTION products_bump_version();
+
+-- Los borrados dejan una lápida para que los POS eliminen el producto
+CREATE FUNCTION products_tombstone() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO product_tombstones (product_id, codigo_unico) VALUES (OLD.id, OLD.codigo_unico);
+  RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "products_tombstone"
+AFTER DELETE ON "products"
+FOR EACH ROW
+EXECUTE FUNCTION products_tombstone();
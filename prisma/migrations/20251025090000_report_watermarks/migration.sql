@@ -0,0 +1,42 @@
+-- Marcas de agua para ETags de reportes: cada sentencia que escribe ventas,
+-- cartera o catálogo suma 1 a un contador de su dominio, dentro de la misma
+-- transacción (un lector nunca ve la marca nueva antes que los datos, y la
+-- réplica la recibe junto con ellos). El contador está repartido en 16 filas
+-- por dominio, elegidas por backend, para no serializar los checkouts.
+
+-- CreateTable
+CREATE TABLE "report_watermarks" (
+    "domain" TEXT NOT NULL,
+    "shard" INTEGER NOT NULL,
+    "version" BIGINT NOT NULL DEFAULT 0,
+
+    CONSTRAINT "report_watermarks_pkey" PRIMARY KEY ("domain","shard")
+);
+
+INSERT INTO "report_watermarks" ("domain", "shard")
+SELECT d, s FROM unnest(ARRAY['sales', 'credits', 'catalog']) d, generate_series(0, 15) s;
+
+CREATE FUNCTION bump_report_watermark() RETURNS trigger AS $$
+BEGIN
+  UPDATE report_watermarks SET version = version + 1
+  WHERE domain = TG_ARGV[0] AND shard = pg_backend_pid() % 16;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "sales_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "sales"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('sales');
+CREATE TRIGGER "sale_items_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "sale_items"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('sales');
+CREATE TRIGGER "product_daily_stats_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "product_daily_stats"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('sales');
+
+CREATE TRIGGER "credits_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "credits"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('credits');
+CREATE TRIGGER "credit_payments_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "credit_payments"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('credits');
+CREATE TRIGGER "customers_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "customers"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('credits');
+
+CREATE TRIGGER "products_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "products"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('catalog');
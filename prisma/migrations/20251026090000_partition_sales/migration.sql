@@ -0,0 +1,128 @@
+-- Particiona sales y sale_items por mes sobre created_at.
+-- La clave de partición tiene que estar en toda PK/UNIQUE, así que:
+--   * PK (id, created_at); client_uuid es único junto con created_at (un
+--     reintento del POS trae el mismo created_at).
+--   * sale_items copia el created_at de su venta para caer en el mismo mes.
+--   * Las FK hacia sales (sale_items, credits, invoices) se eliminan: una FK
+--     a una tabla particionada tendría que incluir created_at.
+-- Filas fuera de las particiones creadas caen en *_default.
+
+-- Backfill
+UPDATE "sales" SET "created_at" = CURRENT_TIMESTAMP WHERE "created_at" IS NULL;
+ALTER TABLE "sale_items" ADD COLUMN "created_at" TIMESTAMP(6);
+UPDATE "sale_items" si SET "created_at" = s."created_at" FROM "sales" s WHERE s."id" = si."venta_id";
+UPDATE "sale_items" SET "created_at" = CURRENT_TIMESTAMP WHERE "created_at" IS NULL;
+
+-- DropForeignKey
+ALTER TABLE "sale_items" DROP CONSTRAINT IF EXISTS "sale_items_venta_id_fkey";
+ALTER TABLE "credits" DROP CONSTRAINT IF EXISTS "credits_sale_id_fkey";
+ALTER TABLE "invoices" DROP CONSTRAINT IF EXISTS "invoices_venta_id_fkey";
+
+-- CreateTable (particionadas)
+CREATE TABLE "sales_part" (LIKE "sales" INCLUDING DEFAULTS) PARTITION BY RANGE ("created_at");
+ALTER TABLE "sales_part" ALTER COLUMN "created_at" SET NOT NULL;
+ALTER TABLE "sales_part" ADD CONSTRAINT "sales_part_pkey" PRIMARY KEY ("id", "created_at");
+CREATE TABLE "sales_default" PARTITION OF "sales_part" DEFAULT;
+
+CREATE TABLE "sale_items_part" (LIKE "sale_items" INCLUDING DEFAULTS) PARTITION BY RANGE ("created_at");
+ALTER TABLE "sale_items_part" ALTER COLUMN "created_at" SET NOT NULL;
+ALTER TABLE "sale_items_part" ALTER COLUMN "created_at" SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE "sale_items_part" ADD CONSTRAINT "sale_items_part_pkey" PRIMARY KEY ("id", "created_at");
+CREATE TABLE "sale_items_default" PARTITION OF "sale_items_part" DEFAULT;
+
+-- Particiones mensuales de [desde, hasta]. Si el mes ya tiene filas en la
+-- partición default (ventas offline que llegaron antes que su partición), se
+-- mueven a la nueva partición antes de adjuntarla.
+CREATE FUNCTION create_sales_partitions(p_from DATE, p_to DATE) RETURNS INTEGER AS $$
+DECLARE
+  m DATE := date_trunc('month', p_from)::date;
+  nxt DATE;
+  t TEXT;
+  part TEXT;
+  created INTEGER := 0;
+BEGIN
+  WHILE m <= p_to LOOP
+    nxt := (m + INTERVAL '1 month')::date;
+    FOREACH t IN ARRAY ARRAY['sales', 'sale_items'] LOOP
+      part := format('%s_y%sm%s', t, to_char(m, 'YYYY'), to_char(m, 'MM'));
+      IF to_regclass(part) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', part, t);
+        EXECUTE format('INSERT INTO %I SELECT * FROM %I WHERE created_at >= %L AND created_at < %L',
+                       part, t || '_default', m, nxt);
+        EXECUTE format('DELETE FROM %I WHERE created_at >= %L AND created_at < %L',
+                       t || '_default', m, nxt);
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       t, part, m, nxt);
+        created := created + 1;
+      END IF;
+    END LOOP;
+    m := nxt;
+  END LOOP;
+  RETURN created;
+END
+$$ LANGUAGE plpgsql;
+
+-- Mes actual + los próximos N (lo llama la tarea de mantenimiento de la app)
+CREATE FUNCTION ensure_sales_partitions(months_ahead INTEGER DEFAULT 3) RETURNS INTEGER AS $$
+  SELECT create_sales_partitions(
+    date_trunc('month', now())::date,
+    (date_trunc('month', now()) + make_interval(months => months_ahead))::date
+  );
+$$ LANGUAGE sql;
+
+-- Swap: las tablas viejas se renombran, las nuevas toman su nombre
+ALTER TABLE "sales" RENAME TO "sales_unpartitioned";
+ALTER TABLE "sale_items" RENAME TO "sale_items_unpartitioned";
+ALTER TABLE "sales_part" RENAME TO "sales";
+ALTER TABLE "sale_items_part" RENAME TO "sale_items";
+
+SELECT create_sales_partitions(
+  COALESCE((SELECT MIN("created_at") FROM "sales_unpartitioned")::date, CURRENT_DATE),
+  (CURRENT_DATE + INTERVAL '3 months')::date
+);
+
+INSERT INTO "sales" SELECT * FROM "sales_unpartitioned";
+INSERT INTO "sale_items" SELECT * FROM "sale_items_unpartitioned";
+
+DROP TABLE "sale_items_unpartitioned";
+DROP TABLE "sales_unpartitioned";
+ALTER TABLE "sales" RENAME CONSTRAINT "sales_part_pkey" TO "sales_pkey";
+ALTER TABLE "sale_items" RENAME CONSTRAINT "sale_items_part_pkey" TO "sale_items_pkey";
+
+-- CreateIndex
+CREATE UNIQUE INDEX "sales_client_uuid_created_at_key" ON "sales"("client_uuid", "created_at");
+CREATE INDEX "idx_sales_created_at" ON "sales"("created_at");
+CREATE INDEX "idx_sale_items_venta_id" ON "sale_items"("venta_id");
+CREATE INDEX "idx_sale_items_created_at" ON "sale_items"("created_at");
+
+-- AddForeignKey
+ALTER TABLE "sales" ADD CONSTRAINT "sales_tienda_id_fkey" FOREIGN KEY ("tienda_id") REFERENCES "stores"("id") ON DELETE NO ACTION ON UPDATE NO ACTION;
+ALTER TABLE "sales" ADD CONSTRAINT "sales_usuario_id_fkey" FOREIGN KEY ("usuario_id") REFERENCES "users"("id") ON DELETE NO ACTION ON UPDATE NO ACTION;
+ALTER TABLE "sale_items" ADD CONSTRAINT "sale_items_producto_id_fkey" FOREIGN KEY ("producto_id") REFERENCES "products"("id") ON DELETE NO ACTION ON UPDATE NO ACTION;
+
+-- Marcas de agua de reportes (los triggers se fueron con las tablas viejas)
+CREATE TRIGGER "sales_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "sales"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('sales');
+CREATE TRIGGER "sale_items_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "sale_items"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('sales');
+
+-- Totales diarios de las particiones archivadas: reports.summary y la serie
+-- de ventas los suman a lo que sigue en línea.
+-- CreateTable
+CREATE TABLE "sales_archive_daily" (
+    "day" DATE NOT NULL,
+    "tienda_id" UUID,
+    "num_ventas" INTEGER NOT NULL DEFAULT 0,
+    "total_vendido" DECIMAL(14,2) NOT NULL DEFAULT 0,
+    "num_ventas_all" INTEGER NOT NULL DEFAULT 0,
+    "total_all" DECIMAL(14,2) NOT NULL DEFAULT 0,
+    "descuentos" DECIMAL(14,2) NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX "sales_archive_daily_day_tienda_key" ON "sales_archive_daily"("day", COALESCE("tienda_id", '00000000-0000-0000-0000-000000000000'::uuid));
+
+CREATE TRIGGER "sales_archive_daily_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "sales_archive_daily"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('sales');
+
+-- Las particiones desprendidas se mueven aquí (respaldar con pg_dump -n archive y borrar)
+CREATE SCHEMA IF NOT EXISTS "archive";
@@ -0,0 +1,36 @@
+-- Alcance por tienda: créditos con tienda propia, acumulado de productos por
+-- tienda e índices (tienda_id, fecha) para los listados y reportes por tienda.
+
+-- AlterTable
+ALTER TABLE "credits" ADD COLUMN "tienda_id" UUID;
+UPDATE "credits" c SET "tienda_id" = s."tienda_id" FROM "sales" s WHERE s."id" = c."sale_id";
+
+-- AddForeignKey
+ALTER TABLE "credits" ADD CONSTRAINT "credits_tienda_id_fkey" FOREIGN KEY ("tienda_id") REFERENCES "stores"("id") ON DELETE NO ACTION ON UPDATE NO ACTION;
+
+-- product_daily_stats por tienda. Ventas sin tienda usan el UUID nulo
+-- (la columna es parte de la PK y no puede ser NULL).
+ALTER TABLE "product_daily_stats" ADD COLUMN "tienda_id" UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000';
+ALTER TABLE "product_daily_stats" DROP CONSTRAINT "product_daily_stats_pkey";
+ALTER TABLE "product_daily_stats" ADD CONSTRAINT "product_daily_stats_pkey" PRIMARY KEY ("producto_id", "day", "tienda_id");
+
+-- Recalcular por tienda (los días de meses archivados quedan sin tienda)
+DELETE FROM "product_daily_stats" st
+WHERE NOT EXISTS (SELECT 1 FROM "sales_archive_daily" a WHERE a."day" = st."day");
+INSERT INTO "product_daily_stats" ("producto_id", "day", "tienda_id", "unidades", "vendido", "utilidad")
+SELECT si.producto_id, s.created_at::date, COALESCE(s.tienda_id, '00000000-0000-0000-0000-000000000000'),
+       SUM(si.cantidad), SUM(si.subtotal),
+       SUM(si.subtotal - COALESCE(p.costo,0) * si.cantidad)
+FROM sale_items si
+JOIN sales s ON s.id = si.venta_id AND s.created_at = si.created_at
+JOIN products p ON p.id = si.producto_id
+WHERE COALESCE(s.anulada,false) = false
+GROUP BY 1, 2, 3;
+
+-- CreateIndex
+CREATE INDEX "idx_sales_tienda_created_at" ON "sales"("tienda_id", "created_at");
+CREATE INDEX "idx_credits_tienda_created_at" ON "credits"("tienda_id", "created_at");
+CREATE INDEX "idx_credits_tienda_due_date" ON "credits"("tienda_id", "due_date");
+CREATE INDEX "idx_product_daily_stats_tienda_day" ON "product_daily_stats"("tienda_id", "day");
+CREATE INDEX "idx_products_tienda_id" ON "products"("tienda_id");
+CREATE INDEX "idx_sales_archive_daily_tienda_day" ON "sales_archive_daily"("tienda_id", "day");
@@ -0,0 +1,32 @@
+-- Saldo por cliente mantenido al crear créditos y registrar abonos, para
+-- aprobar una venta a crédito (y listar deudores) sin agregar toda la cartera.
+
+-- AlterTable
+ALTER TABLE "customers" ADD COLUMN "limite_credito" DECIMAL(12,2);
+
+-- CreateTable
+CREATE TABLE "customer_balances" (
+    "customer_id" UUID NOT NULL,
+    "saldo" DECIMAL(14,2) NOT NULL DEFAULT 0,
+    "creditos_abiertos" INTEGER NOT NULL DEFAULT 0,
+    "proximo_vencimiento" DATE,
+    "updated_at" TIMESTAMPTZ(6) NOT NULL DEFAULT now(),
+
+    CONSTRAINT "customer_balances_pkey" PRIMARY KEY ("customer_id")
+);
+
+-- CreateIndex
+CREATE INDEX "idx_customer_balances_saldo" ON "customer_balances"("saldo" DESC) WHERE "saldo" > 0;
+
+-- AddForeignKey
+ALTER TABLE "customer_balances" ADD CONSTRAINT "customer_balances_customer_id_fkey" FOREIGN KEY ("customer_id") REFERENCES "customers"("id") ON DELETE CASCADE ON UPDATE NO ACTION;
+
+CREATE TRIGGER "customer_balances_watermark" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "customer_balances"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_report_watermark('credits');
+
+-- Backfill
+INSERT INTO "customer_balances" ("customer_id", "saldo", "creditos_abiertos", "proximo_vencimiento")
+SELECT customer_id, SUM(saldo), COUNT(*), MIN(due_date)
+FROM credits
+WHERE saldo > 0
+GROUP BY 1;
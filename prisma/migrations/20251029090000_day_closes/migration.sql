@@ -0,0 +1,24 @@
+-- Cierres de día inmutables por tienda (NO_STORE = toda la cadena). Cada
+-- re-cierre agrega una revisión; ninguna fila se actualiza.
+
+-- CreateTable
+CREATE TABLE "day_closes" (
+    "day" DATE NOT NULL,
+    "tienda_id" UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    "revision" INTEGER NOT NULL,
+    "snapshot" JSONB NOT NULL,
+    "closed_by" UUID,
+    "motivo" TEXT,
+    "closed_at" TIMESTAMPTZ(6) NOT NULL DEFAULT now(),
+
+    CONSTRAINT "day_closes_pkey" PRIMARY KEY ("day","tienda_id","revision")
+);
+
+CREATE FUNCTION day_closes_immutable() RETURNS trigger AS $$
+BEGIN
+  RAISE EXCEPTION 'day_closes es de solo inserción; re-cerrar agrega una revisión';
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "day_closes_no_update" BEFORE UPDATE ON "day_closes"
+FOR EACH ROW EXECUTE FUNCTION day_closes_immutable();
@@ -0,0 +1,68 @@
+-- Libro de movimientos de stock: ventas, anulaciones, ajustes y entradas
+-- agregan filas en vez de actualizar products.stock. products.stock queda como
+-- saldo compactado hasta stock_compaction.through; stock_snapshots guarda el
+-- saldo de cierre de cada día con movimientos (stock a una fecha).
+
+-- CreateTable
+CREATE TABLE "stock_movements" (
+    "id" BIGSERIAL NOT NULL,
+    "product_id" UUID NOT NULL,
+    "delta" INTEGER NOT NULL,
+    "kind" VARCHAR(20) NOT NULL,
+    "ref_id" UUID,
+    "motivo" VARCHAR(200),
+    "created_at" TIMESTAMPTZ(6) NOT NULL DEFAULT now(),
+
+    CONSTRAINT "stock_movements_pkey" PRIMARY KEY ("id"),
+    CONSTRAINT "stock_movements_kind_check" CHECK ("kind" IN ('sale', 'void', 'adjustment', 'receipt'))
+);
+
+-- Stock actual y a una fecha: movimientos de un producto desde un instante
+CREATE INDEX "idx_stock_movements_product_created" ON "stock_movements"("product_id", "created_at") INCLUDE ("delta");
+-- Compactación por rango de created_at (tabla de solo inserción, en orden)
+CREATE INDEX "idx_stock_movements_created_brin" ON "stock_movements" USING BRIN ("created_at");
+
+-- AddForeignKey
+ALTER TABLE "stock_movements" ADD CONSTRAINT "stock_movements_product_id_fkey" FOREIGN KEY ("product_id") REFERENCES "products"("id") ON DELETE CASCADE ON UPDATE NO ACTION;
+
+CREATE FUNCTION stock_movements_immutable() RETURNS trigger AS $$
+BEGIN
+  RAISE EXCEPTION 'stock_movements es de solo inserción; corregir con un movimiento de ajuste';
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "stock_movements_no_update" BEFORE UPDATE ON "stock_movements"
+FOR EACH ROW EXECUTE FUNCTION stock_movements_immutable();
+
+-- CreateTable
+CREATE TABLE "stock_snapshots" (
+    "day" DATE NOT NULL,
+    "product_id" UUID NOT NULL,
+    "stock" INTEGER NOT NULL,
+
+    CONSTRAINT "stock_snapshots_pkey" PRIMARY KEY ("product_id","day")
+);
+
+-- AddForeignKey
+ALTER TABLE "stock_snapshots" ADD CONSTRAINT "stock_snapshots_product_id_fkey" FOREIGN KEY ("product_id") REFERENCES "products"("id") ON DELETE CASCADE ON UPDATE NO ACTION;
+
+-- CreateTable (una sola fila)
+CREATE TABLE "stock_compaction" (
+    "id" BOOLEAN NOT NULL DEFAULT true,
+    "through" TIMESTAMPTZ(6) NOT NULL,
+    "snapshot_day" DATE NOT NULL,
+    "started_at" TIMESTAMPTZ(6) NOT NULL,
+
+    CONSTRAINT "stock_compaction_pkey" PRIMARY KEY ("id"),
+    CONSTRAINT "stock_compaction_single_row" CHECK ("id")
+);
+
+-- Apertura del libro: el stock actual entra como un ajuste ya compactado
+-- (created_at = through), así la suma del libro coincide con products.stock
+INSERT INTO "stock_compaction" ("through", "snapshot_day", "started_at")
+VALUES (now(), current_date - 1, now());
+
+INSERT INTO "stock_movements" ("product_id", "delta", "kind", "motivo", "created_at")
+SELECT id, stock, 'adjustment', 'apertura del libro', now()
+FROM products
+WHERE COALESCE(stock, 0) <> 0;
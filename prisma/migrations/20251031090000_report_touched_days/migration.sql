@@ -0,0 +1,65 @@
+-- Días pasados tocados por escrituras de ventas/cartera: una venta offline
+-- sincronizada tarde, una anulación o un abono con fecha vieja cambian
+-- totales de días fuera de la ventana que recargan las series en memoria.
+-- Cada sentencia suma 1 a la versión de cada día anterior a hoy que tocó; el
+-- lector compara versiones con las que ya cargó y recarga desde el día más
+-- viejo que cambió. Las escrituras del día (el caso común) no tocan esta
+-- tabla, así los checkouts no compiten por sus filas.
+
+-- CreateTable
+CREATE TABLE "report_touched_days" (
+    "domain" TEXT NOT NULL,
+    "day" DATE NOT NULL,
+    "version" BIGINT NOT NULL DEFAULT 1,
+
+    CONSTRAINT "report_touched_days_pkey" PRIMARY KEY ("domain","day")
+);
+
+-- TG_ARGV: dominio, columna de fecha y, para UPDATE, las columnas que mueven
+-- los totales (una actualización que no las cambia no marca nada)
+CREATE FUNCTION touch_report_days() RETURNS trigger AS $$
+DECLARE
+  col TEXT := quote_ident(TG_ARGV[1]);
+  changed TEXT;
+  q TEXT;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    q := format('SELECT %s::date FROM new_rows', col);
+  ELSIF TG_OP = 'DELETE' THEN
+    q := format('SELECT %s::date FROM old_rows', col);
+  ELSE
+    SELECT string_agg(format('o.%1$I IS DISTINCT FROM n.%1$I', c), ' OR ') INTO changed
+    FROM unnest(TG_ARGV[2:]) c;
+    q := format('SELECT v.d FROM old_rows o JOIN new_rows n ON n.id = o.id, '
+                'LATERAL (VALUES (o.%1$s::date), (n.%1$s::date)) v(d) WHERE %2$s', col, changed);
+  END IF;
+  EXECUTE format(
+    'INSERT INTO report_touched_days (domain, day) '
+    'SELECT DISTINCT $1, t.d FROM (%s) t(d) WHERE t.d < current_date '
+    'ON CONFLICT (domain, day) DO UPDATE SET version = report_touched_days.version + 1', q)
+  USING TG_ARGV[0];
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Las tablas de transición no admiten varios eventos por trigger
+CREATE TRIGGER "sales_touched_ins" AFTER INSERT ON "sales" REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('sales', 'created_at');
+CREATE TRIGGER "sales_touched_upd" AFTER UPDATE ON "sales" REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('sales', 'created_at', 'anulada', 'total', 'tienda_id');
+CREATE TRIGGER "sales_touched_del" AFTER DELETE ON "sales" REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('sales', 'created_at');
+
+CREATE TRIGGER "credits_touched_ins" AFTER INSERT ON "credits" REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('credits', 'created_at');
+CREATE TRIGGER "credits_touched_upd" AFTER UPDATE ON "credits" REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('credits', 'created_at', 'total', 'tienda_id');
+CREATE TRIGGER "credits_touched_del" AFTER DELETE ON "credits" REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('credits', 'created_at');
+
+CREATE TRIGGER "credit_payments_touched_ins" AFTER INSERT ON "credit_payments" REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('credits', 'paid_at');
+CREATE TRIGGER "credit_payments_touched_upd" AFTER UPDATE ON "credit_payments" REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('credits', 'paid_at', 'amount', 'credit_id');
+CREATE TRIGGER "credit_payments_touched_del" AFTER DELETE ON "credit_payments" REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION touch_report_days('credits', 'paid_at');
@@ -0,0 +1,36 @@
+-- Compactación del libro de stock por id en vez de por created_at: con
+-- created_at = now() (inicio de la transacción) una transacción larga podía
+-- confirmar movimientos con created_at anterior al corte ya compactado y
+-- quedaban fuera del saldo. through_id = último id plegado en products.stock;
+-- el corte se elige con el candado exclusivo del libro (ver app/db/inventory.py).
+
+-- AlterTable
+ALTER TABLE "stock_compaction" ADD COLUMN "through_id" BIGINT NOT NULL DEFAULT 0;
+
+-- Corte inicial: el mayor id ya plegado por created_at. Los movimientos con id
+-- menor que no entraron (created_at posterior al corte) se pliegan ahora.
+WITH c AS (
+  SELECT COALESCE(MAX(m.id), 0) AS hi
+  FROM "stock_movements" m, "stock_compaction" s
+  WHERE m."created_at" <= s."through"
+),
+d AS (
+  SELECT m."product_id", SUM(m."delta")::int AS delta
+  FROM "stock_movements" m, "stock_compaction" s, c
+  WHERE m.id <= c.hi AND m."created_at" > s."through"
+  GROUP BY 1
+),
+upd AS (
+  UPDATE "products" p SET "stock" = COALESCE(p."stock", 0) + d.delta
+  FROM d WHERE p.id = d."product_id" AND d.delta <> 0
+  RETURNING 1
+)
+UPDATE "stock_compaction" SET "through_id" = (SELECT hi FROM c);
+
+-- Hora real de registro (no la de inicio de la transacción): lo que se
+-- registra después de un corte tiene created_at posterior a él
+ALTER TABLE "stock_movements" ALTER COLUMN "created_at" SET DEFAULT clock_timestamp();
+
+-- Compactación y stock actual por rango de id (la PK ya lo indexa); el stock
+-- actual de un producto filtra sus movimientos posteriores al corte
+CREATE INDEX "idx_stock_movements_product_id" ON "stock_movements"("product_id", "id") INCLUDE ("delta");
@@ -0,0 +1,5 @@
+-- Créditos abiertos por cliente y vencimiento: el vencimiento más próximo al
+-- saldar un crédito y el monto vencido de la exposición leen solo este índice.
+
+-- CreateIndex
+CREATE INDEX "idx_credits_customer_open" ON "credits"("customer_id", "due_date") INCLUDE ("saldo") WHERE "saldo" > 0;
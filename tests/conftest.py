@@ -0,0 +1,93 @@
+import os, uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+import pytest
+
+# Pruebas contra Postgres: TEST_DATABASE_URL apunta a un servidor donde se
+# puedan crear bases (p. ej. postgresql://postgres@localhost/postgres); cada
+# prueba corre en una base temporal con las migraciones que necesita. Sin la
+# variable esas pruebas se omiten. El cliente Prisma no hace falta: PgClient
+# ofrece query_raw/query_first/execute_raw/tx() sobre asyncpg.
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+MIGRATIONS = Path(__file__).resolve().parent.parent / "prisma" / "migrations"
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+def _row(record):
+    return {k: str(v) if isinstance(v, uuid.UUID) else v for k, v in record.items()}
+
+class PgClient:
+    """Lo que usa el código de app/db del cliente Prisma, sobre un pool asyncpg."""
+
+    def __init__(self, pool, conn=None):
+        self.pool = pool
+        self.conn = conn
+
+    async def _call(self, method: str, sql: str, args):
+        if self.conn is not None:
+            return await getattr(self.conn, method)(sql, *args)
+        async with self.pool.acquire() as conn:
+            return await getattr(conn, method)(sql, *args)
+
+    async def query_raw(self, sql: str, *args):
+        return [_row(r) for r in await self._call("fetch", sql, args)]
+
+    async def query_first(self, sql: str, *args):
+        rows = await self.query_raw(sql, *args)
+        return rows[0] if rows else None
+
+    async def execute_raw(self, sql: str, *args) -> int:
+        status = await self._call("execute", sql, args)
+        last = status.split()[-1]
+        return int(last) if last.isdigit() else 0
+
+    @asynccontextmanager
+    async def tx(self, **_):  # timeout/max_wait de Prisma: sin efecto aquí
+        if self.conn is not None:
+            async with self.conn.transaction():
+                yield self
+            return
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                yield PgClient(self.pool, conn)
+
+def _with_database(url: str, name: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path="/" + name))
+
+@pytest.fixture
+async def pg_database():
+    """Fábrica: pg_database(*migraciones) -> PgClient sobre una base nueva; se borra al terminar."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL no definida")
+    asyncpg = pytest.importorskip("asyncpg")
+    created = []
+
+    async def make(*migrations: str) -> PgClient:
+        name = f"gratus_test_{uuid.uuid4().hex[:12]}"
+        admin = await asyncpg.connect(TEST_DATABASE_URL)
+        try:
+            await admin.execute(f'CREATE DATABASE "{name}"')
+        finally:
+            await admin.close()
+        pool = await asyncpg.create_pool(_with_database(TEST_DATABASE_URL, name), min_size=1, max_size=4)
+        created.append((name, pool))
+        async with pool.acquire() as conn:
+            for m in migrations:
+                await conn.execute((MIGRATIONS / m / "migration.sql").read_text(encoding="utf-8"))
+        return PgClient(pool)
+
+    yield make
+
+    for name, pool in created:
+        await pool.close()
+        admin = await asyncpg.connect(TEST_DATABASE_URL)
+        try:
+            await admin.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        finally:
+            await admin.close()
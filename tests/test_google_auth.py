@@ -0,0 +1,114 @@
+import json, time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.core import google_auth, http
+from app.core.google_auth import GoogleAuthError, JWKSCache, exchange_code, verify_id_token
+
+CLIENT_ID = "pos.apps.googleusercontent.com"
+
+pytestmark = pytest.mark.anyio
+
+def _key(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key()))
+    jwk.update(kid=kid, alg="RS256", use="sig")
+    return private, jwk
+
+class Google:
+    """JWKS y endpoint de token falsos; cuenta las descargas del JWKS."""
+
+    def __init__(self):
+        self.private, jwk = _key("k1")
+        self.published = [jwk]
+        self.jwks_status = 200
+        self.jwks_calls = 0
+        self.id_token = None
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if str(request.url) == google_auth.GOOGLE_JWKS_URL:
+            self.jwks_calls += 1
+            if self.jwks_status != 200:
+                return httpx.Response(self.jwks_status)
+            return httpx.Response(200, json={"keys": self.published},
+                                  headers={"cache-control": "public, max-age=300"})
+        if str(request.url) == google_auth.GOOGLE_TOKEN_URL:
+            if b"code=bueno" not in request.content:
+                return httpx.Response(400, json={"error": "invalid_grant"})
+            return httpx.Response(200, json={"id_token": self.id_token})
+        return httpx.Response(404)
+
+    def token(self, private=None, kid="k1", **claims):
+        now = int(time.time())
+        payload = {"iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "123",
+                   "email": "ana@example.com", "email_verified": True, "iat": now, "exp": now + 600}
+        payload.update(claims)
+        return jwt.encode(payload, private or self.private, algorithm="RS256", headers={"kid": kid})
+
+@pytest.fixture
+async def google(monkeypatch):
+    g = Google()
+    monkeypatch.setattr(google_auth, "GOOGLE_CLIENT_ID", CLIENT_ID)
+    monkeypatch.setattr(google_auth, "jwks", JWKSCache(google_auth.GOOGLE_JWKS_URL))
+    monkeypatch.setattr(http, "_client", httpx.AsyncClient(transport=httpx.MockTransport(g.handler)))
+    yield g
+    await http.close()
+
+async def test_valid_token(google):
+    claims = await verify_id_token(google.token())
+    assert claims["sub"] == "123" and claims["email"] == "ana@example.com"
+    # las llaves quedan en caché: la segunda verificación no descarga el JWKS
+    await verify_id_token(google.token())
+    assert google.jwks_calls == 1
+
+async def test_exchange_code(google):
+    google.id_token = google.token()
+    assert (await exchange_code("bueno"))["sub"] == "123"
+    with pytest.raises(GoogleAuthError) as e:
+        await exchange_code("malo")
+    assert e.value.code == "oauth_exchange_failed"
+
+@pytest.mark.parametrize("claims", [
+    {"aud": "otro.apps.googleusercontent.com"},
+    {"iss": "https://evil.example.com"},
+    {"exp": int(time.time()) - 3600, "iat": int(time.time()) - 7200},
+    {"email_verified": False},
+])
+async def test_invalid_claims_are_rejected(google, claims):
+    with pytest.raises(GoogleAuthError) as e:
+        await verify_id_token(google.token(**claims))
+    assert e.value.code == "invalid_google_token"
+
+async def test_foreign_signature_is_rejected(google):
+    other, _ = _key("k1")
+    with pytest.raises(GoogleAuthError) as e:
+        await verify_id_token(google.token(private=other))
+    assert e.value.code == "invalid_google_token"
+
+async def test_unknown_kid_refresh_is_throttled(google):
+    await verify_id_token(google.token())
+    rotated, jwk = _key("k2")
+    google.published = [jwk]
+    # recién descargado: un kid desconocido no vuelve a pedir el JWKS
+    with pytest.raises(GoogleAuthError):
+        await verify_id_token(google.token(private=rotated, kid="k2"))
+    assert google.jwks_calls == 1
+    # pasado JWKS_MIN_REFRESH_SECONDS sí recarga y encuentra la llave rotada
+    google_auth.jwks._fetched_at -= google_auth.JWKS_MIN_REFRESH_SECONDS
+    assert (await verify_id_token(google.token(private=rotated, kid="k2")))["sub"] == "123"
+    assert google.jwks_calls == 2
+
+async def test_jwks_unavailable(google):
+    google.jwks_status = 503
+    with pytest.raises(GoogleAuthError) as e:
+        await verify_id_token(google.token())
+    assert e.value.code == "jwks_unavailable"
+
+async def test_malformed_token(google):
+    with pytest.raises(GoogleAuthError) as e:
+        await verify_id_token("no-es-un-jwt")
+    assert e.value.code == "invalid_google_token"
+    assert google.jwks_calls == 0
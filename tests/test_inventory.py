@@ -0,0 +1,131 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from app.db import inventory
+
+pytestmark = pytest.mark.anyio
+
+STOCK_MIGRATIONS = ("20251018180215_init", "20251024090000_catalog_versions",
+                    "20251030090000_stock_movements", "20251031100000_stock_compaction_ids")
+
+@pytest.fixture
+async def ledger(pg_database):
+    return await pg_database(*STOCK_MIGRATIONS)
+
+async def _product(client, codigo: str) -> str:
+    row = await client.query_first(
+        "INSERT INTO products (codigo_unico, nombre, precio) VALUES ($1, $1, 10) RETURNING id", codigo)
+    return row["id"]
+
+async def _stored(client, pid: str) -> int:
+    return (await client.query_first("SELECT stock FROM products WHERE id = $1::uuid", pid))["stock"]
+
+async def test_current_is_compacted_balance_plus_new_movements(ledger):
+    a, b = await _product(ledger, "A"), await _product(ledger, "B")
+    await inventory.apply_deltas(ledger, {a: 10, b: 4}, "receipt")
+    await inventory.apply_deltas(ledger, {a: -3, b: 0}, "sale")
+    assert await inventory.current(ledger, [a, b]) == {a: 7, b: 4}
+
+    assert await inventory.compact(ledger) == {"products": 2, "snapshots": 0}
+    assert (await _stored(ledger, a), await _stored(ledger, b)) == (7, 4)
+    assert await inventory.current(ledger, [a, b]) == {a: 7, b: 4}
+
+    # lo registrado después del corte se suma al saldo compactado
+    await inventory.apply_deltas(ledger, {a: -2}, "sale")
+    assert await inventory.current(ledger, [a]) == {a: 5}
+    await inventory.compact(ledger)
+    assert await _stored(ledger, a) == 5
+    assert await inventory.compact(ledger) == {"products": 0, "snapshots": 0}
+
+async def test_compact_waits_for_open_ledger_writes(ledger, monkeypatch):
+    asyncpg = pytest.importorskip("asyncpg")
+    monkeypatch.setattr(inventory, "INVENTORY_COMPACT_LOCK_TIMEOUT", "200ms")
+    pid = await _product(ledger, "A")
+    await inventory.apply_deltas(ledger, {pid: 5}, "receipt")
+
+    async with ledger.tx() as tx:
+        await inventory.apply_deltas(tx, {pid: -1}, "sale")
+        # un movimiento sin confirmar no puede quedar detrás del corte
+        with pytest.raises(asyncpg.exceptions.LockNotAvailableError):
+            await inventory.compact(ledger)
+    assert await inventory.compact(ledger) == {"products": 1, "snapshots": 0}
+    assert await _stored(ledger, pid) == 4
+    assert await inventory.current(ledger, [pid]) == {pid: 4}
+
+async def test_concurrent_sales_do_not_oversell(ledger):
+    pid = await _product(ledger, "A")
+    await inventory.apply_deltas(ledger, {pid: 1}, "receipt")
+    first_locked = asyncio.Event()
+
+    async def sell(delay: float):
+        async with ledger.tx() as tx:
+            short = await inventory.lock_and_check(tx, {pid: 1})
+            first_locked.set()
+            await asyncio.sleep(delay)
+            if not short:
+                await inventory.apply_deltas(tx, {pid: -1}, "sale")
+            return short
+
+    first = asyncio.create_task(sell(0.2))
+    await first_locked.wait()
+    second = await sell(0)
+    assert await first == []
+    assert second == [pid]
+    assert await inventory.current(ledger, [pid]) == {pid: 0}
+
+async def test_adjust_counts_and_rejects_negative(ledger):
+    pid = await _product(ledger, "A")
+    await inventory.apply_deltas(ledger, {pid: 3}, "receipt")
+    applied, rejected = await inventory.adjust(ledger, {"A": 8, "X": 1}, motivo="conteo", counts=True)
+    assert [(r["codigo_unico"], r["stock"]) for r in applied] == [("A", 8)]
+    assert rejected == [{"codigo_unico": "X", "motivo": "no_existe"}]
+    _, rejected = await inventory.adjust(ledger, {"A": -9})
+    assert rejected == [{"codigo_unico": "A", "motivo": "stock_insuficiente"}]
+    assert await inventory.current(ledger, [pid]) == {pid: 8}
+
+async def test_adjust_rolls_back_with_the_callers_transaction(ledger):
+    pid = await _product(ledger, "A")
+    with pytest.raises(RuntimeError):
+        async with ledger.tx() as tx:
+            await tx.execute_raw("UPDATE products SET precio = 12 WHERE id = $1::uuid", pid)
+            applied, _ = await inventory.lock_and_adjust(tx, {"A": 5}, motivo="conteo", counts=True)
+            assert applied[0]["stock"] == 5
+            raise RuntimeError  # p. ej. un 404 después del conteo
+    assert await inventory.current(ledger, [pid]) == {pid: 0}
+    assert (await ledger.query_first("SELECT precio FROM products WHERE id = $1::uuid", pid))["precio"] == 10
+
+async def test_snapshots_stock_at_and_movements(ledger):
+    pid = await _product(ledger, "A")
+    today = date.today()
+    await ledger.execute_raw("UPDATE stock_compaction SET snapshot_day = $1", today - timedelta(days=10))
+    for days_ago, delta in ((5, 10), (3, -4), (3, -1), (0, 2)):
+        await ledger.execute_raw(
+            "INSERT INTO stock_movements (product_id, delta, kind, created_at) "
+            "VALUES ($1::uuid, $2, 'adjustment', $3::date + time '12:00')",
+            pid, delta, today - timedelta(days=days_ago))
+
+    n = await inventory.compact(ledger)
+    assert n == {"products": 1, "snapshots": 2}  # días -5 y -3; hoy sigue abierto
+    assert await _stored(ledger, pid) == 7
+
+    async def at(days_ago):
+        rows = await inventory.stock_at(ledger, today - timedelta(days=days_ago), "A")
+        return rows[0]["stock"]
+
+    assert [await at(d) for d in (6, 5, 4, 3, 1, 0)] == [0, 10, 10, 5, 5, 7]
+    rows = await inventory.movements(ledger, pid, today - timedelta(days=3), today)
+    assert [r["delta"] for r in rows] == [2, -1, -4]
+
+async def test_sale_lock_does_not_block_catalog_edits(ledger):
+    pid = await _product(ledger, "A")
+    await inventory.apply_deltas(ledger, {pid: 2}, "receipt")
+    async with ledger.tx() as tx:
+        assert await inventory.lock_and_check(tx, {pid: 1}) == []
+        # la fila del producto queda libre: otra conexión cambia el precio sin esperar
+        await asyncio.wait_for(
+            ledger.execute_raw("UPDATE products SET precio = 12 WHERE id = $1::uuid", pid), 1)
+        await inventory.apply_deltas(tx, {pid: -1}, "sale")
+    assert await inventory.compact(ledger) == {"products": 1, "snapshots": 0}
+    assert await inventory.current(ledger, [pid]) == {pid: 1}
@@ -0,0 +1,85 @@
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from hypothesis import given, strategies as st
+from pydantic import BaseModel, Field, ValidationError
+
+from app.core.money import MAX_DIGITS, Money, from_cents, line_total, to_cents
+
+LIMIT = 10 ** (MAX_DIGITS + 2) - 1  # mayor monto aceptado, en centavos
+cents = st.integers(min_value=-LIMIT, max_value=LIMIT)
+amounts = st.decimals(min_value=-(10 ** MAX_DIGITS) + 1, max_value=10 ** MAX_DIGITS - 1, places=2,
+                      allow_nan=False, allow_infinity=False)
+
+class Item(BaseModel):
+    precio_unitario: Money = Field(..., gt=0)
+    descuento: Money = Field(0, ge=0)
+    costo: Optional[Money] = Field(None, ge=0)
+
+@given(cents)
+def test_cents_round_trip(c):
+    assert to_cents(from_cents(c)) == c
+
+@given(amounts)
+def test_decimal_round_trip(d):
+    assert from_cents(to_cents(d)) == d
+
+@given(amounts)
+def test_str_and_float_inputs_agree(d):
+    c = to_cents(d)
+    assert to_cents(str(d)) == c
+    if abs(d) < 10 ** 9:  # float representa con exactitud los montos de hasta 15 dígitos
+        assert to_cents(float(d)) == c
+
+@given(st.lists(st.tuples(st.integers(1, 10 ** 7), st.integers(1, 1000)), min_size=1, max_size=50))
+def test_sum_in_cents_matches_decimal_sum(items):
+    subtotal = sum(line_total(precio, cantidad) for precio, cantidad in items)
+    assert from_cents(subtotal) == sum(from_cents(precio) * cantidad for precio, cantidad in items)
+
+@given(st.integers(0, 10 ** 10), st.integers(0, 10 ** 10))
+def test_discount_applied_in_cents(subtotal, descuento):
+    total = subtotal - descuento
+    assert from_cents(total) == from_cents(subtotal) - from_cents(descuento)
+    assert to_cents(from_cents(subtotal) - from_cents(descuento)) == total
+
+def test_float_binary_error_is_not_carried():
+    assert to_cents(0.1) + to_cents(0.2) == to_cents(0.3) == 30
+    assert to_cents(19.99) == 1999
+    with pytest.raises(ValueError):
+        to_cents(0.1 + 0.2)  # 0.30000000000000004: no es un monto en centavos
+
+@given(amounts, st.integers(1, 9))
+def test_sub_cent_amounts_are_rejected(d, frac):
+    with pytest.raises(ValueError):
+        to_cents(d + Decimal(frac) / 1000)
+
+@pytest.mark.parametrize("value", ["12.50", "12.500", Decimal("1E+2"), 7, "0.00"])
+def test_trailing_zeros_are_accepted(value):
+    assert to_cents(value) == int(Decimal(value) * 100)
+
+@pytest.mark.parametrize("value", [None, True, "abc", "NaN", float("inf"), "1e-3", "12.345", "1e13"])
+def test_invalid_amounts_are_rejected(value):
+    with pytest.raises(ValueError):
+        to_cents(value)
+
+def test_money_field_rejects_sub_cents():
+    assert Item(precio_unitario="12.50").precio_unitario == 1250
+    assert Item(precio_unitario=1, costo=None).costo is None
+    with pytest.raises(ValidationError):
+        Item(precio_unitario="12.505")
+    with pytest.raises(ValidationError):
+        Item(precio_unitario=0)
+
+def test_api_returns_422_for_sub_cents():
+    app = FastAPI()
+
+    @app.post("/items")
+    async def create(item: Item):
+        return {"precio_unitario": item.precio_unitario}
+
+    client = TestClient(app)
+    assert client.post("/items", json={"precio_unitario": 12.5}).json() == {"precio_unitario": 1250}
+    assert client.post("/items", json={"precio_unitario": 12.505}).status_code == 422